@@ -1,4 +1,15 @@
-from final_model import *
+"""
+Segmentation analysis of the customers, behind the choice of OPTIMAL_K
+K-Means clusters used by final_model.ChurnPipeline.
+
+Importing this module has no side effects. Run as a script, it compares the
+numbers of K-Means clusters with the elbow method and silhouette scores,
+compares them with hierarchical clustering, saves the cluster summary, and
+writes the churn probabilities and cluster numbers to the results table:
+    python Clustering.py
+Figures are only shown with DS_SHOW_PLOTS=1 (see plotting.py).
+"""
+import pandas as pd
 from sklearn.cluster import KMeans, AgglomerativeClustering
 from sklearn.metrics import silhouette_score
 from sklearn.decomposition import PCA
@@ -6,126 +17,161 @@ from scipy.cluster.hierarchy import dendrogram, linkage
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from final_model import ChurnPipeline
+from plotting import show_plot
+
+
+def elbow_inertia(X_clustering, k_values=range(1, 11)):
+    """
+    Fit K-Means for every number of clusters and plot the elbow curve.
+
+    Args:
+        X_clustering (pd.DataFrame): Data to cluster.
+        k_values (range): Numbers of clusters to try.
+
+    Returns:
+        list: Inertia of every fit.
+    """
+    inertia = []
+    for k in k_values:
+        kmeans = KMeans(n_clusters=k, random_state=42)
+        kmeans.fit(X_clustering)
+        inertia.append(kmeans.inertia_)
+
+    plt.figure(figsize=(8, 5))
+    plt.plot(k_values, inertia, marker='o', linestyle='--')
+    plt.title("Elbow Method")
+    plt.xlabel("Number of Clusters (k)")
+    plt.ylabel("Inertia")
+    plt.grid()
+    show_plot("elbow")
+    return inertia
+
+
+def kmeans_silhouette_scores(X_clustering, k_values=range(2, 11)):
+    """
+    Score the K-Means clusters for every number of clusters.
+
+    Args:
+        X_clustering (pd.DataFrame): Data to cluster.
+        k_values (range): Numbers of clusters to try.
+
+    Returns:
+        list: Silhouette score of every number of clusters.
+    """
+    silhouette_scores_kmeans = []
+    for k in k_values:
+        kmeans = KMeans(n_clusters=k, random_state=42)
+        cluster_labels = kmeans.fit_predict(X_clustering)
+        score = silhouette_score(X_clustering, cluster_labels)
+        silhouette_scores_kmeans.append(score)
+        print(f"K-Means Silhouette Score for k={k}: {score:.3f}")
+    return silhouette_scores_kmeans
+
+
+def plot_clusters_pca(X_clustering_pca, cluster_column, title, name):
+    """
+    Plot clusters on the first two principal components.
+
+    Args:
+        X_clustering_pca (pd.DataFrame): PCA1, PCA2 and the cluster labels.
+        cluster_column (str): Column holding the labels to color by.
+        title (str): Title of the figure.
+        name (str): File name of the figure, see plotting.show_plot.
+    """
+    plt.figure(figsize=(8, 5))
+    sns.scatterplot(data=X_clustering_pca, x='PCA1', y='PCA2', hue=cluster_column, palette='tab10', s=50)
+    plt.title(title)
+    plt.xlabel("PCA Component 1")
+    plt.ylabel("PCA Component 2")
+    plt.grid()
+    plt.legend()
+    show_plot(name)
+
+
+def plot_dendrogram(X_clustering):
+    """
+    Plot the dendrogram of Ward hierarchical clustering.
+
+    Args:
+        X_clustering (pd.DataFrame): Data to cluster.
+    """
+    linked = linkage(X_clustering, method='ward')
+
+    plt.figure(figsize=(10, 7))
+    dendrogram(linked, truncate_mode='lastp', p=10, leaf_rotation=45, leaf_font_size=10)
+    plt.title("Hierarchical Clustering Dendrogram")
+    plt.xlabel("Number of Points in Node (Cluster Size)")
+    plt.ylabel("Distance")
+    plt.grid()
+    show_plot("dendrogram")
+
+
+def cluster_summary(X_clustering, cluster_labels):
+    """
+    Average every feature per cluster.
+
+    Args:
+        X_clustering (pd.DataFrame): Clustered data.
+        cluster_labels (np.ndarray): Cluster of every row.
+
+    Returns:
+        pd.DataFrame: One row per cluster.
+    """
+    return X_clustering.assign(Cluster=cluster_labels).groupby('Cluster').mean().reset_index()
+
+
+def main():
+    pipeline = ChurnPipeline()
+
+    # Prepare data for clustering
+    X_clustering = pipeline.inputs.copy()
+
+    # K-Means Clustering
+    elbow_inertia(X_clustering)
+    kmeans_silhouette_scores(X_clustering)
+    cluster_labels_kmeans = pipeline.clusters
+
+    # Visualizing K-Means Clusters using PCA
+    pca = PCA(n_components=2)
+    X_pca = pca.fit_transform(X_clustering)
+    X_clustering_pca = pd.DataFrame(X_pca, columns=['PCA1', 'PCA2'])
+    X_clustering_pca['Cluster_KMeans'] = cluster_labels_kmeans
+    plot_clusters_pca(X_clustering_pca, 'Cluster_KMeans', "K-Means Clusters Visualization (PCA)", "kmeans_pca")
+
+    # Hierarchical Clustering
+    plot_dendrogram(X_clustering)
+
+    # Applying Agglomerative Clustering
+    optimal_clusters_hierarchical = 4
+    hierarchical_clustering = AgglomerativeClustering(n_clusters=optimal_clusters_hierarchical)
+    cluster_labels_hierarchical = hierarchical_clustering.fit_predict(X_clustering)
+
+    # Visualizing Hierarchical Clusters using PCA
+    X_clustering_pca['Cluster_Hierarchical'] = cluster_labels_hierarchical
+    plot_clusters_pca(
+        X_clustering_pca, 'Cluster_Hierarchical',
+        f"Hierarchical Clusters Visualization (PCA, n_clusters={optimal_clusters_hierarchical})", "hierarchical_pca",
+    )
+
+    # We will proceed with 4 clusters and K-means clustering
+
+    customer_clusters = pd.DataFrame({'customer_id': pipeline.customer_ids})
+    customer_clusters['Cluster_KMeans'] = cluster_labels_kmeans
+
+    # Display customers and their clusters
+    print("Customers with their K-Means:")
+    print(customer_clusters[['customer_id', 'Cluster_KMeans']])
+
+    # Printing clustering summary
+    summary = cluster_summary(X_clustering, cluster_labels_kmeans)
+    print(summary)
 
-# Prepare data for clustering
-X_clustering = X_full.copy()
-
-# K-Means Clustering
+    summary.to_csv('cluster_summary.csv', index=False)
+
+    # Updating results table with cluster_numbers
+    pipeline.write_results()
 
-# Elbow Method
-inertia = []
-k_values = range(1, 11)
-for k in k_values:
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    kmeans.fit(X_clustering)
-    inertia.append(kmeans.inertia_)
 
-plt.figure(figsize=(8, 5))
-plt.plot(k_values, inertia, marker='o', linestyle='--')
-plt.title("Elbow Method")
-plt.xlabel("Number of Clusters (k)")
-plt.ylabel("Inertia")
-plt.grid()
-plt.show()
-
-# Choosing an optimal number of clusters
-optimal_k = 4
-kmeans = KMeans(n_clusters=optimal_k, random_state=42)
-cluster_labels_kmeans = kmeans.fit_predict(X_clustering)
-
-
-# Silhouette Score for K-Means
-silhouette_scores_kmeans = []
-for k in range(2, 11):
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    cluster_labels = kmeans.fit_predict(X_clustering)
-    score = silhouette_score(X_clustering, cluster_labels)
-    silhouette_scores_kmeans.append(score)
-    print(f"K-Means Silhouette Score for k={k}: {score:.3f}")
-
-# Adding cluster labels to the DataFrame
-X_clustering['Cluster_KMeans'] = cluster_labels_kmeans
-
-# Visualizing K-Means Clusters using PCA
-pca = PCA(n_components=2)
-X_pca = pca.fit_transform(X_clustering.drop(columns=['Cluster_KMeans']))
-X_clustering_pca = pd.DataFrame(X_pca, columns=['PCA1', 'PCA2'])
-X_clustering_pca['Cluster_KMeans'] = cluster_labels_kmeans
-
-plt.figure(figsize=(8, 5))
-sns.scatterplot(data=X_clustering_pca, x='PCA1', y='PCA2', hue='Cluster_KMeans', palette='tab10', s=50)
-plt.title("K-Means Clusters Visualization (PCA)")
-plt.xlabel("PCA Component 1")
-plt.ylabel("PCA Component 2")
-plt.grid()
-plt.legend()
-plt.show()
-
-# Hierarchical Clustering
-
-# Plotting the Dendrogram
-linked = linkage(X_clustering, method='ward')
-
-plt.figure(figsize=(10, 7))
-dendrogram(linked, truncate_mode='lastp', p=10, leaf_rotation=45, leaf_font_size=10)
-plt.title("Hierarchical Clustering Dendrogram")
-plt.xlabel("Number of Points in Node (Cluster Size)")
-plt.ylabel("Distance")
-plt.grid()
-plt.show()
-
-# Applying Agglomerative Clustering
-optimal_clusters_hierarchical = 4
-hierarchical_clustering = AgglomerativeClustering(n_clusters=optimal_clusters_hierarchical)
-cluster_labels_hierarchical = hierarchical_clustering.fit_predict(X_clustering)
-
-X_clustering['Cluster_Hierarchical'] = cluster_labels_hierarchical
-
-# Visualizing Hierarchical Clusters using PCA
-X_clustering_pca['Cluster_Hierarchical'] = cluster_labels_hierarchical
-
-plt.figure(figsize=(8, 5))
-sns.scatterplot(data=X_clustering_pca, x='PCA1', y='PCA2', hue='Cluster_Hierarchical', palette='tab10', s=50)
-plt.title(f"Hierarchical Clusters Visualization (PCA, n_clusters={optimal_clusters_hierarchical})")
-plt.xlabel("PCA Component 1")
-plt.ylabel("PCA Component 2")
-plt.grid()
-plt.legend()
-plt.show()
-
-""" We will proceed with 4 clusters and K-means clustering"""
-
-customer_clusters = customer.copy()
-customer_clusters['Cluster_KMeans'] = cluster_labels_kmeans
-
-# Display customers and their clusters
-print("Customers with their K-Means:")
-print(customer_clusters[['customer_id', 'Cluster_KMeans']])
-
-"""Printing clustering summary """
-X_clustering['Cluster'] = cluster_labels_kmeans
-cluster_summary = X_clustering.groupby('Cluster').mean().reset_index()
-print(cluster_summary)
-
-cluster_summary.to_csv('cluster_summary.csv', index=False)
-
-
-
-""" Updating results table with cluster_numbers"""
-
-results['cluster_number'] = cluster_labels_kmeans
-
-def update_results_with_clusters(results_df):
-    try:
-        with engine.connect() as connection:
-            results_df.to_sql('results', con=connection, if_exists='replace', index=False)
-            print("Results table updated successfully with cluster numbers!")
-    except Exception as e:
-        print(f"Failed to update results table: {e}")
-
-# Update the database
-update_results_with_clusters(results)
-
-# Verify the updated results
-updated_results = fetch_table_as_dataframe("results")
-print(updated_results.head())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
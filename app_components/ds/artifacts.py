@@ -0,0 +1,132 @@
+"""
+Fitted models saved to disk, so that scoring does not retrain on every run.
+
+An artifact holds the fitted model together with what is needed to feed it:
+the label encoders of the text columns and the order of the feature
+columns. It is stamped with ARTIFACT_VERSION, the scikit-learn version and
+the data version of the features it was trained on (see
+features.data_version). load_or_train reuses the artifact while all of them
+match, and retrains and saves a new one otherwise. Bump ARTIFACT_VERSION
+when the way a model is trained changes.
+"""
+import logging
+import os
+from datetime import datetime
+
+import joblib
+import sklearn
+
+logger = logging.getLogger(__name__)
+
+# Folder holding one <name>.joblib file per model
+ARTIFACT_DIR = os.environ.get(
+    "DS_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+)
+
+# Version of the training code, stored in every artifact
+ARTIFACT_VERSION = 1
+
+
+def artifact_path(name):
+    """
+    Returns the path of the artifact of a model.
+
+    Args:
+        name (str): Name of the model.
+
+    Returns:
+        str: Path to the joblib file.
+    """
+    return os.path.join(ARTIFACT_DIR, f"{name}.joblib")
+
+
+def save_artifact(name, model, encoders, columns, data_version):
+    """
+    Saves a fitted model with its encoders and feature columns, replacing the previous artifact atomically.
+
+    Args:
+        name (str): Name of the model.
+        model: Fitted estimator.
+        encoders (dict): Column name mapped to its fitted LabelEncoder.
+        columns (list): Feature columns, in the order the model expects them.
+        data_version (str): Version of the data the model was trained on.
+
+    Returns:
+        dict: The saved artifact.
+    """
+    artifact = {
+        "model": model,
+        "encoders": encoders,
+        "columns": list(columns),
+        "artifact_version": ARTIFACT_VERSION,
+        "sklearn_version": sklearn.__version__,
+        "data_version": data_version,
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    temporary_path = f"{artifact_path(name)}.tmp"
+    joblib.dump(artifact, temporary_path)
+    os.replace(temporary_path, artifact_path(name))
+    return artifact
+
+
+def load_artifact(name, data_version, columns):
+    """
+    Loads the artifact of a model if it is still valid for the data.
+
+    Args:
+        name (str): Name of the model.
+        data_version (str): Current version of the data.
+        columns (list): Feature columns the model is expected to take.
+
+    Returns:
+        dict: The artifact, as saved by save_artifact, or None if it is
+        missing, unreadable or stale.
+    """
+    if data_version is None or not os.path.exists(artifact_path(name)):
+        return None
+    try:
+        artifact = joblib.load(artifact_path(name))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable artifact {artifact_path(name)}: {e}")
+        return None
+    if (
+        artifact.get("artifact_version") != ARTIFACT_VERSION
+        or artifact.get("sklearn_version") != sklearn.__version__
+        or artifact.get("data_version") != data_version
+        or artifact.get("columns") != list(columns)
+    ):
+        return None
+    return artifact
+
+
+def load_or_train(name, data_version, columns, train, refresh=False):
+    """
+    Returns the saved model when it matches the data, training and saving a new one otherwise.
+
+    Args:
+        name (str): Name of the model.
+        data_version (str): Current version of the data, from features.data_version.
+        columns (list): Feature columns the model takes, in order.
+        train (callable): Called without arguments to fit the model when
+            the saved one cannot be used; returns the fitted estimator and
+            the encoders of its features.
+        refresh (bool): Retrain even if the saved model is still valid.
+
+    Returns:
+        dict: The artifact, with the model under "model" and whether it was
+        just trained under "trained".
+    """
+    artifact = None if refresh else load_artifact(name, data_version, columns)
+    if artifact is not None:
+        logger.info(f"Loaded {name} trained at {artifact['trained_at']}")
+        return {**artifact, "trained": False}
+    model, encoders = train()
+    if data_version is None:
+        logger.info(f"Trained {name}; not saved, the data has no version")
+        artifact = {"model": model, "encoders": encoders, "columns": list(columns),
+                    "data_version": None, "trained_at": datetime.now().isoformat(timespec="seconds")}
+    else:
+        artifact = save_artifact(name, model, encoders, columns, data_version)
+        logger.info(f"Trained {name} and saved it to {artifact_path(name)}")
+    return {**artifact, "trained": True}
@@ -0,0 +1,186 @@
+"""
+Fast extraction of query results into DataFrames.
+
+pd.read_sql_query builds a Python tuple per row, then a DataFrame out of
+them, which dominates start-up time on multi-million-row tables. read_query
+instead has PostgreSQL stream the result with COPY (query) TO STDOUT as CSV
+through a pipe, and parses it with the multi-threaded pyarrow CSV reader,
+typing every column from the query's result description. It falls back to
+pd.read_sql_query when pyarrow is not installed, the database is not reached
+through psycopg2, or the stream cannot be parsed.
+
+Either way, the columns are given compact dtypes: integers are downcast to
+the smallest type that holds them, floats to float32 when no precision is
+lost, and repetitive text columns become categoricals.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Text columns with fewer distinct values than this share of their rows become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Bytes of CSV text parsed at a time
+READ_BLOCK_SIZE = 1 << 24
+
+# Arrow types of the PostgreSQL type OIDs; other types are read as text
+ARROW_TYPES = {
+    16: "bool",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1700: "float64",
+    1082: "date32",
+    1114: "timestamp[us]",
+}
+
+
+def compact_dtypes(frame):
+    """
+    Converts the columns of a DataFrame to compact dtypes, in place.
+
+    Args:
+        frame (pd.DataFrame): Data to convert.
+
+    Returns:
+        pd.DataFrame: The same DataFrame.
+    """
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            frame[column] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed.to_numpy(dtype=np.float64), values.to_numpy(), equal_nan=True):
+                frame[column] = narrowed
+        elif values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) == "string":
+            if values.nunique() < len(values) * CATEGORY_MAX_RATIO:
+                frame[column] = values.astype("category")
+    return frame
+
+
+def encode_repetitive_text(table):
+    """
+    Dictionary-encodes the repetitive text columns of an Arrow table, which pandas reads as categoricals.
+
+    Args:
+        table (pa.Table): Parsed rows.
+
+    Returns:
+        pa.Table: The table with its repetitive text columns dictionary-encoded.
+    """
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            values = table.column(index)
+            if pc.count_distinct(values).as_py() < len(values) * CATEGORY_MAX_RATIO:
+                table = table.set_column(index, field.name, values.dictionary_encode())
+    return table
+
+
+def column_types(connection, sql):
+    """
+    Describes the columns a query returns, without running it.
+
+    Args:
+        connection: psycopg2 connection.
+        sql (str): SELECT statement.
+
+    Returns:
+        dict: Column name mapped to its Arrow type.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM ({sql}) AS query LIMIT 0")
+        return {
+            column.name: pa.type_for_alias(ARROW_TYPES.get(column.type_code, "string"))
+            for column in cursor.description
+        }
+
+
+def read_copy(engine, sql):
+    """
+    Runs a query with COPY TO STDOUT and parses its CSV stream with pyarrow.
+
+    The COPY writes into a pipe from a separate thread while the CSV reader
+    consumes it, so the text of the whole result is never held in memory.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        sql (str): SELECT statement.
+
+    Returns:
+        pd.DataFrame: The rows of the query.
+    """
+    connection = engine.raw_connection()
+    try:
+        types = column_types(connection.dbapi_connection, sql)
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def copy_out():
+            try:
+                with os.fdopen(write_fd, "wb") as stream, connection.dbapi_connection.cursor() as cursor:
+                    cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", stream)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=copy_out, daemon=True)
+        writer.start()
+        try:
+            with os.fdopen(read_fd, "rb") as stream:
+                table = pa_csv.read_csv(
+                    stream,
+                    read_options=pa_csv.ReadOptions(block_size=READ_BLOCK_SIZE),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=types,
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                        true_values=["t"],
+                        false_values=["f"],
+                    ),
+                )
+        finally:
+            # Closing the read end above stops a COPY the reader gave up on
+            writer.join()
+        if errors:
+            raise errors[0]
+    finally:
+        connection.close()
+    return encode_repetitive_text(table).to_pandas()
+
+
+def read_query(engine, sql):
+    """
+    Runs a query and returns its rows as a DataFrame with compact dtypes.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        sql (str): SELECT statement, without parameters.
+
+    Returns:
+        pd.DataFrame: The rows of the query.
+    """
+    sql = str(sql).strip().rstrip(";")
+    if pa is not None and engine.dialect.driver == "psycopg2":
+        try:
+            return compact_dtypes(read_copy(engine, sql))
+        except Exception as e:
+            logger.warning(f"Falling back to read_sql_query: {e}")
+    with engine.connect() as connection:
+        return compact_dtypes(pd.read_sql_query(text(sql), connection))
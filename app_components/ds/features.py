@@ -0,0 +1,334 @@
+"""
+Feature extraction for the churn model.
+
+The customer, subscription, application, location, price, notification and
+plan tables are joined in the database, which returns only the columns the
+model uses: one row per subscription, ordered by customer and subscription.
+The ETL loads these tables either shaped like the CSV files (copy, chunked,
+pandas and swap modes) or shaped like the ORM models (upsert mode), so the
+join keys are picked from the columns the tables actually have.
+
+The query is not kept as a database view: the ETL drops and recreates the
+tables with CASCADE, which would drop the view with them.
+
+load_features is the entry point shared by training, scoring and
+clustering. It label-encodes the text columns, one encoder per column, and
+caches the resulting float64 matrix as .npy files in FEATURE_CACHE_DIR,
+under the version of the data: a hash of the feature query and of the row
+count and newest row version of every table it reads. Rows written by the
+ETL and by the backend both change the version, so later calls memory-map
+the cached matrix only while the tables are unchanged.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+from sklearn.preprocessing import LabelEncoder
+
+from extract import read_query
+
+# Folder holding the cached feature matrix, one sub-folder per data version
+FEATURE_CACHE_DIR = os.environ.get(
+    "DS_FEATURE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "features")
+)
+
+# Set to 0 to rebuild the features on every call
+FEATURE_CACHE = os.environ.get("DS_FEATURE_CACHE", "1") == "1"
+
+# Feature columns, in the order the model was trained with
+FEATURE_COLUMNS = [
+    "gender", "age", "location", "status", "duration", "device_type", "application_name",
+    "price", "notification_type", "plan_type", "subscription_duration",
+]
+
+# Tables the feature query reads
+FEATURE_TABLES = ["customer", "subscription", "application", "location", "price", "notification", "plan"]
+
+# Join keys of the tables loaded shaped like the CSV files and like the ORM models
+CSV_SHAPE = {
+    "application_key": "app_id",
+    "price_key": "id",
+    "subscription_plan": "plan_type_id",
+    "customer_location": "c.location",
+    "customer_location_join": "",
+}
+MODEL_SHAPE = {
+    "application_key": "application_id",
+    "price_key": "price_id",
+    "subscription_plan": "plan_id",
+    "customer_location": "cl.area_name",
+    "customer_location_join": "JOIN location cl ON cl.location_id = c.location_id",
+}
+
+FEATURE_QUERY = """
+    SELECT c.customer_id,
+           c.gender,
+           c.age,
+           {customer_location} AS location,
+           s.status,
+           CAST(s.duration AS double precision) AS duration,
+           s.device_type,
+           a.application_name,
+           CAST(p.price AS double precision) AS price,
+           n.notification_type,
+           pl.plan_type,
+           s.end_date - s.start_date AS subscription_duration
+    FROM customer c
+    {customer_location_join}
+    JOIN subscription s ON s.customer_id = c.customer_id
+    JOIN application a ON a.{application_key} = s.application_id
+    JOIN location l ON l.location_id = s.location_id
+    JOIN price p ON p.{price_key} = s.price_id
+    JOIN notification n ON n.notification_id = s.notification_id
+    JOIN plan pl ON pl.plan_id = s.{subscription_plan}
+    ORDER BY c.customer_id, s.id
+"""
+
+
+def feature_query(connection):
+    """
+    Builds the feature query for the shape the tables were loaded with.
+
+    Args:
+        connection: Connection to the database holding the tables.
+
+    Returns:
+        sqlalchemy.TextClause: The feature query.
+    """
+    customer_columns = {column["name"] for column in inspect(connection).get_columns("customer")}
+    shape = CSV_SHAPE if "location" in customer_columns else MODEL_SHAPE
+    return text(FEATURE_QUERY.format(**shape))
+
+
+def fetch_features(engine):
+    """
+    Runs the feature query and returns its rows, with compact dtypes (see extract).
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+
+    Returns:
+        pd.DataFrame: customer_id followed by FEATURE_COLUMNS, one row per subscription.
+    """
+    with engine.connect() as connection:
+        query = feature_query(connection)
+    return read_query(engine, query)
+
+
+def encode_features(frame):
+    """
+    Label-encodes the text columns of the features, one encoder per column.
+
+    Args:
+        frame (pd.DataFrame): FEATURE_COLUMNS as returned by fetch_features.
+
+    Returns:
+        tuple: The features as a float64 matrix, with columns in FEATURE_COLUMNS
+        order, and the fitted LabelEncoder of every text column.
+    """
+    encoders = {}
+    matrix = np.empty((len(frame), len(FEATURE_COLUMNS)), dtype=np.float64)
+    categorical_columns = frame.select_dtypes(include=["object", "category"]).columns
+    for index, column in enumerate(FEATURE_COLUMNS):
+        if column in categorical_columns:
+            encoders[column] = LabelEncoder()
+            matrix[:, index] = encoders[column].fit_transform(frame[column])
+        else:
+            matrix[:, index] = frame[column].to_numpy(dtype=np.float64)
+    return matrix, encoders
+
+
+def encode_labels(encoder, values):
+    """
+    Label-encodes values, giving the ones the encoder was not fitted on a reserved code.
+
+    The reserved code is the number of classes of the encoder, one past the
+    highest code of a known value.
+
+    Args:
+        encoder (LabelEncoder): Fitted encoder.
+        values (pd.Series): Values to encode.
+
+    Returns:
+        tuple: The codes as a float64 array, and a boolean array that is
+        True for the values the encoder was not fitted on.
+    """
+    codes = pd.Index(encoder.classes_).get_indexer(np.asarray(values, dtype=object))
+    unseen = codes < 0
+    codes[unseen] = len(encoder.classes_)
+    return codes.astype(np.float64), unseen
+
+
+def transform_features(frame, encoders, unseen_counts=None):
+    """
+    Encodes features with encoders fitted by encode_features.
+
+    Text values the encoders were not fitted on, such as a location added
+    after the model was trained, get the reserved code of encode_labels
+    instead of failing the whole frame.
+
+    Args:
+        frame (pd.DataFrame): FEATURE_COLUMNS, e.g. one chunk of the feature query.
+        encoders (dict): Column name mapped to its fitted LabelEncoder.
+        unseen_counts (dict, optional): Column name mapped to the number of
+            unseen values encoded so far, updated in place.
+
+    Returns:
+        np.ndarray: The features as a float64 matrix, with columns in FEATURE_COLUMNS order.
+    """
+    matrix = np.empty((len(frame), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for index, column in enumerate(FEATURE_COLUMNS):
+        if column in encoders:
+            matrix[:, index], unseen = encode_labels(encoders[column], frame[column])
+            if unseen_counts is not None and unseen.any():
+                unseen_counts[column] = unseen_counts.get(column, 0) + int(unseen.sum())
+        else:
+            matrix[:, index] = frame[column].to_numpy(dtype=np.float64)
+    return matrix
+
+
+def table_signatures(connection):
+    """
+    Summarises the content of the tables the feature query reads.
+
+    On PostgreSQL the newest row version of a table is the highest xmin of
+    its rows: every insert or update writes a row with a new xmin, and every
+    delete changes the row count. Both are transactional, unlike the
+    statistics counters, so a committed change is seen at once.
+
+    Args:
+        connection: Connection to the database holding the tables.
+
+    Returns:
+        list: (table name, row count, newest row version) of every table in
+        FEATURE_TABLES; the row version is None on other databases.
+    """
+    newest = "max(xmin::text::bigint)" if connection.dialect.name == "postgresql" else "NULL"
+    query = " UNION ALL ".join(
+        f"SELECT '{table_name}', count(*), {newest} FROM {table_name}" for table_name in FEATURE_TABLES
+    )
+    return connection.execute(text(query)).all()
+
+
+def data_version(engine):
+    """
+    Identifies the data the features are built from.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+
+    Returns:
+        str: Hash of the feature query and of the table signatures (see
+        table_signatures), or None when a table is missing.
+    """
+    inspector = inspect(engine)
+    if not all(inspector.has_table(table_name) for table_name in FEATURE_TABLES):
+        return None
+    with engine.connect() as connection:
+        signatures = table_signatures(connection)
+    digest = hashlib.sha256(FEATURE_QUERY.encode())
+    for table_name, rows, newest in signatures:
+        digest.update(f"{table_name}:{rows}:{newest}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def write_feature_cache(version, customer_ids, matrix, encoders):
+    """
+    Saves the features of a data version, replacing the cache of other versions.
+
+    Args:
+        version (str): Result of data_version.
+        customer_ids (np.ndarray): customer_id of every row.
+        matrix (np.ndarray): Encoded features, from encode_features.
+        encoders (dict): Column name mapped to its fitted LabelEncoder.
+    """
+    cache_dir = os.path.join(FEATURE_CACHE_DIR, version)
+    temporary_dir = f"{cache_dir}.tmp"
+    shutil.rmtree(temporary_dir, ignore_errors=True)
+    os.makedirs(temporary_dir)
+    np.save(os.path.join(temporary_dir, "features.npy"), matrix)
+    np.save(os.path.join(temporary_dir, "customer_id.npy"), customer_ids)
+    with open(os.path.join(temporary_dir, "encoders.json"), "w") as encoders_file:
+        json.dump({column: encoder.classes_.tolist() for column, encoder in encoders.items()}, encoders_file)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(temporary_dir, cache_dir)
+    for name in os.listdir(FEATURE_CACHE_DIR):
+        if name != version:
+            shutil.rmtree(os.path.join(FEATURE_CACHE_DIR, name), ignore_errors=True)
+
+
+def read_feature_cache(version):
+    """
+    Memory-maps the cached features of a data version.
+
+    Args:
+        version (str): Result of data_version.
+
+    Returns:
+        tuple: customer_ids, matrix and encoders as written by
+        write_feature_cache, or None if the version is not cached.
+    """
+    cache_dir = os.path.join(FEATURE_CACHE_DIR, version)
+    if not os.path.isdir(cache_dir):
+        return None
+    matrix = np.load(os.path.join(cache_dir, "features.npy"), mmap_mode="r")
+    customer_ids = np.load(os.path.join(cache_dir, "customer_id.npy"), mmap_mode="r")
+    with open(os.path.join(cache_dir, "encoders.json")) as encoders_file:
+        classes = json.load(encoders_file)
+    encoders = {}
+    for column, column_classes in classes.items():
+        encoders[column] = LabelEncoder()
+        encoders[column].classes_ = np.array(column_classes, dtype=object)
+    return customer_ids, matrix, encoders
+
+
+def load_features(engine, refresh=False):
+    """
+    Returns the encoded features, from the cache when the data has not changed.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        refresh (bool): Rebuild the features even if they are cached.
+
+    Returns:
+        dict: customer_id of every row under "customer_id", the encoded
+        features (read-only when memory-mapped) under "matrix", their names
+        under "columns", the fitted encoders under "encoders" and the data
+        version under "version".
+    """
+    version = data_version(engine) if FEATURE_CACHE else None
+    cached = read_feature_cache(version) if version and not refresh else None
+    if cached is None:
+        frame = fetch_features(engine)
+        customer_ids = frame.pop("customer_id").to_numpy()
+        matrix, encoders = encode_features(frame)
+        if version:
+            write_feature_cache(version, customer_ids, matrix, encoders)
+            cached = read_feature_cache(version)
+        else:
+            cached = customer_ids, matrix, encoders
+    customer_ids, matrix, encoders = cached
+    return {
+        "customer_id": customer_ids,
+        "matrix": matrix,
+        "columns": list(FEATURE_COLUMNS),
+        "encoders": encoders,
+        "version": version,
+    }
+
+
+def feature_frame(features):
+    """
+    Wraps the encoded features in a DataFrame without copying them.
+
+    Args:
+        features (dict): Result of load_features.
+
+    Returns:
+        pd.DataFrame: One column per feature, one row per subscription.
+    """
+    return pd.DataFrame(features["matrix"], columns=features["columns"], copy=False)
@@ -1,23 +1,44 @@
+"""
+Churn model of the subscription customers.
+
+Importing this module has no side effects: nothing is read from the
+database, trained or written until asked for. ChurnPipeline exposes every
+step as a stage that runs the first time it is accessed and keeps its
+output, so callers such as Clustering.py or the backend only pay for the
+stages they use.
+
+Run as a script, it scores the customers, assigns their segments and writes
+both to the results table, chunk by chunk (see scoring.py):
+    python final_model.py
+"""
+from functools import cached_property
+
 import pandas as pd
-import numpy as np
-import sqlalchemy
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
+from sklearn.cluster import KMeans
 from sklearn.linear_model import LogisticRegression
-from dotenv import load_dotenv
+from sklearn.model_selection import train_test_split
 
+from artifacts import load_or_train
+from database import engine
+from extract import read_query
+from features import FEATURE_COLUMNS, data_version, feature_frame, load_features
+from results_writer import write_scores
+from scoring import score_in_chunks
 
-from database import *
+# Encoded status of the churned subscriptions: active = 0, canceled = 1, expired = 2
+CHURNED_STATUSES = [1, 2]
 
-load_dotenv(".env")
+# Number of customer segments, chosen with the analysis in Clustering.py
+OPTIMAL_K = 4
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
+# Feature columns the churn and segmentation models take
+MODEL_COLUMNS = [column for column in FEATURE_COLUMNS if column != 'status']
 
-engine = create_engine(DATABASE_URL)
 
 def fetch_table_as_dataframe(table_name):
     """
-    Fetch data from a specific database table and return it as a Pandas DataFrame.
+    Fetch data from a specific database table and return it as a Pandas DataFrame,
+    streamed with COPY and given compact dtypes (see extract.read_query).
 
     Args:
         table_name (str): The name of the table to fetch data from.
@@ -27,247 +48,248 @@ def fetch_table_as_dataframe(table_name):
     """
     query = f"SELECT * FROM {table_name}"  # SQL query to select all data
 
+    df = read_query(engine, query)
+    #print(f"Fetched {len(df)} rows from table '{table_name}'.")
+    return df
 
-    with engine.connect() as connection:
-        df = pd.read_sql_query(query, connection)
-        #print(f"Fetched {len(df)} rows from table '{table_name}'.")
-        return df
-
-
-
-customer = fetch_table_as_dataframe("customer")
-location = fetch_table_as_dataframe("location")
-plan = fetch_table_as_dataframe("plan")
-application = fetch_table_as_dataframe("application")
-price = fetch_table_as_dataframe("price")
-notification = fetch_table_as_dataframe("notification")
-subscription = fetch_table_as_dataframe("subscription")
-results = fetch_table_as_dataframe("results")
-
-"""Merging tables"""
-merged_table = customer.merge(subscription, on='customer_id', how='inner')
-merged_table = merged_table.merge(application, left_on='application_id', right_on='app_id', how='inner')
-merged_table = merged_table.merge(location, on='location_id', how='inner')
-merged_table = merged_table.merge(price, left_on='price_id', right_on='id', how='inner')
-merged_table = merged_table.merge(notification, on='notification_id', how='inner')
-merged_table = merged_table.merge(plan, left_on='plan_type_id', right_on='plan_id', how='inner')
-#merged_table = merged_table.merge(results, on='customer_id', how='inner')
-#print(merged_table.head())
-
-
-""" Cleaning  and labeling data"""
-
-# Defining subscription duration
-
-merged_table['start_date'] = pd.to_datetime(merged_table['start_date'])
-merged_table['end_date'] = pd.to_datetime(merged_table['end_date'])
-
-merged_table['subscription_duration'] = (merged_table['end_date'] - merged_table['start_date']).dt.days
-
-columns_to_drop = ['first_name', 'last_name', 'location_id', 'birth_date','customer_id','email', 'app_id', 'plan_type_id','application_id_y','area_name','id_x',  'id_y', 'start_date','end_date', 'plan_id_x', 'plan_id_y', 'notification_id','application_id_x','price_id' ]
-merged_table = merged_table.drop(columns=columns_to_drop)
-
-
-categorical_columns = merged_table.select_dtypes(include=['object', 'category']).columns
-label_encoder = LabelEncoder()
-
-for col in categorical_columns:
-    merged_table[col] = label_encoder.fit_transform(merged_table[col])
-
-
-""" Predicting status activity (churn rate)"""
-
-# churn rate = (Number of Canceled/Expired Users) / (Total Users)
-
-merged_table['is_churned'] = merged_table['status'].apply(lambda x: 1 if x in [1, 2] else 0)
-
-# as our active status = 0, canceled = 1, expired = 2
-# to find churn rate we need canced/exprired percantage
-
-churn_rate = merged_table['is_churned'].mean()
-print(f"Churn Rate: {churn_rate:.2%}")
-
-
-""" Model building """
-
-# Define features  and target
-X = merged_table.drop(columns=['status', 'is_churned'])
-y = merged_table['is_churned']
-
-#Splitting into train and test sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-log_reg_model = LogisticRegression(random_state=42, max_iter=1000)
-
-# Fit the model on training data
-log_reg_model.fit(X_train, y_train)
+def churn_target(feature_table):
+    """
+    Flag the churned subscriptions.
 
-# Predict on the test set
-y_pred = log_reg_model.predict(X_test)
-y_proba = log_reg_model.predict_proba(X_test)[:, 1]  # Probabilities for the positive class
+    churn rate = (Number of Canceled/Expired Users) / (Total Users)
 
-# Print model coefficients
-coefficients = pd.DataFrame(
-    {"Feature": X_train.columns, "Coefficient": log_reg_model.coef_[0]}
-)
-print("Model Coefficients:")
-print(coefficients.sort_values(by="Coefficient", ascending=False))
+    Args:
+        feature_table (pd.DataFrame): Encoded features, from features.feature_frame.
 
+    Returns:
+        pd.Series: 1 for canceled or expired subscriptions, 0 for active ones.
+    """
+    return feature_table['status'].isin(CHURNED_STATUSES).astype(int).rename('is_churned')
 
-""" Updating results table with predictions"""
 
-# Calculate churn probabilities for all customers
-X_full = merged_table.drop(columns=['status', 'is_churned'])
-y_proba_full = log_reg_model.predict_proba(X_full)[:, 1]
+def model_inputs(feature_table):
+    """
+    Select the columns the churn model takes.
 
-results['churn_probability'] = y_proba_full
+    Args:
+        feature_table (pd.DataFrame): Encoded features, from features.feature_frame.
 
-# Define function to update results table in the database
-def update_results_table(results_df):
-    try:
-        with engine.connect() as connection:
-            # Write to the database, updating existing rows
-            results_df.to_sql('results', con=connection, if_exists='replace', index=False)
-            print("Results table updated successfully!")
-    except Exception as e:
-        print(f"Failed to update results table: {e}")
+    Returns:
+        pd.DataFrame: Every feature except the status the target derives from.
+    """
+    return feature_table[MODEL_COLUMNS]
 
-update_results_table(results)
 
-""" Checking results"""
+def train_churn_model(X_train, y_train):
+    """
+    Fit the churn model.
 
-updated_results = fetch_table_as_dataframe("results")
-print(updated_results.head())
+    Args:
+        X_train (pd.DataFrame): Training inputs.
+        y_train (pd.Series): Training target.
 
-from final_model import *
-from sklearn.cluster import KMeans, AgglomerativeClustering
-from sklearn.metrics import silhouette_score
-from sklearn.decomposition import PCA
-from scipy.cluster.hierarchy import dendrogram, linkage
-import seaborn as sns
-import matplotlib.pyplot as plt
+    Returns:
+        LogisticRegression: The fitted model.
+    """
+    log_reg_model = LogisticRegression(random_state=42, max_iter=1000)
+    return log_reg_model.fit(X_train, y_train)
 
 
-# Prepare data for clustering
-X_clustering = X_full.copy()
+def model_coefficients(model, columns):
+    """
+    Tabulate the coefficients of the churn model.
 
-# K-Means Clustering
+    Args:
+        model (LogisticRegression): Fitted model.
+        columns (list): Feature columns, in the order the model takes them.
 
-# Elbow Method
-inertia = []
-k_values = range(1, 11)
-for k in k_values:
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    kmeans.fit(X_clustering)
-    inertia.append(kmeans.inertia_)
+    Returns:
+        pd.DataFrame: Feature and Coefficient, highest coefficient first.
+    """
+    coefficients = pd.DataFrame({"Feature": columns, "Coefficient": model.coef_[0]})
+    return coefficients.sort_values(by="Coefficient", ascending=False)
 
-plt.figure(figsize=(8, 5))
-plt.plot(k_values, inertia, marker='o', linestyle='--')
-plt.title("Elbow Method")
-plt.xlabel("Number of Clusters (k)")
-plt.ylabel("Inertia")
-plt.grid()
-plt.show()
 
-# Choosing an optimal number of clusters
-optimal_k = 4
-kmeans = KMeans(n_clusters=optimal_k, random_state=42)
-cluster_labels_kmeans = kmeans.fit_predict(X_clustering)
+def train_segment_model(X, n_clusters=OPTIMAL_K):
+    """
+    Fit the K-Means segmentation of the customers.
 
+    Args:
+        X (pd.DataFrame): Model inputs.
+        n_clusters (int): Number of segments.
 
-# Silhouette Score for K-Means
-silhouette_scores_kmeans = []
-for k in range(2, 11):
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    cluster_labels = kmeans.fit_predict(X_clustering)
-    score = silhouette_score(X_clustering, cluster_labels)
-    silhouette_scores_kmeans.append(score)
-    print(f"K-Means Silhouette Score for k={k}: {score:.3f}")
+    Returns:
+        KMeans: The fitted model, whose predict assigns the segments.
+    """
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    return kmeans.fit(X)
 
-# Adding cluster labels to the DataFrame
-X_clustering['Cluster_KMeans'] = cluster_labels_kmeans
 
-# Visualizing K-Means Clusters using PCA
-pca = PCA(n_components=2)
-X_pca = pca.fit_transform(X_clustering.drop(columns=['Cluster_KMeans']))
-X_clustering_pca = pd.DataFrame(X_pca, columns=['PCA1', 'PCA2'])
-X_clustering_pca['Cluster_KMeans'] = cluster_labels_kmeans
+def update_results_table(scores_df):
+    """
+    Write churn probabilities and cluster numbers to the results table, keyed on customer_id
+    (see results_writer.write_scores).
 
-plt.figure(figsize=(8, 5))
-sns.scatterplot(data=X_clustering_pca, x='PCA1', y='PCA2', hue='Cluster_KMeans', palette='tab10', s=50)
-plt.title("K-Means Clusters Visualization (PCA)")
-plt.xlabel("PCA Component 1")
-plt.ylabel("PCA Component 2")
-plt.grid()
-plt.legend()
-plt.show()
+    Args:
+        scores_df (pd.DataFrame): customer_id, churn_probability and cluster_number.
 
-# Hierarchical Clustering
-
-# Plotting the Dendrogram
-linked = linkage(X_clustering, method='ward')
-
-plt.figure(figsize=(10, 7))
-dendrogram(linked, truncate_mode='lastp', p=10, leaf_rotation=45, leaf_font_size=10)
-plt.title("Hierarchical Clustering Dendrogram")
-plt.xlabel("Number of Points in Node (Cluster Size)")
-plt.ylabel("Distance")
-plt.grid()
-plt.show()
-
-# Applying Agglomerative Clustering
-optimal_clusters_hierarchical = 4
-hierarchical_clustering = AgglomerativeClustering(n_clusters=optimal_clusters_hierarchical)
-cluster_labels_hierarchical = hierarchical_clustering.fit_predict(X_clustering)
-
-X_clustering['Cluster_Hierarchical'] = cluster_labels_hierarchical
-
-# Visualizing Hierarchical Clusters using PCA
-X_clustering_pca['Cluster_Hierarchical'] = cluster_labels_hierarchical
-
-plt.figure(figsize=(8, 5))
-sns.scatterplot(data=X_clustering_pca, x='PCA1', y='PCA2', hue='Cluster_Hierarchical', palette='tab10', s=50)
-plt.title(f"Hierarchical Clusters Visualization (PCA, n_clusters={optimal_clusters_hierarchical})")
-plt.xlabel("PCA Component 1")
-plt.ylabel("PCA Component 2")
-plt.grid()
-plt.legend()
-plt.show()
+    Returns:
+        dict: Rows staged, updated and inserted.
+    """
+    written = write_scores(engine, [scores_df])
+    print(f"Results table updated successfully! ({written['updated']} updated, {written['inserted']} inserted)")
+    return written
 
-""" We will proceed with 4 clusters and K-means clustering"""
-
-customer_clusters = customer.copy()
-customer_clusters['Cluster_KMeans'] = cluster_labels_kmeans
-
-# Display customers and their clusters
-print("Customers with their K-Means:")
-print(customer_clusters[['customer_id', 'Cluster_KMeans']])
-
-"""Printing clustering summary """
-X_clustering['Cluster'] = cluster_labels_kmeans
-cluster_summary = X_clustering.groupby('Cluster').mean().reset_index()
-print(cluster_summary)
-
-cluster_summary.to_csv('cluster_summary.csv', index=False)
-
-
-
-""" Updating results table with cluster_numbers"""
-
-results['cluster_number'] = cluster_labels_kmeans
-
-def update_results_with_clusters(results_df):
-    try:
-        with engine.connect() as connection:
-            results_df.to_sql('results', con=connection, if_exists='replace', index=False)
-            print("Results table updated successfully with cluster numbers!")
-    except Exception as e:
-        print(f"Failed to update results table: {e}")
-
-# Update the database
-update_results_with_clusters(results)
 
-# Verify the updated results
-updated_results = fetch_table_as_dataframe("results")
-print(updated_results.head())
+class ChurnPipeline:
+    """
+    Churn scoring and segmentation, run lazily.
+
+    Every attribute below is a stage computed on first access, from the
+    stages it depends on, and kept for later accesses.
+
+    Attributes:
+        version (str): Version of the data, from features.data_version.
+        features (dict): Encoded features, from features.load_features.
+        feature_table (pd.DataFrame): The features as a DataFrame.
+        customer_ids (pd.Series): customer_id of every feature row.
+        target (pd.Series): is_churned of every feature row.
+        churn_rate (float): Share of churned subscriptions.
+        inputs (pd.DataFrame): Model inputs of every feature row.
+        split (dict): Train and test inputs and targets.
+        artifact (dict): The churn model with its metadata, from artifacts.load_or_train.
+        model (LogisticRegression): The fitted churn model.
+        segment_artifact (dict): The segmentation model with its metadata.
+        probabilities (np.ndarray): Churn probability of every feature row.
+        clusters (np.ndarray): K-Means segment of every feature row.
+        results (pd.DataFrame): The results table as stored in the database.
+    """
 
+    def __init__(self, refresh=False):
+        """
+        Args:
+            refresh (bool): Rebuild the features and retrain the model even if they are cached.
+        """
+        self.refresh = refresh
+
+    @cached_property
+    def version(self):
+        return data_version(engine)
+
+    @cached_property
+    def features(self):
+        return load_features(engine, refresh=self.refresh)
+
+    @cached_property
+    def feature_table(self):
+        return feature_frame(self.features)
+
+    @cached_property
+    def customer_ids(self):
+        return pd.Series(self.features["customer_id"], name="customer_id")
+
+    @cached_property
+    def target(self):
+        return churn_target(self.feature_table)
+
+    @cached_property
+    def churn_rate(self):
+        return self.target.mean()
+
+    @cached_property
+    def inputs(self):
+        return model_inputs(self.feature_table)
+
+    @cached_property
+    def split(self):
+        X_train, X_test, y_train, y_test = train_test_split(self.inputs, self.target, test_size=0.2, random_state=42)
+        return {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
+
+    @cached_property
+    def artifact(self):
+        return load_or_train(
+            "churn_model", self.version, MODEL_COLUMNS,
+            lambda: (train_churn_model(self.split["X_train"], self.split["y_train"]), self.features["encoders"]),
+            refresh=self.refresh,
+        )
+
+    @cached_property
+    def model(self):
+        return self.artifact["model"]
+
+    @cached_property
+    def probabilities(self):
+        return self.model.predict_proba(self.inputs)[:, 1]
+
+    @cached_property
+    def segment_artifact(self):
+        return load_or_train(
+            "segment_model", self.version, MODEL_COLUMNS,
+            lambda: (train_segment_model(self.inputs), self.features["encoders"]),
+            refresh=self.refresh,
+        )
+
+    @cached_property
+    def clusters(self):
+        return self.segment_artifact["model"].predict(self.inputs)
+
+    @cached_property
+    def results(self):
+        return fetch_table_as_dataframe("results")
+
+    def write_results(self):
+        """
+        Write the churn probabilities and cluster numbers to the results table.
+
+        Returns:
+            pd.DataFrame: The scores as written, one row per feature row.
+        """
+        scores = pd.DataFrame({
+            'customer_id': self.customer_ids,
+            'churn_probability': self.probabilities,
+            'cluster_number': self.clusters,
+        })
+        update_results_table(scores)
+        return scores
+
+    def score_in_chunks(self, chunk_rows=None):
+        """
+        Score and segment every customer in bounded memory, writing the
+        results table chunk by chunk (see scoring.score_in_chunks).
+
+        Only the models are loaded, or trained if they are not saved yet;
+        the feature matrix is not.
+
+        Args:
+            chunk_rows (int, optional): Feature rows per chunk.
+
+        Returns:
+            dict: Rows, customers, chunks, unseen values, seconds and rows_per_second of the run.
+        """
+        return score_in_chunks(engine, self.artifact, self.segment_artifact, chunk_rows)
+
+
+def main():
+    pipeline = ChurnPipeline()
+    print(f"Churn Rate: {pipeline.churn_rate:.2%}")
+
+    print("Trained the churn model" if pipeline.artifact["trained"] else
+          f"Loaded the churn model trained at {pipeline.artifact['trained_at']}")
+    print("Model Coefficients:")
+    print(model_coefficients(pipeline.model, MODEL_COLUMNS))
+
+    stats = pipeline.score_in_chunks()
+    print(f"Scored {stats['rows']} rows of {stats['customers']} customers in {stats['chunks']} chunk(s), "
+          f"{stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s); "
+          f"{stats['updated']} results updated, {stats['inserted']} inserted")
+    if stats["unseen"]:
+        print(f"Values unseen at training, scored with a fallback code: {stats['unseen']}")
+
+    # Checking results
+    updated_results = fetch_table_as_dataframe("results")
+    print(updated_results.head())
+
+
+if __name__ == "__main__":
+    main()
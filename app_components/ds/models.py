@@ -1,8 +1,15 @@
-import os
+"""
+Comparison of candidate models for churn and subscription duration
+prediction, on the features shared with final_model.py.
+
+Importing this module has no side effects. Run it as a script to train and
+compare the candidates:
+    python models.py
+Figures are only shown with DS_SHOW_PLOTS=1 (see plotting.py).
+"""
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier, BaggingClassifier
 from sklearn.linear_model import LogisticRegression
@@ -14,53 +21,10 @@ from sklearn.linear_model import LinearRegression
 from sklearn.svm import SVR
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
-base_dir = os.path.join(script_dir, "..", "etl", "Data")
-
-customer = pd.read_csv(os.path.join(base_dir, "customer.csv"))
-plan = pd.read_csv(os.path.join(base_dir, "plan.csv"))
-application = pd.read_csv(os.path.join(base_dir, "application.csv"))
-location = pd.read_csv(os.path.join(base_dir, "location.csv"))
-price = pd.read_csv(os.path.join(base_dir, "price.csv"))
-notification = pd.read_csv(os.path.join(base_dir, "notification.csv"))
-subscription = pd.read_csv(os.path.join(base_dir, "subscription.csv"))
-
-""" Merging tables """
-merged_table = customer.merge(subscription, on='customer_id', how='inner')
-
-merged_table = merged_table.merge(application, left_on='application_id', right_on='app_id', how='inner')
-
-merged_table = merged_table.merge(location, on='location_id', how='inner')
-
-merged_table = merged_table.merge(price, left_on='price_id', right_on='id', how='inner')
-
-merged_table = merged_table.merge(notification, on='notification_id', how='inner')
-
-merged_table = merged_table.merge(plan, left_on='plan_type_id', right_on='plan_id', how='inner')
-
-
-""" Cleaning  and labeling data"""
-
-# Defining subscription duration
-
-merged_table['start_date'] = pd.to_datetime(merged_table['start_date'])
-merged_table['end_date'] = pd.to_datetime(merged_table['end_date'])
-
-merged_table['subscription_duration'] = (merged_table['end_date'] - merged_table['start_date']).dt.days
-
-columns_to_drop = ['first_name', 'last_name','location', 'app_id', 'area_name','id_x',  'id_y', 'start_date','end_date', 'plan_id_x', 'plan_id_y']
-merged_table = merged_table.drop(columns=columns_to_drop)
-
-
-categorical_columns = merged_table.select_dtypes(include=['object', 'category']).columns
-label_encoder = LabelEncoder()
-
-for col in categorical_columns:
-    merged_table[col] = label_encoder.fit_transform(merged_table[col])
-
-#print(merged_table.head(20))
+from database import engine
+from features import feature_frame, load_features
+from final_model import churn_target
+from plotting import show_plot
 
 """ Defining functions for evaluating ML models"""
 
@@ -90,11 +54,12 @@ def evaluate_model(y_true, y_pred, y_proba=None):
 
 
 
-def visualize_metrics(metrics_dict):
+def visualize_metrics(metrics_dict, name="metrics"):
     """
     Parameters:
         metrics_dict: A dictionary where keys are model names
                       and values are dictionaries of evaluation metrics.
+        name: Prefix of the figure file names, see plotting.show_plot.
     """
     # Convert metrics to a DataFrame
     metrics_df = pd.DataFrame(metrics_dict).T  # Transpose for easier plotting
@@ -111,7 +76,7 @@ def visualize_metrics(metrics_dict):
     plt.xticks(rotation=45)
     plt.legend(loc="best")
     plt.tight_layout()
-    plt.show()
+    show_plot(f"{name}_bar")
 
     # 2. Line Plot for Metrics
     plt.figure(figsize=(12, 6))
@@ -124,7 +89,7 @@ def visualize_metrics(metrics_dict):
     plt.legend(loc="best")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    show_plot(f"{name}_line")
 
     # 3. Individual Metric Distribution
     for metric in metrics_df.columns:
@@ -135,143 +100,163 @@ def visualize_metrics(metrics_dict):
         plt.xlabel("Models")
         plt.xticks(rotation=45)
         plt.tight_layout()
-        plt.show()
+        show_plot(f"{name}_{metric.lower().replace(' ', '_')}")
 
 
-""" Predicting status activity (churn rate)"""
+def compare_churn_models(merged_table):
+    """
+    Train the candidate churn classifiers and compare their metrics.
 
-# churn rate = (Number of Canceled/Expired Users) / (Total Users)
+    Parameters:
+        merged_table: Encoded features, from features.feature_frame.
 
-merged_table['is_churned'] = merged_table['status'].apply(lambda x: 1 if x in [1, 2] else 0)
+    Returns:
+        A DataFrame of metrics, one row per model.
+    """
+    # Predicting status activity (churn rate)
 
-# as our active status = 0, canceled = 1, expired = 2
-# to find churn rate we need canced/exprired percantage
+    # churn rate = (Number of Canceled/Expired Users) / (Total Users)
+    # as our active status = 0, canceled = 1, expired = 2
+    # to find churn rate we need canced/exprired percantage
 
-churn_rate = merged_table['is_churned'].mean()
-print(f"Churn Rate: {churn_rate:.2%}")
+    is_churned = churn_target(merged_table)
 
-# We have 61% churn rate
+    churn_rate = is_churned.mean()
+    print(f"Churn Rate: {churn_rate:.2%}")
 
-""" Model building """
+    # We have 61% churn rate
 
-# Define features  and target
-X = merged_table.drop(columns=['status', 'is_churned'])
-y = merged_table['is_churned']
+    # Model building
 
-#Splitting into train and test sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Define features  and target
+    X = merged_table.drop(columns=['status'])
+    y = is_churned
 
+    #Splitting into train and test sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-metrics_dict = {}
 
-models = {
-    "Random Forest": RandomForestClassifier(random_state=42),
-    "XGBoost": XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42),
-    "SVM": SVC(probability=True, random_state=42),  # SVM with probabilities
-    "Logistic Regression": LogisticRegression(random_state=42),
-    "Bagging": BaggingClassifier(estimator=LogisticRegression(), random_state=42)
-}
+    metrics_dict = {}
 
+    models = {
+        "Random Forest": RandomForestClassifier(random_state=42),
+        "XGBoost": XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42),
+        "SVM": SVC(probability=True, random_state=42),  # SVM with probabilities
+        "Logistic Regression": LogisticRegression(random_state=42),
+        "Bagging": BaggingClassifier(estimator=LogisticRegression(), random_state=42)
+    }
 
-for model_name, model in models.items():
-    print(f"Training {model_name}...")
 
-    model.fit(X_train, y_train)
+    for model_name, model in models.items():
+        print(f"Training {model_name}...")
 
-    y_pred = model.predict(X_test)
-    y_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, "predict_proba") else None
+        model.fit(X_train, y_train)
 
+        y_pred = model.predict(X_test)
+        y_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, "predict_proba") else None
 
-    metrics = {
-        "Accuracy": accuracy_score(y_test, y_pred),
-        "Precision": precision_score(y_test, y_pred),
-        "Recall": recall_score(y_test, y_pred),
-        "F1-Score": f1_score(y_test, y_pred),
-        "ROC AUC": roc_auc_score(y_test, y_proba) if y_proba is not None else "N/A"
-    }
 
+        metrics_dict[model_name] = evaluate_model(y_test, y_pred, y_proba)
 
-    metrics_dict[model_name] = metrics
 
+    for model_name, metrics in metrics_dict.items():
+        print(f"\n{model_name} Metrics:")
+        for metric, value in metrics.items():
+            print(f"{metric}: {value}")
 
-for model_name, metrics in metrics_dict.items():
-    print(f"\n{model_name} Metrics:")
-    for metric, value in metrics.items():
-        print(f"{metric}: {value}")
+    # Visualize metrics
+    visualize_metrics(metrics_dict, "churn_metrics")
 
-# Visualize metrics
-visualize_metrics(metrics_dict)
 
 
+    metrics_df = pd.DataFrame(metrics_dict).T
 
-metrics_df = pd.DataFrame(metrics_dict).T
+    # Display the metrics sorted by F1-Score
+    # I decided to go with F1- score as it is better for predicting churn rate
+    # Precision: Minimize unnecessary retention efforts for users who wouldn't churn.
+    # Recall: Ensure you capture as many churned users as possible.
+    # F1 Score balances these priorities.
 
-# Display the metrics sorted by F1-Score
-# I decided to go with F1- score as it is better for predicting churn rate
-# Precision: Minimize unnecessary retention efforts for users who wouldn't churn.
-# Recall: Ensure you capture as many churned users as possible.
-# F1 Score balances these priorities.
+    best_model = metrics_df.sort_values(by="F1-Score", ascending=False).iloc[0]
+    print("Best Model Based on F1-Score:\n", best_model)
 
-best_model = metrics_df.sort_values(by="F1-Score", ascending=False).iloc[0]
-print("Best Model Based on F1-Score:\n", best_model)
+    print("\nAll Model Metrics:\n", metrics_df)
 
-print("\nAll Model Metrics:\n", metrics_df)
 
+    sorted_metrics = metrics_df.sort_values(by="F1-Score", ascending=False)
+    print("\nMetrics Sorted by F1-Score:\n", sorted_metrics)
 
-sorted_metrics = metrics_df.sort_values(by="F1-Score", ascending=False)
-print("\nMetrics Sorted by F1-Score:\n", sorted_metrics)
+    best_model_name = sorted_metrics.index[0]
+    print(f"\nOverall Best Model Based on F1-Score: {best_model_name}")
 
-best_model_name = sorted_metrics.index[0]
-print(f"\nOverall Best Model Based on F1-Score: {best_model_name}")
+    # Logistic Regressing has the highest Accuracy and F1-score, so for our future prediction for churn rate
+    # we can proceed with Logistic regression as the best model
+    return metrics_df
 
 
-""" Logistic Regressing has the highest Accuracy and F1-score, so for our future prediction for churn rate
-    we can proceed with Logistic regression as the best model"""
-
+def compare_duration_models(merged_table):
+    """
+    Train the candidate subscription duration regressors and compare their metrics.
 
+    Parameters:
+        merged_table: Encoded features, from features.feature_frame.
 
+    Returns:
+        A DataFrame of metrics, one row per model.
+    """
+    # Predicting subscription duration
+
+    X = merged_table.drop(columns=['subscription_duration'])  # Drop target variable
+    X['is_churned'] = churn_target(merged_table)
+    y = merged_table['subscription_duration']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    models = {
+        "Random Forest": RandomForestRegressor(random_state=42),
+        "XGBoost": XGBRegressor(random_state=42),
+        "Support Vector Regressor": SVR(),
+        "Linear Regression": LinearRegression(),
+        "Bagging": BaggingRegressor(estimator=LinearRegression(), random_state=42)
+    }
 
+    metrics_dict = {}
 
-"""  Predicting subscription duration """
+    for model_name, model in models.items():
+        print(f"Training {model_name}...")
 
-X = merged_table.drop(columns=['subscription_duration'])  # Drop target variable
-y = merged_table['subscription_duration']
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        model.fit(X_train, y_train)
 
-models = {
-    "Random Forest": RandomForestRegressor(random_state=42),
-    "XGBoost": XGBRegressor(random_state=42),
-    "Support Vector Regressor": SVR(),
-    "Linear Regression": LinearRegression(),
-    "Bagging": BaggingRegressor(estimator=LinearRegression(), random_state=42)
-}
 
-metrics_dict = {}
+        y_pred = model.predict(X_test)
 
-for model_name, model in models.items():
-    print(f"Training {model_name}...")
+        metrics = {
+            "MAE": mean_absolute_error(y_test, y_pred),
+            "MSE": mean_squared_error(y_test, y_pred),
+            "RMSE": np.sqrt(mean_squared_error(y_test, y_pred)),
+            "R² Score": r2_score(y_test, y_pred)
+        }
+        metrics_dict[model_name] = metrics
 
-    model.fit(X_train, y_train)
+    metrics_df = pd.DataFrame(metrics_dict).T
+    print("\nRegression Metrics:\n", metrics_df)
 
+    visualize_metrics(metrics_dict, "duration_metrics")
 
-    y_pred = model.predict(X_test)
+    # For subscription duration prediction, Random forest performs the best,
+    # demonstrating the lowest values across all key metrics
+    return metrics_df
 
-    metrics = {
-        "MAE": mean_absolute_error(y_test, y_pred),
-        "MSE": mean_squared_error(y_test, y_pred),
-        "RMSE": np.sqrt(mean_squared_error(y_test, y_pred)),
-        "R² Score": r2_score(y_test, y_pred)
-    }
-    metrics_dict[model_name] = metrics
 
-metrics_df = pd.DataFrame(metrics_dict).T
-print("\nRegression Metrics:\n", metrics_df)
+def main():
+    # Same encoded features as final_model.py, shared through the feature cache
+    merged_table = feature_frame(load_features(engine))
 
-visualize_metrics(metrics_dict)
+    compare_churn_models(merged_table)
+    compare_duration_models(merged_table)
 
-""" For subscription duration prediction, Random forest performs the best, 
-    demonstrating the lowest values across all key metrics"""
+    # In summary, for Churn rate prediction we will go with logistic regression model
+    # and for Subscription durationg prediction we will go with Random Forest model
 
 
-"""In summary, for Churn rate prediction we will go with logistic regression model 
-    and for Subscription durationg prediction we will go with Random Forest model"""
\ No newline at end of file
+if __name__ == "__main__":
+    main()
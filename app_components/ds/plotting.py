@@ -0,0 +1,31 @@
+"""
+Display of the DS figures.
+
+Figures are not shown by default, since plt.show() blocks a script until
+every window is closed. Set DS_SHOW_PLOTS=1 to open them, or DS_PLOT_DIR to
+save them as PNG files.
+"""
+import os
+
+import matplotlib.pyplot as plt
+
+# Set to 1 to open a window for every figure
+SHOW_PLOTS = os.environ.get("DS_SHOW_PLOTS", "0") == "1"
+
+# Folder receiving every figure as <name>.png, if set
+PLOT_DIR = os.environ.get("DS_PLOT_DIR")
+
+
+def show_plot(name):
+    """
+    Shows and/or saves the current figure, as configured, then closes it.
+
+    Args:
+        name (str): File name of the figure, without extension.
+    """
+    if PLOT_DIR:
+        os.makedirs(PLOT_DIR, exist_ok=True)
+        plt.savefig(os.path.join(PLOT_DIR, f"{name}.png"))
+    if SHOW_PLOTS:
+        plt.show()
+    plt.close("all")
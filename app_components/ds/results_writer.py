@@ -0,0 +1,118 @@
+"""
+Keyed bulk write-back of the model outputs to the results table.
+
+write_scores copies every chunk of (customer_id, churn_probability,
+cluster_number) into a temporary staging table with COPY, as it arrives.
+Once the chunks are exhausted it applies them with one set-based UPDATE ...
+FROM, keyed on customer_id, and inserts the customers the results table
+does not have yet, in the same transaction. Readers see either all the new
+results or none. The results table is never dropped or replaced, so its
+column types, keys and indexes are kept.
+
+When a customer_id is staged more than once, the last row staged wins.
+"""
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+CREATE_STAGING = """
+    CREATE TEMPORARY TABLE results_staging (
+        position bigserial,
+        customer_id bigint NOT NULL,
+        churn_probability double precision,
+        cluster_number integer
+    ) ON COMMIT DROP
+"""
+
+COPY_STAGING = """
+    COPY results_staging (customer_id, churn_probability, cluster_number) FROM STDIN WITH (FORMAT csv)
+"""
+
+CREATE_SCORES = """
+    CREATE TEMPORARY TABLE results_scores ON COMMIT DROP AS
+    SELECT DISTINCT ON (customer_id) customer_id, churn_probability, cluster_number
+    FROM results_staging
+    ORDER BY customer_id, position DESC
+"""
+
+UPDATE_RESULTS = """
+    UPDATE results
+    SET churn_probability = scores.churn_probability, cluster_number = scores.cluster_number
+    FROM results_scores scores
+    WHERE results.customer_id = scores.customer_id
+"""
+
+# Numbers the inserted rows after the highest id: the ETL loads ids explicitly, so a sequence may lag behind them
+INSERT_MISSING = """
+    INSERT INTO results (id, customer_id, churn_probability, cluster_number)
+    SELECT (SELECT COALESCE(MAX(id), 0) FROM results) + ROW_NUMBER() OVER (ORDER BY scores.customer_id),
+           scores.customer_id, scores.churn_probability, scores.cluster_number
+    FROM results_scores scores
+    WHERE NOT EXISTS (SELECT 1 FROM results WHERE results.customer_id = scores.customer_id)
+"""
+
+# Moves the sequence of the id column, if it has one, past the inserted ids
+SYNC_ID_SEQUENCE = """
+    SELECT setval(pg_get_serial_sequence('results', 'id'), MAX(id))
+    FROM results
+    WHERE pg_get_serial_sequence('results', 'id') IS NOT NULL
+    HAVING MAX(id) IS NOT NULL
+"""
+
+
+def stage_scores(cursor, scores):
+    """
+    Copies one chunk of scores into the staging table.
+
+    Args:
+        cursor: psycopg2 cursor of the write-back transaction.
+        scores (pd.DataFrame): customer_id, churn_probability and cluster_number.
+
+    Returns:
+        int: Rows staged.
+    """
+    buffer = io.StringIO()
+    scores[["customer_id", "churn_probability", "cluster_number"]].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_STAGING, buffer)
+    return len(scores)
+
+
+def write_scores(engine, score_chunks):
+    """
+    Writes scores to the results table, keyed on customer_id, in one transaction.
+
+    Every chunk is staged as soon as it is produced, so score_chunks can be
+    a generator that computes the next chunk only after the previous one
+    was written.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        score_chunks (iterable): DataFrames of customer_id, churn_probability and cluster_number.
+
+    Returns:
+        dict: Rows staged under "staged", results updated under "updated"
+        and results inserted under "inserted".
+    """
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING)
+            staged = sum(stage_scores(cursor, scores) for scores in score_chunks)
+            cursor.execute(CREATE_SCORES)
+            cursor.execute("ANALYZE results_scores")
+            cursor.execute(UPDATE_RESULTS)
+            updated = cursor.rowcount
+            cursor.execute(INSERT_MISSING)
+            inserted = cursor.rowcount
+            if inserted:
+                cursor.execute(SYNC_ID_SEQUENCE)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    logger.info(f"Results written: {updated} updated, {inserted} inserted from {staged} staged rows")
+    return {"staged": staged, "updated": updated, "inserted": inserted}
@@ -0,0 +1,145 @@
+"""
+Batch scoring of the customers in bounded memory.
+
+score_in_chunks streams the feature query through a server-side cursor,
+CHUNK_ROWS rows at a time. Every chunk is encoded with the encoders saved
+with the models, scored and segmented with one vectorized call each, and
+copied to the database (see results_writer) before the next chunk is
+fetched. Memory use therefore depends on the chunk size, not on the number
+of customers. The results table is updated from the copied chunks at the
+end, in one transaction. A customer with several subscriptions keeps the
+results of the last one, in the order of the feature query. Text values the
+models were not trained on are scored with a fallback code (see
+features.encode_labels) and counted, instead of failing the run.
+"""
+import logging
+import os
+import time
+
+import pandas as pd
+
+from features import FEATURE_COLUMNS, feature_query, transform_features
+from results_writer import write_scores
+
+logger = logging.getLogger(__name__)
+
+# Feature rows fetched, scored and written at a time
+CHUNK_ROWS = int(os.environ.get("DS_SCORING_CHUNK_ROWS", 100000))
+
+def iter_feature_chunks(engine, chunk_rows):
+    """
+    Streams the rows of the feature query through a server-side cursor.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        pd.DataFrame: customer_id followed by FEATURE_COLUMNS, chunk_rows rows at most.
+    """
+    with engine.connect() as connection:
+        query = feature_query(connection)
+        streaming = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+        yield from pd.read_sql_query(query, streaming, chunksize=chunk_rows)
+
+
+def artifact_inputs(matrix, artifact):
+    """
+    Selects the feature columns a model takes, in its order.
+
+    Args:
+        matrix (np.ndarray): Encoded features, in FEATURE_COLUMNS order.
+        artifact (dict): The model's artifact, see artifacts.load_or_train.
+
+    Returns:
+        pd.DataFrame: The model inputs.
+    """
+    positions = [FEATURE_COLUMNS.index(column) for column in artifact["columns"]]
+    return pd.DataFrame(matrix[:, positions], columns=artifact["columns"])
+
+
+def score_chunk(chunk, churn_artifact, segment_artifact, unseen_counts=None):
+    """
+    Scores and segments one chunk of feature rows.
+
+    Args:
+        chunk (pd.DataFrame): Rows of the feature query.
+        churn_artifact (dict): Artifact of the churn model.
+        segment_artifact (dict): Artifact of the segmentation model.
+        unseen_counts (dict, optional): Column name mapped to the number of
+            values the models were not trained on, updated in place.
+
+    Returns:
+        pd.DataFrame: customer_id, churn_probability and cluster_number, one row per customer.
+    """
+    matrix = transform_features(chunk, churn_artifact["encoders"], unseen_counts)
+    scores = pd.DataFrame({
+        "customer_id": chunk["customer_id"].to_numpy(),
+        "churn_probability": churn_artifact["model"].predict_proba(artifact_inputs(matrix, churn_artifact))[:, 1],
+        "cluster_number": segment_artifact["model"].predict(artifact_inputs(matrix, segment_artifact)),
+    })
+    return scores.drop_duplicates("customer_id", keep="last")
+
+
+def iter_scores(engine, churn_artifact, segment_artifact, chunk_rows, stats):
+    """
+    Scores the feature rows chunk by chunk, fetching a chunk only when the previous one was consumed.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        churn_artifact (dict): Artifact of the churn model.
+        segment_artifact (dict): Artifact of the segmentation model.
+        chunk_rows (int): Rows per chunk.
+        stats (dict): Counts of "rows" and "chunks", and the unseen values
+            per column under "unseen", updated in place.
+
+    Yields:
+        pd.DataFrame: Result of score_chunk for every chunk.
+    """
+    for chunk in iter_feature_chunks(engine, chunk_rows):
+        scores = score_chunk(chunk, churn_artifact, segment_artifact, stats["unseen"])
+        stats["rows"] += len(chunk)
+        stats["chunks"] += 1
+        logger.debug(f"Scored chunk {stats['chunks']}: {len(chunk)} rows")
+        yield scores
+
+
+def score_in_chunks(engine, churn_artifact, segment_artifact, chunk_rows=None):
+    """
+    Scores every customer chunk by chunk, staging each chunk's results before fetching the next.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        churn_artifact (dict): Artifact of the churn model.
+        segment_artifact (dict): Artifact of the segmentation model.
+        chunk_rows (int, optional): Rows per chunk. Defaults to CHUNK_ROWS.
+
+    Returns:
+        dict: Feature rows scored under "rows", chunks under "chunks",
+        customers written under "customers", of which "updated" and
+        "inserted", values the models were not trained on per column under
+        "unseen", wall time under "seconds" and throughput under
+        "rows_per_second".
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    start = time.perf_counter()
+    stats = {"rows": 0, "chunks": 0, "unseen": {}}
+    written = write_scores(engine, iter_scores(engine, churn_artifact, segment_artifact, chunk_rows, stats))
+    seconds = time.perf_counter() - start
+    stats.update(
+        customers=written["updated"] + written["inserted"],
+        updated=written["updated"],
+        inserted=written["inserted"],
+        seconds=seconds,
+        rows_per_second=stats["rows"] / max(seconds, 1e-9),
+    )
+    if stats["unseen"]:
+        logger.warning(
+            f"Scored values the models were not trained on with a fallback code: "
+            f"{', '.join(f'{column} ({count})' for column, count in stats['unseen'].items())}"
+        )
+    logger.info(
+        f"Scored {stats['rows']} rows in {stats['chunks']} chunk(s) in {seconds:.2f}s "
+        f"({stats['rows_per_second']:,.0f} rows/s)"
+    )
+    return stats
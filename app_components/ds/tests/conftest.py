@@ -0,0 +1,30 @@
+"""
+Shared setup of the data science tests.
+
+The tests run without a database, except the ones marked as needing
+PostgreSQL, which run against TEST_DATABASE_URL when it points at one and
+are skipped otherwise. They only create and drop their own schema there.
+
+Run from the repository root or the ds folder:
+    python -m pytest app_components/ds/tests
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def postgres_engine():
+    """
+    Engine of the PostgreSQL database of TEST_DATABASE_URL.
+    """
+    url = os.environ.get("TEST_DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        pytest.skip("TEST_DATABASE_URL does not point at a PostgreSQL database")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
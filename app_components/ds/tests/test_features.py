@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LogisticRegression
+
+from features import FEATURE_COLUMNS, encode_features, encode_labels, transform_features
+from scoring import artifact_inputs, score_chunk
+
+
+def feature_rows(locations):
+    """
+    Builds feature query rows, one per location.
+
+    Args:
+        locations (list): Location of every row.
+
+    Returns:
+        pd.DataFrame: customer_id and FEATURE_COLUMNS.
+    """
+    count = len(locations)
+    return pd.DataFrame({
+        "customer_id": np.arange(1, count + 1),
+        "gender": ["Male", "Female"] * (count // 2) + ["Male"] * (count % 2),
+        "age": np.arange(20, 20 + count),
+        "location": locations,
+        "status": ["Active", "Inactive"] * (count // 2) + ["Active"] * (count % 2),
+        "duration": np.arange(count) % 12 + 1.0,
+        "device_type": ["Phone"] * count,
+        "application_name": ["Yandex Music"] * count,
+        "price": np.full(count, 6.49),
+        "notification_type": ["Email"] * count,
+        "plan_type": ["Basic"] * count,
+        "subscription_duration": np.arange(count) * 30.0,
+    })
+
+
+def test_unseen_labels_get_the_reserved_code():
+    _, encoders = encode_features(feature_rows(["Akron", "Boston", "Chicago", "Akron"]))
+
+    codes, unseen = encode_labels(encoders["location"], pd.Series(["Boston", "Gotham", "Akron", "Metropolis"]))
+
+    assert codes.tolist() == [1.0, 3.0, 0.0, 3.0]
+    assert unseen.tolist() == [False, True, False, True]
+
+
+def test_transform_counts_the_unseen_labels():
+    training = feature_rows(["Akron", "Boston", "Chicago", "Akron"])
+    matrix, encoders = encode_features(training)
+    unseen_counts = {}
+
+    assert np.array_equal(transform_features(training, encoders, unseen_counts), matrix)
+    assert unseen_counts == {}
+
+    transformed = transform_features(feature_rows(["Gotham", "Boston"]), encoders, unseen_counts)
+    transform_features(feature_rows(["Gotham"]), encoders, unseen_counts)
+
+    assert transformed[:, FEATURE_COLUMNS.index("location")].tolist() == [3.0, 1.0]
+    assert unseen_counts == {"location": 2}
+
+
+def test_chunk_with_unseen_labels_is_scored():
+    training = feature_rows(["Akron", "Boston", "Chicago", "Akron", "Boston", "Chicago"])
+    matrix, encoders = encode_features(training)
+    churn_artifact = {"model": LogisticRegression(), "encoders": encoders, "columns": ["age", "location", "duration"]}
+    segment_artifact = {"model": KMeans(n_clusters=2, n_init=1, random_state=0), "encoders": encoders,
+                        "columns": FEATURE_COLUMNS}
+    churn_artifact["model"].fit(artifact_inputs(matrix, churn_artifact), training["status"] == "Active")
+    segment_artifact["model"].fit(artifact_inputs(matrix, segment_artifact))
+    unseen_counts = {}
+
+    scores = score_chunk(feature_rows(["Gotham", "Akron", "Gotham"]), churn_artifact, segment_artifact, unseen_counts)
+
+    assert scores["customer_id"].tolist() == [1, 2, 3]
+    assert scores["churn_probability"].between(0, 1).all()
+    assert scores["cluster_number"].isin([0, 1]).all()
+    assert unseen_counts == {"location": 2}
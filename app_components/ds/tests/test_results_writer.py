@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from results_writer import write_scores
+
+
+@pytest.fixture
+def results_engine(postgres_engine):
+    """
+    Engine whose results table is a scratch one, in a schema dropped after the test.
+
+    Holds customers 1 and 2, with id 2 for customer 2 so the inserted ids follow the highest one.
+    """
+    schema = f"results_writer_test_{os.getpid()}"
+    with postgres_engine.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+        connection.execute(text(
+            f"CREATE TABLE {schema}.results (id integer PRIMARY KEY, customer_id integer NOT NULL, "
+            f"churn_probability numeric(5, 2), cluster_number integer)"
+        ))
+        connection.execute(text(f"INSERT INTO {schema}.results VALUES (1, 1, 0.10, 0), (2, 2, NULL, NULL)"))
+    engine = create_engine(postgres_engine.url, connect_args={"options": f"-csearch_path={schema}"})
+    yield engine
+    engine.dispose()
+    with postgres_engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+
+def scores(rows):
+    return pd.DataFrame(rows, columns=["customer_id", "churn_probability", "cluster_number"])
+
+
+def test_existing_customers_are_updated_and_new_ones_inserted(results_engine):
+    chunks = [
+        scores([(2, 0.25, 1), (3, 0.5, 0)]),
+        scores([(3, 0.75, 1), (4, 0.9, 2)]),
+    ]
+
+    counts = write_scores(results_engine, iter(chunks))
+
+    assert counts == {"staged": 4, "updated": 1, "inserted": 2}
+    with results_engine.connect() as connection:
+        results = connection.execute(text(
+            "SELECT id, customer_id, churn_probability::float, cluster_number FROM results ORDER BY id"
+        )).all()
+    assert [tuple(row) for row in results] == [
+        (1, 1, 0.1, 0),
+        (2, 2, 0.25, 1),
+        (3, 3, 0.75, 1),
+        (4, 4, 0.9, 2),
+    ]
+
+
+def test_failed_write_changes_nothing(results_engine):
+    def failing_chunks():
+        yield scores([(1, 0.5, 1), (5, 0.5, 1)])
+        raise RuntimeError("scoring failed")
+
+    with pytest.raises(RuntimeError):
+        write_scores(results_engine, failing_chunks())
+
+    with results_engine.connect() as connection:
+        results = connection.execute(text("SELECT customer_id, churn_probability::float FROM results ORDER BY id")).all()
+    assert [tuple(row) for row in results] == [(1, 0.1), (2, None)]
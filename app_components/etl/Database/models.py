@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, Float, Date, String, ForeignKey, DECIMAL
+import logging
+import os
+from sqlalchemy import Column, Integer, BigInteger, Float, Date, DateTime, String, ForeignKey, DECIMAL, JSON
 from sqlalchemy.orm import declarative_base, relationship
 import sqlalchemy.exc
 from Database.database import Base, engine
@@ -6,6 +8,17 @@ from Database.database import Base, engine
 
 Base = declarative_base()
 
+# Subscription is range partitioned by start_date when ETL_SUBSCRIPTION_PARTITIONING
+# is set (see etl/partitioning.py); PostgreSQL then needs start_date in the primary key.
+# The value is checked here, before create_all below can create the table.
+SUBSCRIPTION_PARTITIONING = os.environ.get("ETL_SUBSCRIPTION_PARTITIONING", "")
+if SUBSCRIPTION_PARTITIONING not in ("", "monthly", "yearly"):
+    raise ValueError(f"ETL_SUBSCRIPTION_PARTITIONING must be monthly or yearly, got {SUBSCRIPTION_PARTITIONING!r}")
+SUBSCRIPTION_PARTITIONED = SUBSCRIPTION_PARTITIONING != ""
+
+# Columns flagged with info={"categorical": True} hold a small set of repeated
+# values; the ETL parses them as pandas categoricals. info["min"] and
+# info["max"] bound the values the ETL accepts before loading.
 
 class Location(Base):
     """
@@ -40,9 +53,9 @@ class Customer(Base):
     customer_id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String)
     last_name = Column(String)
-    gender = Column(String)
+    gender = Column(String, info={"categorical": True})
     birth_date = Column(Date)
-    age = Column(Integer)
+    age = Column(Integer, info={"min": 0, "max": 120})
     location_id = Column(Integer, ForeignKey("location.location_id"), nullable=False)
     email = Column(String, unique=True)
 
@@ -60,7 +73,7 @@ class Plan(Base):
     """
     __tablename__ = "plan"
     plan_id = Column(Integer, primary_key=True, index=True)
-    plan_type = Column(String, index=True)
+    plan_type = Column(String, index=True, info={"categorical": True})
 
     prices = relationship("Price", back_populates="plan")
     subscriptions = relationship("Subscription", back_populates="plan")
@@ -77,7 +90,7 @@ class Application(Base):
     """
     __tablename__ = "application"
     application_id = Column(Integer, primary_key=True, index=True)
-    application_name = Column(String, index=True)
+    application_name = Column(String, index=True, info={"categorical": True})
 
     prices = relationship("Price", back_populates="application")
     subscriptions = relationship("Subscription", back_populates="application")
@@ -100,7 +113,7 @@ class Price(Base):
     price_id = Column(Integer, primary_key=True, index=True)
     application_id = Column(Integer, ForeignKey("application.application_id"), nullable=False)
     plan_id = Column(Integer, ForeignKey("plan.plan_id"), nullable=False)
-    price = Column(DECIMAL(10, 2))
+    price = Column(DECIMAL(10, 2), info={"min": 0})
 
     application = relationship("Application", back_populates="prices")
     plan = relationship("Plan", back_populates="prices")
@@ -118,7 +131,7 @@ class Notification(Base):
     """
     __tablename__ = "notification"
     notification_id = Column(Integer, primary_key=True, index=True)
-    notification_type = Column(String)
+    notification_type = Column(String, info={"categorical": True})
 
     subscriptions = relationship("Subscription", back_populates="notification")
 
@@ -142,6 +155,7 @@ class Subscription(Base):
         device_type (str): Type of device associated with the subscription.
     """
     __tablename__ = "subscription"
+    __table_args__ = {"postgresql_partition_by": "RANGE (start_date)"} if SUBSCRIPTION_PARTITIONED else {}
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customer.customer_id"), nullable=False)
     location_id = Column(Integer, ForeignKey("location.location_id"), nullable=False)
@@ -149,11 +163,11 @@ class Subscription(Base):
     plan_id = Column(Integer, ForeignKey("plan.plan_id"), nullable=False)
     price_id = Column(Integer, ForeignKey("price.price_id"), nullable=False)
     notification_id = Column(Integer, ForeignKey("notification.notification_id"), nullable=False)
-    start_date = Column(Date)
-    status = Column(String)
+    start_date = Column(Date, primary_key=SUBSCRIPTION_PARTITIONED)
+    status = Column(String, info={"categorical": True})
     end_date = Column(Date)
-    duration = Column(DECIMAL(10, 2))
-    device_type = Column(String)
+    duration = Column(DECIMAL(10, 2), info={"min": 0})
+    device_type = Column(String, info={"categorical": True})
 
     customer = relationship("Customer", back_populates="subscriptions")
     location = relationship("Location", back_populates="subscriptions")
@@ -175,7 +189,99 @@ class Results(Base):
     __tablename__ = "results"
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customer.customer_id"), nullable=False)
-    churn_probability = Column(DECIMAL(5, 2))
-    cluster_number = Column(Integer)
+    churn_probability = Column(DECIMAL(5, 2), info={"min": 0, "max": 1})
+    cluster_number = Column(Integer, info={"min": 0})
+
+
+class CustomerMergeMap(Base):
+    """
+    Maps the customers merged away by the ETL de-duplication to the customer they were merged into.
+
+    Attributes:
+        duplicate_id (int): Primary key, customer_id of the merged duplicate.
+        customer_id (int): customer_id of the surviving customer.
+        identity_key (str): Hash of the normalised name, email and birth date the two share.
+        merged_at (datetime): When the merge was recorded.
+    """
+    __tablename__ = "customer_merge_map"
+    duplicate_id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, index=True, nullable=False)
+    identity_key = Column(String(16))
+    merged_at = Column(DateTime)
+
+
+class IngestionManifest(Base):
+    """
+    Records the fingerprint of every source file loaded by the ETL.
+
+    Attributes:
+        file_name (str): Name of the source file, primary key.
+        table_name (str): Table the file is loaded into.
+        content_hash (str): SHA-256 digest of the file contents.
+        size_bytes (int): Size of the file in bytes.
+        row_count (int): Number of rows loaded from the file.
+        loaded_at (datetime): When the file was last loaded.
+    """
+    __tablename__ = "etl_manifest"
+    file_name = Column(String, primary_key=True)
+    table_name = Column(String, index=True)
+    content_hash = Column(String(64), nullable=False)
+    size_bytes = Column(BigInteger)
+    row_count = Column(BigInteger)
+    loaded_at = Column(DateTime)
 
-Base.metadata.create_all(engine)
+
+class IngestionDelta(Base):
+    """
+    Represents a row-level change detected in a reloaded source file.
+
+    Attributes:
+        id (int): Primary key for the delta table.
+        table_name (str): Table the changed row belongs to.
+        row_key (str): Value of the key column of the changed row.
+        change_type (str): One of inserted, updated or deleted.
+        detected_at (datetime): When the change was detected.
+    """
+    __tablename__ = "etl_delta"
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, index=True)
+    row_key = Column(String)
+    change_type = Column(String)
+    detected_at = Column(DateTime, index=True)
+
+
+class EtlRun(Base):
+    """
+    Represents one run of the ETL, with its timings and volumes.
+
+    Attributes:
+        id (int): Primary key for the run table.
+        started_at (datetime): When the run started.
+        finished_at (datetime): When the run finished.
+        load_mode (str): Load mode the tables were loaded with.
+        status (str): succeeded, failed or unchanged.
+        seconds (float): Wall time of the run.
+        rows (int): Rows loaded over all tables.
+        bytes_read (int): Bytes of source files read.
+        peak_rss_bytes (int): Peak resident memory of the process.
+        stages (dict): Seconds spent per stage.
+        tables (dict): Per-table rows, bytes, timings and memory.
+    """
+    __tablename__ = "etl_runs"
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, index=True)
+    finished_at = Column(DateTime)
+    load_mode = Column(String)
+    status = Column(String)
+    seconds = Column(Float)
+    rows = Column(BigInteger)
+    bytes_read = Column(BigInteger)
+    peak_rss_bytes = Column(BigInteger)
+    stages = Column(JSON)
+    tables = Column(JSON)
+
+try:
+    Base.metadata.create_all(engine)
+except sqlalchemy.exc.SQLAlchemyError as e:
+    # Tables replaced by the CSV loads have no primary keys for new foreign keys to reference
+    logging.getLogger(__name__).warning(f"Could not create every ORM table: {e}")
@@ -0,0 +1,352 @@
+"""
+Benchmarks the ETL across dataset sizes and load modes.
+
+For every size a synthetic dataset is generated with generate_data (and kept
+for later runs). For every load mode the tables are then loaded one at a
+time, in foreign-key order, each by run_etl in a fresh process, so that the
+peak RSS of the process is the peak memory of that table's load. Per table
+the run records rows/second, wall time, peak RSS and the time the database
+server spent executing the statements of the table's run, DDL and
+bookkeeping included; per case it records the total wall time and the
+highest peak RSS. Loading the tables one at a time leaves out the
+concurrency between tables that a normal run has. Results are written as
+JSON and can be compared with a previous results file to flag regressions.
+
+The server time is the growth of active_time in pg_stat_database while the
+table loads, so it needs PostgreSQL 14 or later and is skewed by other
+clients of the same database. It is recorded as null on other databases.
+
+Run it from the etl folder, like etl.py:
+    python benchmark.py --sizes 10000,100000 --modes copy,chunked --output bench_data/bench.json
+    python benchmark.py --database-url sqlite:///bench_data/bench.db --baseline bench_data/bench.json
+Datasets and results are kept in BENCH_DATA_DIR, which git ignores.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from graphlib import TopologicalSorter
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from generate_data import generate_dataset
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCH_DATA_DIR = "bench_data"
+
+
+# Seconds to wait for the ETL's connections to close before reading the server time
+BACKEND_EXIT_TIMEOUT = 10
+
+
+def client_backends(connection):
+    """
+    Counts the other client connections to the current database.
+
+    Args:
+        connection: SQLAlchemy connection to PostgreSQL.
+
+    Returns:
+        int: Number of client backends, excluding this one.
+    """
+    return connection.execute(text(
+        "SELECT count(*) FROM pg_stat_activity "
+        "WHERE datname = current_database() AND backend_type = 'client backend' AND pid <> pg_backend_pid()"
+    )).scalar()
+
+
+def server_active_seconds(connection):
+    """
+    Reads the total time the server has spent executing statements in the current database.
+
+    Backends report their statistics when they exit, so the value only
+    covers connections that are closed.
+
+    Args:
+        connection: SQLAlchemy connection to PostgreSQL, in autocommit mode.
+
+    Returns:
+        float: Seconds of statement execution, or None if the server does not track it.
+    """
+    try:
+        connection.execute(text("SELECT pg_stat_clear_snapshot()"))
+        active_ms = connection.execute(text(
+            "SELECT active_time FROM pg_stat_database WHERE datname = current_database()"
+        )).scalar()
+    except DBAPIError:
+        return None
+    return None if active_ms is None else active_ms / 1000
+
+
+def wait_for_backends(connection, count):
+    """
+    Waits until at most a given number of other client connections remain, or BACKEND_EXIT_TIMEOUT passes.
+
+    Args:
+        connection: SQLAlchemy connection to PostgreSQL.
+        count (int): Number of other connections to wait for.
+    """
+    deadline = time.monotonic() + BACKEND_EXIT_TIMEOUT
+    while client_backends(connection) > count:
+        if time.monotonic() > deadline:
+            logger.warning("ETL connections are still open, the server time may be incomplete")
+            return
+        time.sleep(0.01)
+
+
+def load_order(env):
+    """
+    Lists the tables of the dataset in the order they can be loaded. Meant for a fresh process.
+
+    Args:
+        env (dict): Environment variables configuring the ETL.
+
+    Returns:
+        list: Table names, every table after the tables it references.
+    """
+    os.environ.update(env)
+    import etl
+
+    return list(TopologicalSorter(etl.build_load_graph(etl.discover_sources())).static_order())
+
+
+def run_table(env, table_name):
+    """
+    Loads one table with the ETL. Meant for a fresh process.
+
+    Args:
+        env (dict): Environment variables configuring the ETL.
+        table_name (str): Table to load.
+
+    Returns:
+        dict: Wall time, peak RSS, server time, database dialect and the
+        load statistics of the table, or None as statistics if it failed.
+    """
+    os.environ.update(env)
+    import etl
+
+    # Autocommit, so the monitoring connection does not hold a transaction open during the load
+    with etl.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as monitor:
+        postgresql = etl.engine.dialect.name == "postgresql"
+        if postgresql:
+            other_backends = client_backends(monitor)
+            active_before = server_active_seconds(monitor)
+        start = time.perf_counter()
+        etl.run_etl(tables=[table_name])
+        wall_seconds = time.perf_counter() - start
+        db_seconds = None
+        if postgresql:
+            # Closing the ETL's connections makes their backends report their statistics
+            etl.engine.dispose()
+            wait_for_backends(monitor, other_backends)
+            active_after = server_active_seconds(monitor)
+            if active_before is not None and active_after is not None:
+                db_seconds = active_after - active_before
+    return {
+        "wall_seconds": wall_seconds,
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "db_seconds": db_seconds,
+        "database": etl.engine.dialect.name,
+        "stats": etl.load_stats.get(table_name),
+    }
+
+
+def run_case(context, env):
+    """
+    Loads every table of a dataset, one fresh process per table.
+
+    Args:
+        context: multiprocessing context the processes are started from.
+        env (dict): Environment variables configuring the ETL.
+
+    Returns:
+        dict: Total wall time, highest peak RSS, database dialect and per-table statistics.
+    """
+    with context.Pool(1) as pool:
+        table_names = pool.apply(load_order, (env,))
+    tables = {}
+    database = None
+    for table_name in table_names:
+        with context.Pool(1) as pool:
+            run = pool.apply(run_table, (env, table_name))
+        database = run["database"]
+        stats = run["stats"]
+        if stats is None:
+            logger.warning(f"{table_name} failed to load, leaving it out of the results")
+            continue
+        tables[table_name] = {
+            "rows": stats["rows"],
+            "seconds": stats["seconds"],
+            "rows_per_second": stats["rows"] / max(stats["seconds"], 1e-9),
+            "wall_seconds": run["wall_seconds"],
+            "peak_rss_bytes": run["peak_rss_bytes"],
+            "db_seconds": run["db_seconds"],
+            # Client wall time spent in database calls, including the transfer of the rows
+            "client_db_seconds": stats.get("db_seconds"),
+            "mode": stats["mode"],
+        }
+    return {
+        "wall_seconds": sum(table["wall_seconds"] for table in tables.values()),
+        "peak_rss_bytes": max((table["peak_rss_bytes"] for table in tables.values()), default=0),
+        "database": database,
+        "tables": tables,
+    }
+
+
+def prepare_dataset(size, seed):
+    """
+    Generates the dataset of a given size unless it already exists.
+
+    Args:
+        size (int): Number of customers.
+        seed (int): Seed of the generator.
+
+    Returns:
+        str: Folder holding the dataset.
+    """
+    data_dir = os.path.join(BENCH_DATA_DIR, f"{size}_{seed}")
+    if not os.path.exists(os.path.join(data_dir, "subscription.csv")):
+        generate_dataset(data_dir, size, seed=seed)
+    return data_dir
+
+
+def run_benchmarks(sizes, modes, database_url=None, seed=42, use_cache=False):
+    """
+    Runs every size and load mode combination.
+
+    Args:
+        sizes (list): Dataset sizes, in customers.
+        modes (list): Load modes passed as ETL_LOAD_MODE.
+        database_url (str, optional): Database to load into. Defaults to DATABASE_URL.
+        seed (int): Seed of the generated datasets.
+        use_cache (bool): Whether the columnar cache may be used.
+
+    Returns:
+        list: One result per case.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        data_dir = prepare_dataset(size, seed)
+        for mode in modes:
+            env = {
+                "ETL_DATA_DIR": data_dir,
+                "ETL_LOAD_MODE": mode,
+                "ETL_INCREMENTAL": "0",
+                "ETL_COLUMNAR_CACHE": "1" if use_cache else "0",
+            }
+            if database_url:
+                env["DATABASE_URL"] = database_url
+            logger.info(f"Benchmarking {mode} on {size} customers")
+            case = run_case(context, env)
+            results.append({"size": size, "mode": mode, **case})
+            logger.info(f"{mode} on {size} customers: {case['wall_seconds']:.2f}s, "
+                        f"peak RSS {case['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+    return results
+
+
+def find_regressions(current, baseline, tolerance):
+    """
+    Compares two benchmark results files.
+
+    A regression is a drop in rows/second, or a rise in wall time, peak RSS
+    or server time, larger than the tolerance.
+
+    Args:
+        current (dict): Results of this run.
+        baseline (dict): Results to compare with.
+        tolerance (float): Allowed relative change, e.g. 0.1 for 10%.
+
+    Returns:
+        list: Human-readable descriptions of the regressions.
+    """
+    previous = {(case["size"], case["mode"]): case for case in baseline["results"]}
+    regressions = []
+    for case in current["results"]:
+        before = previous.get((case["size"], case["mode"]))
+        if before is None:
+            continue
+        label = f"{case['mode']} @ {case['size']}"
+        for metric in ("wall_seconds", "peak_rss_bytes"):
+            if case[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{label}: {metric} {before[metric]:.4g} -> {case[metric]:.4g}")
+        for table_name, stats in case["tables"].items():
+            old = before["tables"].get(table_name)
+            if not old:
+                continue
+            if stats["rows_per_second"] < old["rows_per_second"] * (1 - tolerance):
+                regressions.append(
+                    f"{label}: {table_name} rows/s {old['rows_per_second']:.0f} -> {stats['rows_per_second']:.0f}"
+                )
+            for metric in ("peak_rss_bytes", "db_seconds"):
+                if stats.get(metric) is not None and old.get(metric) is not None \
+                        and stats[metric] > old[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{label}: {table_name} {metric} {old[metric]:.4g} -> {stats[metric]:.4g}"
+                    )
+    return regressions
+
+
+def current_revision():
+    """
+    Returns the short git revision of the working tree, or "unknown".
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    """
+    Parses the command line, runs the benchmarks and checks for regressions.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the ETL load modes.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated customer counts")
+    parser.add_argument("--modes", default="copy,chunked,pandas,upsert", help="comma-separated load modes")
+    parser.add_argument("--database-url", help="database to load into (default: DATABASE_URL)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache", action="store_true", help="allow the columnar cache")
+    parser.add_argument("--output", default=os.path.join(BENCH_DATA_DIR, "benchmark_results.json"))
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args()
+
+    report = {
+        "revision": current_revision(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "results": run_benchmarks(
+            [int(size) for size in args.sizes.split(",")],
+            args.modes.split(","),
+            args.database_url,
+            args.seed,
+            args.cache,
+        ),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    logger.info(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = find_regressions(report, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
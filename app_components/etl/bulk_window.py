@@ -0,0 +1,168 @@
+"""
+Drops the secondary indexes and foreign keys of the tables being loaded for
+the duration of a bulk load, then rebuilds them from scratch: the indexes in
+parallel, the foreign keys as NOT VALID followed by a single validation pass.
+
+Primary keys and unique constraints are kept, since the upsert mode needs
+them to resolve conflicts.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from Database.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Number of indexes rebuilt at the same time, each on its own connection
+INDEX_WORKERS = int(os.environ.get("ETL_INDEX_WORKERS", 4))
+
+# Memory granted to each index build
+MAINTENANCE_WORK_MEM = os.environ.get("ETL_MAINTENANCE_WORK_MEM", "256MB")
+
+INDEX_QUERY = text("""
+    SELECT i.relname AS name, t.relname AS table_name, pg_get_indexdef(i.oid) AS definition
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = current_schema()
+      AND t.relname = ANY(:tables)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+""")
+
+FOREIGN_KEY_QUERY = text("""
+    SELECT c.conname AS name, t.relname AS table_name, pg_get_constraintdef(c.oid) AS definition,
+           t.relkind = 'p' AS partitioned
+    FROM pg_constraint c
+    JOIN pg_class t ON t.oid = c.conrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = current_schema()
+      AND c.contype = 'f'
+      AND t.relname = ANY(:tables)
+""")
+
+
+def capture_definitions(table_names):
+    """
+    Reads the definitions of the secondary indexes and foreign keys of some tables.
+
+    Args:
+        table_names (iterable): Tables to inspect.
+
+    Returns:
+        dict: Lists of rows with name, table_name and definition under
+        "indexes" and "foreign_keys".
+    """
+    tables = list(table_names)
+    with engine.connect() as connection:
+        return {
+            "indexes": [row._asdict() for row in connection.execute(INDEX_QUERY, {"tables": tables})],
+            "foreign_keys": [row._asdict() for row in connection.execute(FOREIGN_KEY_QUERY, {"tables": tables})],
+        }
+
+
+def drop_definitions(definitions):
+    """
+    Drops the captured indexes and foreign keys in one transaction.
+
+    Args:
+        definitions (dict): Result of capture_definitions.
+    """
+    with engine.begin() as connection:
+        for fk in definitions["foreign_keys"]:
+            connection.execute(text(f'ALTER TABLE "{fk["table_name"]}" DROP CONSTRAINT IF EXISTS "{fk["name"]}"'))
+        for index in definitions["indexes"]:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    logger.info(
+        f"Dropped {len(definitions['indexes'])} indexes and {len(definitions['foreign_keys'])} foreign keys"
+    )
+
+
+def build_index(index):
+    """
+    Creates one index on its own connection.
+
+    Args:
+        index (dict): Captured index with name, table_name and definition.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f"SET LOCAL maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'"))
+        connection.execute(text(index["definition"]))
+    logger.info(f"Rebuilt index {index['name']} on {index['table_name']}")
+
+
+def rebuild_definitions(definitions, workers=None):
+    """
+    Recreates the captured indexes in parallel, then restores and validates the foreign keys.
+
+    The foreign keys are added back as NOT VALID, which needs no scan, and
+    then validated in one pass over the constraints. A failed validation is
+    logged and leaves that constraint NOT VALID, so it still applies to new rows.
+    Partitioned tables do not support NOT VALID foreign keys, so theirs are
+    added and validated in one step; if that fails the constraint is missing
+    until the next load.
+
+    Args:
+        definitions (dict): Result of capture_definitions.
+        workers (int, optional): Indexes built concurrently. Defaults to INDEX_WORKERS.
+    """
+    with ThreadPoolExecutor(max_workers=workers or INDEX_WORKERS) as pool:
+        for future in [pool.submit(build_index, index) for index in definitions["indexes"]]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to rebuild index: {e}")
+
+    foreign_keys = definitions["foreign_keys"]
+    if not foreign_keys:
+        return
+    with engine.begin() as connection:
+        for fk in foreign_keys:
+            if not fk["partitioned"]:
+                connection.execute(text(
+                    f'ALTER TABLE "{fk["table_name"]}" ADD CONSTRAINT "{fk["name"]}" {fk["definition"]} NOT VALID'
+                ))
+    validated = 0
+    for fk in foreign_keys:
+        if fk["partitioned"]:
+            statement = f'ALTER TABLE "{fk["table_name"]}" ADD CONSTRAINT "{fk["name"]}" {fk["definition"]}'
+        else:
+            statement = f'ALTER TABLE "{fk["table_name"]}" VALIDATE CONSTRAINT "{fk["name"]}"'
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(statement))
+            validated += 1
+        except Exception as e:
+            state = "missing" if fk["partitioned"] else "left NOT VALID"
+            logger.error(f"Foreign key {fk['name']} on {fk['table_name']} {state}: {e}")
+    logger.info(f"Restored {len(foreign_keys)} foreign keys, {validated} validated")
+
+
+@contextmanager
+def bulk_window(table_names, workers=None):
+    """
+    Runs a block with the secondary indexes and foreign keys of some tables dropped.
+
+    The definitions are rebuilt when the block exits, even if it raised.
+    Only PostgreSQL is supported; on other backends the block runs unchanged.
+
+    Args:
+        table_names (iterable): Tables about to be bulk loaded.
+        workers (int, optional): Indexes rebuilt concurrently.
+
+    Yields:
+        dict: The captured definitions.
+    """
+    if engine.dialect.name != "postgresql":
+        yield {"indexes": [], "foreign_keys": []}
+        return
+    definitions = capture_definitions(table_names)
+    drop_definitions(definitions)
+    try:
+        yield definitions
+    finally:
+        rebuild_definitions(definitions, workers)
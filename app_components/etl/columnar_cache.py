@@ -0,0 +1,194 @@
+"""
+Columnar cache of the ETL source files.
+
+The first read of a CSV file also writes its parsed content to an Arrow IPC
+file in CACHE_DIR. Later reads memory-map that file instead of parsing the
+CSV again, as long as the content hash of the source (see
+manifest.fingerprint_file) and the parse options recorded in its schema
+metadata still match. Categorical
+columns are cached as plain strings, since an IPC file cannot hold a
+different dictionary per batch, and converted back on read. Without pyarrow
+the cache is disabled and every read goes to the CSV.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+import manifest
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Folder holding one <file name>-<path hash>.arrow file per source file
+CACHE_DIR = os.environ.get("ETL_CACHE_DIR", os.path.join(os.environ.get("ETL_DATA_DIR", "Data"), ".cache"))
+
+ENABLED = pa is not None and os.environ.get("ETL_COLUMNAR_CACHE", "1") == "1"
+
+
+def cache_path_for(csv_path):
+    """
+    Returns the path of the cache file of a source file.
+
+    The name is keyed on the full path of the source, so a table's source
+    file, its compressed variant and the copies written by validation and
+    dedup each get their own cache file.
+
+    Args:
+        csv_path (str): Path to the source file.
+
+    Returns:
+        str: Path to the Arrow IPC cache file.
+    """
+    path_hash = hashlib.sha1(os.path.abspath(csv_path).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{os.path.basename(csv_path)}-{path_hash}.arrow")
+
+
+def source_fingerprint(csv_path, read_options=None):
+    """
+    Builds the fingerprint that ties a cache file to its source.
+
+    Args:
+        csv_path (str): Path to the source file.
+        read_options (dict, optional): pd.read_csv arguments the source is parsed with.
+
+    Returns:
+        dict: Content hash and size of the source and the parse options, as
+        schema metadata.
+    """
+    fingerprint = manifest.fingerprint_file(csv_path)
+    return {
+        b"source_hash": fingerprint["content_hash"].encode(),
+        b"source_size": str(fingerprint["size_bytes"]).encode(),
+        b"read_options": json.dumps(read_options or {}, sort_keys=True).encode(),
+    }
+
+
+def restore_dtypes(df, read_options):
+    """
+    Converts columns read from the cache back to the requested dtypes.
+
+    Args:
+        df (pd.DataFrame): Rows read from the cache.
+        read_options (dict, optional): pd.read_csv arguments the source is parsed with.
+
+    Returns:
+        pd.DataFrame: The rows with the dtypes of a CSV parse.
+    """
+    dtype = (read_options or {}).get("dtype")
+    return df.astype(dtype) if dtype else df
+
+
+def read_cached_table(csv_path, read_options=None):
+    """
+    Memory-maps the cache of a source file if it is fresh.
+
+    Args:
+        csv_path (str): Path to the source file.
+        read_options (dict, optional): pd.read_csv arguments the cache must
+            have been built with.
+
+    Returns:
+        pa.Table: Zero-copy view of the cached columns, or None if the cache
+        is disabled, missing or stale.
+    """
+    cache_path = cache_path_for(csv_path)
+    if not ENABLED or not os.path.exists(cache_path):
+        return None
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(cache_path, "r"))
+        metadata = reader.schema.metadata or {}
+        fingerprint = source_fingerprint(csv_path, read_options)
+        if any(metadata.get(key) != value for key, value in fingerprint.items()):
+            return None
+        return reader.read_all()
+    except (OSError, pa.ArrowException) as e:
+        logger.warning(f"Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+
+def iter_source_chunks(csv_path, chunk_rows, read_options=None):
+    """
+    Reads a source file in chunks, from its cache when fresh.
+
+    On a cache miss the CSV is parsed and each chunk is also appended to a
+    new cache file, which replaces the old one once the file is fully read.
+
+    Args:
+        csv_path (str): Path to the source file.
+        chunk_rows (int): Rows per chunk.
+        read_options (dict, optional): Extra pd.read_csv arguments, such as dtype.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the file.
+    """
+    table = read_cached_table(csv_path, read_options)
+    if table is not None:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            yield restore_dtypes(batch.to_pandas(), read_options)
+        return
+
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, **(read_options or {}))
+    if not ENABLED:
+        yield from reader
+        return
+
+    cache_path = cache_path_for(csv_path)
+    partial_path = f"{cache_path}.partial"
+    fingerprint = source_fingerprint(csv_path, read_options)
+    writer = schema = None
+    try:
+        for chunk in reader:
+            if writer is not False:
+                try:
+                    categorical = chunk.select_dtypes("category").columns
+                    cached = chunk.astype({column: object for column in categorical}) if len(categorical) else chunk
+                    if writer is None:
+                        schema = pa.Schema.from_pandas(cached, preserve_index=False)
+                        schema = schema.with_metadata({**(schema.metadata or {}), **fingerprint})
+                        os.makedirs(CACHE_DIR, exist_ok=True)
+                        writer = pa.ipc.new_file(partial_path, schema)
+                    writer.write_table(pa.Table.from_pandas(cached, schema=schema, preserve_index=False))
+                except (OSError, pa.ArrowException) as e:
+                    logger.warning(f"Not caching {csv_path}: {e}")
+                    if writer:
+                        writer.close()
+                    writer = False
+            yield chunk
+        if writer:
+            writer.close()
+            os.replace(partial_path, cache_path)
+            writer = None
+    finally:
+        if writer:
+            writer.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def read_source_frame(csv_path, read_options=None, chunk_rows=1000000):
+    """
+    Reads a whole source file, from its cache when fresh.
+
+    Args:
+        csv_path (str): Path to the source file.
+        read_options (dict, optional): Extra pd.read_csv arguments, such as dtype.
+        chunk_rows (int): Rows parsed at a time on a cache miss.
+
+    Returns:
+        pd.DataFrame: Content of the file.
+    """
+    table = read_cached_table(csv_path, read_options)
+    if table is not None:
+        return restore_dtypes(table.to_pandas(), read_options)
+    chunks = list(iter_source_chunks(csv_path, chunk_rows, read_options))
+    if not chunks:
+        return pd.read_csv(csv_path, **(read_options or {}))
+    # Chunks parsed separately can end up with different category sets
+    return restore_dtypes(pd.concat(chunks, ignore_index=True), read_options)
@@ -0,0 +1,324 @@
+"""
+De-duplication of the customers before they are loaded.
+
+Upstream apps export the same person under several customer_ids, with the
+name and email differing only in case or whitespace. The first name, last
+name, email and birth date of every customer are normalised (lower case,
+whitespace removed) and grouped for the whole file at once, with pyarrow
+compute functions when it is installed; customers sharing all four are
+collapsed into the one with the lowest customer_id. Rows missing any of
+these fields are never merged.
+
+The merged customers are recorded in the customer_merge_map table. Rows of
+the other source files that point at a merged customer are re-pointed to the
+survivor. The tables in DROP_MERGED_ROWS hold one row per customer, so their
+rows of merged customers are dropped instead. Rewritten files
+go to DEDUP_DIR, compressed like their source, and are loaded instead of it. Tables loaded with
+the upsert mode keep rows from earlier loads, so apply_merge_map also
+re-points and removes the merged customers already in the database.
+"""
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import insert, inspect, text
+
+from Database.database import engine
+from Database import models
+from Database.models import CustomerMergeMap
+import source_files
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Folder receiving the de-duplicated copies of the source files
+DEDUP_DIR = os.path.join(os.environ.get("ETL_DATA_DIR", "Data"), ".state", "dedup")
+
+# Customer columns that identify a person
+IDENTITY_HEADERS = ["first_name", "last_name", "email", "birth_date"]
+
+# Characters removed from the identity columns before comparing them
+WHITESPACE = (" ", "\t")
+
+# Tables with one row per customer, whose rows of merged customers are dropped
+DROP_MERGED_ROWS = {"results"}
+
+# Rows rewritten at a time
+CHUNK_ROWS = 1000000
+
+
+def normalize(values):
+    """
+    Normalises text for comparison: lower case, without whitespace.
+
+    Args:
+        values (pd.Series): Text values.
+
+    Returns:
+        pd.Series: Normalised values.
+    """
+    values = values.str.lower()
+    for character in WHITESPACE:
+        values = values.str.replace(character, "", regex=False)
+    return values
+
+
+def customer_references():
+    """
+    Lists the tables that reference customers, from the foreign keys in Database.models.
+
+    Returns:
+        dict: Table name mapped to the column holding the customer_id.
+    """
+    references = {}
+    for table in models.Base.metadata.tables.values():
+        for fk in table.foreign_keys:
+            if fk.column.table.name == "customer" and fk.column.name == "customer_id":
+                references[table.name] = fk.parent.name
+    return references
+
+
+def merged_customers_arrow(csv_path):
+    """
+    Finds the duplicate customers of a file with pyarrow compute functions and grouping.
+
+    Args:
+        csv_path (str): Path to the customer CSV file.
+
+    Returns:
+        pd.DataFrame: duplicate_id, surviving customer_id and normalised
+        identity columns of every merged customer.
+
+    Raises:
+        pyarrow.ArrowInvalid: If a customer_id is not an integer.
+    """
+    customers = pa_csv.read_csv(csv_path, convert_options=pa_csv.ConvertOptions(
+        include_columns=["customer_id"] + IDENTITY_HEADERS,
+        column_types={"customer_id": pa.int64(), **{header: pa.string() for header in IDENTITY_HEADERS}},
+        strings_can_be_null=True,
+    ))
+    columns = {}
+    complete = pc.is_valid(customers["customer_id"])
+    for header in IDENTITY_HEADERS:
+        values = pc.utf8_lower(customers[header])
+        for character in WHITESPACE:
+            values = pc.replace_substring(values, character, "")
+        columns[header] = values
+        complete = pc.and_(complete, pc.greater(pc.utf8_length(values), 0))
+    identities = pa.table({**columns, "duplicate_id": customers["customer_id"]}).filter(pc.fill_null(complete, False))
+    groups = identities.group_by(IDENTITY_HEADERS).aggregate([("duplicate_id", "min"), ("duplicate_id", "count")])
+    groups = groups.filter(pc.greater(groups["duplicate_id_count"], 1))
+    if groups.num_rows == 0:
+        return pd.DataFrame(columns=["duplicate_id", "customer_id"] + IDENTITY_HEADERS)
+    merged = identities.join(groups.drop_columns(["duplicate_id_count"]), IDENTITY_HEADERS)
+    merged = merged.filter(pc.not_equal(merged["duplicate_id"], merged["duplicate_id_min"]))
+    return merged.to_pandas().rename(columns={"duplicate_id_min": "customer_id"})
+
+
+def merged_customers_pandas(csv_path):
+    """
+    Finds the duplicate customers of a file with pandas, grouping them by identity hash.
+
+    Args:
+        csv_path (str): Path to the customer CSV file.
+
+    Returns:
+        pd.DataFrame: duplicate_id, surviving customer_id and normalised
+        identity columns of every merged customer.
+    """
+    customers = pd.read_csv(csv_path, usecols=["customer_id"] + IDENTITY_HEADERS, dtype=str,
+                            keep_default_na=False, na_values=[""])
+    identities = customers[IDENTITY_HEADERS].apply(normalize)
+    identities["duplicate_id"] = pd.to_numeric(customers["customer_id"], errors="coerce")
+    identities = identities[identities.notna().all(axis=1) & (identities[IDENTITY_HEADERS] != "").all(axis=1)]
+    hashes = pd.util.hash_pandas_object(identities[IDENTITY_HEADERS], index=False)
+    identities["customer_id"] = identities["duplicate_id"].groupby(hashes.to_numpy()).transform("min")
+    return identities[identities["duplicate_id"] != identities["customer_id"]]
+
+
+def find_duplicates(csv_path):
+    """
+    Finds the customers of a file that duplicate another customer.
+
+    Uses pyarrow when it is installed and the ids are clean integers, pandas otherwise.
+
+    Args:
+        csv_path (str): Path to the customer CSV file.
+
+    Returns:
+        pd.DataFrame: One row per merged customer, with its duplicate_id, the
+        customer_id it is merged into and the identity_key they share.
+    """
+    merged = None
+    if pa is not None:
+        try:
+            merged = merged_customers_arrow(csv_path)
+        except pa.ArrowInvalid as e:
+            logger.warning(f"Falling back to pandas to find duplicate customers: {e}")
+    if merged is None:
+        merged = merged_customers_pandas(csv_path)
+    identity_keys = pd.util.hash_pandas_object(merged[IDENTITY_HEADERS], index=False).to_numpy()
+    return pd.DataFrame({
+        "duplicate_id": merged["duplicate_id"].to_numpy(dtype="int64"),
+        "customer_id": merged["customer_id"].to_numpy(dtype="int64"),
+        "identity_key": [f"{value:016x}" for value in identity_keys],
+    })
+
+
+def rewrite_source(csv_path, target_path, header, drop_ids=None, repoint=None):
+    """
+    Copies a CSV file, dropping or re-pointing rows by customer id, as raw text.
+
+    Args:
+        csv_path (str): Path to the source file.
+        target_path (str): Path of the copy, compressed as its extension says.
+        header (str): Column holding the customer_id.
+        drop_ids (np.ndarray, optional): Customer ids whose rows are left out.
+        repoint (pd.Series, optional): Surviving customer_id indexed by merged customer_id.
+
+    Returns:
+        int: Rows dropped or re-pointed.
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    changed = 0
+    with source_files.open_target(target_path) as target:
+        reader = pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS)
+        for index, chunk in enumerate(reader):
+            ids = pd.to_numeric(chunk[header], errors="coerce")
+            if drop_ids is not None:
+                dropped = ids.isin(drop_ids).to_numpy()
+                chunk = chunk[~dropped]
+                changed += int(dropped.sum())
+            if repoint is not None:
+                survivors = ids[chunk.index].map(repoint)
+                found = survivors.notna()
+                chunk.loc[found, header] = survivors[found].astype("int64").astype(str)
+                changed += int(found.sum())
+            chunk.to_csv(target, index=False, header=index == 0)
+    return changed
+
+
+def references_any(csv_path, header, customer_ids):
+    """
+    Tells whether any row of a CSV file points at one of the given customers.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        header (str): Column holding the customer_id.
+        customer_ids (np.ndarray): Customer ids to look for.
+
+    Returns:
+        bool: True if at least one row matches.
+    """
+    values = pd.read_csv(csv_path, usecols=[header])[header]
+    return bool(pd.to_numeric(values, errors="coerce").isin(customer_ids).any())
+
+
+def store_merge_map(merge_map):
+    """
+    Replaces the content of the customer_merge_map table.
+
+    Args:
+        merge_map (pd.DataFrame): Result of find_duplicates.
+    """
+    CustomerMergeMap.__table__.create(bind=engine, checkfirst=True)
+    records = merge_map.assign(merged_at=datetime.now()).to_dict("records")
+    with engine.begin() as connection:
+        connection.execute(CustomerMergeMap.__table__.delete())
+        if records:
+            connection.execute(insert(CustomerMergeMap.__table__), records)
+
+
+def read_merge_map():
+    """
+    Reads the merges recorded by the last load of the customers.
+
+    Returns:
+        pd.DataFrame: duplicate_id and customer_id of every merged customer.
+    """
+    if not inspect(engine).has_table(CustomerMergeMap.__tablename__):
+        return pd.DataFrame({"duplicate_id": [], "customer_id": []}, dtype="int64")
+    with engine.connect() as connection:
+        return pd.read_sql_query(text("SELECT duplicate_id, customer_id FROM customer_merge_map"), connection)
+
+
+def deduplicate_sources(load_paths):
+    """
+    Collapses duplicate customers and re-points the rows that reference them.
+
+    The merges are found in the customer file when it is loaded, and
+    recorded in customer_merge_map; otherwise the merges recorded at its
+    last load are applied to the other files.
+
+    Args:
+        load_paths (dict): Tables to load, mapped to the file to load.
+
+    Returns:
+        dict: The same tables, mapped to their de-duplicated copy where
+        rows were merged, dropped or re-pointed.
+    """
+    load_paths = dict(load_paths)
+    if "customer" in load_paths:
+        merge_map = find_duplicates(load_paths["customer"])
+        store_merge_map(merge_map)
+        if len(merge_map):
+            target_path = os.path.join(DEDUP_DIR, f"customer{source_files.extension_of(load_paths['customer'])}")
+            rewrite_source(load_paths["customer"], target_path, "customer_id",
+                           drop_ids=merge_map["duplicate_id"].to_numpy())
+            load_paths["customer"] = target_path
+            logger.info(f"Merged {len(merge_map)} duplicate customers into "
+                        f"{merge_map['customer_id'].nunique()} customers")
+    else:
+        merge_map = read_merge_map()
+    if merge_map.empty:
+        return load_paths
+
+    merged_ids = merge_map["duplicate_id"].to_numpy()
+    repoint = merge_map.set_index("duplicate_id")["customer_id"]
+    for table_name, header in customer_references().items():
+        csv_path = load_paths.get(table_name)
+        if csv_path is None or not references_any(csv_path, header, merged_ids):
+            continue
+        target_path = os.path.join(DEDUP_DIR, f"{table_name}{source_files.extension_of(csv_path)}")
+        if table_name in DROP_MERGED_ROWS:
+            changed = rewrite_source(csv_path, target_path, header, drop_ids=merged_ids)
+            logger.info(f"{table_name}: dropped {changed} rows of merged customers")
+        else:
+            changed = rewrite_source(csv_path, target_path, header, repoint=repoint)
+            logger.info(f"{table_name}: re-pointed {changed} rows to the surviving customers")
+        load_paths[table_name] = target_path
+    return load_paths
+
+
+def apply_merge_map():
+    """
+    Applies customer_merge_map to the rows already in the model tables.
+
+    Rows of the referencing tables are re-pointed to the surviving customer,
+    or deleted for the tables in DROP_MERGED_ROWS, and the merged customers
+    are deleted, all in one transaction. Meant for upsert loads, which keep
+    the rows of earlier loads.
+    """
+    if not inspect(engine).has_table(CustomerMergeMap.__tablename__):
+        return
+    with engine.begin() as connection:
+        for table_name, header in customer_references().items():
+            if table_name in DROP_MERGED_ROWS:
+                statement = (f'DELETE FROM "{table_name}" WHERE "{header}" IN '
+                             f"(SELECT duplicate_id FROM customer_merge_map)")
+            else:
+                statement = (f'UPDATE "{table_name}" SET "{header}" = m.customer_id FROM customer_merge_map m '
+                             f'WHERE "{table_name}"."{header}" = m.duplicate_id')
+            connection.execute(text(statement))
+        deleted = connection.execute(text(
+            "DELETE FROM customer WHERE customer_id IN (SELECT duplicate_id FROM customer_merge_map)"
+        )).rowcount
+    if deleted:
+        logger.info(f"Removed {deleted} merged customers left by earlier loads")
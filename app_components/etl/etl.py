@@ -1,11 +1,29 @@
 from Database.models import *
 from Database.database import engine, Base
-from sqlalchemy import create_engine, text, inspect
+from Database import models
+import manifest
+import partitioning
+import run_report
+import source_files
+import columnar_cache
+import dedup
+from bulk_window import bulk_window
+import table_swap
+import validation
+from sqlalchemy import create_engine, text, inspect, BigInteger, Date, Integer, Numeric
+from sqlalchemy.dialects import postgresql, sqlite
 import pandas as pd
+import argparse
 import logging
-import glob
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from graphlib import TopologicalSorter
 from os import path
 import os 
+import io
+import resource
+import time
+from datetime import datetime
 
 # Configure logging
 """ Configure logging """
@@ -13,17 +31,110 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logging.basicConfig()
 
-def drop_all_foreign_keys():
+# Load mode used by load_csv_to_table: "copy" streams the CSV through
+# PostgreSQL COPY, "chunked" reads and writes it in bounded batches,
+# "pandas" uses DataFrame.to_sql. These three replace the table with one
+# shaped like the CSV. "swap" also loads the CSV shape, but into a staging
+# table that is indexed and then swapped in, so readers never see a partly
+# loaded table. "upsert" merges the rows into the tables defined in
+# Database.models, keeping their keys, types and indexes.
+LOAD_MODE = os.environ.get("ETL_LOAD_MODE", "copy")
+REPLACE_MODES = ("copy", "chunked", "pandas")
+
+# Batch size of the chunked mode, as a row count or an in-memory byte budget
+# (the byte budget wins when set)
+CHUNK_ROWS = int(os.environ.get("ETL_CHUNK_ROWS", 100000))
+CHUNK_BYTES = int(os.environ.get("ETL_CHUNK_BYTES", 0))
+
+# Number of tables loaded concurrently, each on its own connection
+WORKERS = int(os.environ.get("ETL_WORKERS", 4))
+
+# Folder holding one <table>.csv, .csv.gz or .csv.zst file per table, see source_files
+DATA_DIR = os.environ.get("ETL_DATA_DIR", "Data")
+
+# Drop secondary indexes and foreign keys during upsert loads and rebuild
+# them afterwards, see bulk_window
+BULK_WINDOW = os.environ.get("ETL_BULK_WINDOW", "0") == "1"
+
+# Skip source files whose fingerprint matches the manifest of the last run
+INCREMENTAL = os.environ.get("ETL_INCREMENTAL", "1") == "1"
+
+# Check the source files before loading them and quarantine failing rows, see validation
+VALIDATE = os.environ.get("ETL_VALIDATE", "1") == "1"
+
+# Merge duplicate customers and re-point the rows referencing them, see dedup
+DEDUPLICATE = os.environ.get("ETL_DEDUPLICATE", "1") == "1"
+
+# CSV headers that differ from the column names in Database.models
+CSV_COLUMN_MAP = {
+    "application": {"app_id": "application_id"},
+    "price": {"id": "price_id"},
+    "subscription": {"plan_type_id": "plan_id"},
+}
+
+# CSV columns that reference another table without a matching model foreign
+# key, mapped to the (table, CSV column) they reference
+CSV_REFERENCES = {
+    "customer": {"location": ("location", "area_name")},
+}
+
+# Number of rows read up front to infer the column types of a new table
+SAMPLE_ROWS = 10000
+
+# Per-table load statistics collected during the run
+load_stats = {}
+
+# Per-table results of the pre-load checks
+quality_stats = {}
+
+def drop_table_sql(table_name):
+    """
+    Builds a DROP TABLE statement, with CASCADE where the backend supports it.
+
+    Args:
+        table_name (str): Name of the table to drop.
+
+    Returns:
+        str: The DROP TABLE statement.
+    """
+    cascade = " CASCADE" if engine.dialect.name == "postgresql" else ""
+    return f"DROP TABLE IF EXISTS {table_name}{cascade}"
+
+
+def current_rss_bytes():
+    """
+    Returns the resident set size of the current process.
+
+    Falls back to the peak RSS reported by getrusage when /proc is unavailable.
+
+    Returns:
+        int: Resident memory in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def drop_all_foreign_keys(table_names=None):
     """
     Drops all foreign key constraints in the database schema.
     Logs any failures.
+
+    Args:
+        table_names (iterable, optional): Only drop the foreign keys defined
+            on or referencing these tables. Defaults to every table.
     """
     try:
-        with engine.connect() as connection:
+        with engine.begin() as connection:
             inspector = inspect(engine)
             for table_name in inspector.get_table_names():
                 for fk in inspector.get_foreign_keys(table_name):
                     fk_name = fk.get('name')
+                    if table_names is not None and table_name not in table_names \
+                            and fk.get("referred_table") not in table_names:
+                        continue
                     if fk_name:
                         connection.execute(text(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {fk_name} CASCADE"))
                         logger.info(f"Successfully dropped foreign key {fk_name} on table {table_name}")
@@ -42,35 +153,702 @@ def drop_table_with_cascade(table_name):
         - Error message if the operation fails.
     """
     try:
-        with engine.connect() as connection:
-            connection.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE"))
+        with engine.begin() as connection:
+            connection.execute(text(drop_table_sql(table_name)))
             logger.info(f"Successfully dropped table: {table_name}")
     except Exception as e:
         logger.error(f"Failed to drop table {table_name}: {e}")
 
 
-def load_csv_to_table(table_name, csv_path):
+def model_columns_by_header(table_name):
+    """
+    Maps the CSV headers of a table to the matching Database.models columns.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        dict: CSV header mapped to its Column, empty for tables without a model.
+    """
+    table = models.Base.metadata.tables.get(table_name)
+    if table is None:
+        return {}
+    headers = {model_name: csv_name for csv_name, model_name in CSV_COLUMN_MAP.get(table_name, {}).items()}
+    return {headers.get(column.name, column.name): column for column in table.columns}
+
+
+def read_dtype_for(column):
+    """
+    Picks the pandas dtype a model column is parsed into.
+
+    Args:
+        column (Column): Column of a Database.models table.
+
+    Returns:
+        str: The dtype, or None to let pandas infer it.
+    """
+    if column.info.get("categorical"):
+        return "category"
+    if isinstance(column.type, BigInteger):
+        return "Int64"
+    if isinstance(column.type, Integer):
+        return "Int32"
+    if isinstance(column.type, Numeric):
+        return "float64"
+    return None
+
+
+def csv_read_options(table_name, csv_path):
+    """
+    Builds the pd.read_csv arguments that parse a CSV file with the types of its model.
+
+    Date columns are parsed as ISO dates, integers into nullable 32-bit (or
+    64-bit) integers, decimals into floats and columns flagged as categorical
+    into categoricals. Headers without a model column are left to inference.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        dict: Keyword arguments for pd.read_csv.
+    """
+    columns = model_columns_by_header(table_name)
+    dtype, parse_dates = {}, []
+    for header in pd.read_csv(csv_path, nrows=0).columns:
+        column = columns.get(header)
+        if column is None:
+            continue
+        if isinstance(column.type, Date):
+            parse_dates.append(header)
+        elif read_dtype_for(column):
+            dtype[header] = read_dtype_for(column)
+    options = {"dtype": dtype}
+    if parse_dates:
+        options.update(parse_dates=parse_dates, date_format="ISO8601")
+    return options
+
+
+def target_column_types(table_name, columns):
+    """
+    Returns the SQL types of the model for the columns of a replace-style table.
+
+    Args:
+        table_name (str): Name of the target table.
+        columns (iterable): CSV headers of the table.
+
+    Returns:
+        dict: CSV header mapped to its SQLAlchemy type, for DataFrame.to_sql.
+    """
+    model_columns = model_columns_by_header(table_name)
+    return {column: model_columns[column].type for column in columns if column in model_columns}
+
+
+def create_target_table(connection, table_name, sample, csv_path, target_name=None):
+    """
+    Creates the empty table a replace-style load writes into.
+
+    Columns are shaped like the sample and take the types of the model. A
+    table set up for range partitioning (see partitioning) is created as a
+    partitioned parent, with partitions for the dates in the file.
+
+    Args:
+        connection: Connection holding the load transaction.
+        table_name (str): Name of the table.
+        sample (pd.DataFrame): Leading rows of the file.
+        csv_path (str): Path to the CSV file.
+        target_name (str, optional): Name to create the table under, such as
+            a staging table. Defaults to table_name.
+    """
+    target_name = target_name or table_name
+    dtype = target_column_types(table_name, sample.columns)
+    if not partitioning.is_partitioned(table_name):
+        sample.head(0).to_sql(target_name, con=connection, index=False, dtype=dtype)
+        return
+    create_sql = pd.io.sql.get_schema(sample.head(0), target_name, con=connection, dtype=dtype)
+    partitioning.create_partitioned_table(connection, table_name, create_sql)
+    partitioning.ensure_partitions(connection, table_name, csv_path, target_name)
+
+
+def csv_references(table_name):
+    """
+    Lists the CSV columns of a table that reference another table's CSV column.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        dict: CSV header mapped to the (table, CSV header) it references, from
+        the foreign keys in Database.models and CSV_REFERENCES.
+    """
+    references = {}
+    for header, column in model_columns_by_header(table_name).items():
+        for fk in column.foreign_keys:
+            parent_name = fk.column.table.name
+            parent_headers = {
+                parent_column.name: parent_header
+                for parent_header, parent_column in model_columns_by_header(parent_name).items()
+            }
+            references[header] = (parent_name, parent_headers[fk.column.name])
+    references.update(CSV_REFERENCES.get(table_name, {}))
+    return references
+
+
+def validation_columns(table_name):
+    """
+    Maps the CSV headers of a table to the model columns they are checked against.
+
+    Headers listed in CSV_REFERENCES are checked like the column they reference.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        dict: CSV header mapped to a Column.
+    """
+    columns = model_columns_by_header(table_name)
+    for header, (parent_name, parent_header) in CSV_REFERENCES.get(table_name, {}).items():
+        columns.setdefault(header, model_columns_by_header(parent_name)[parent_header])
+    return columns
+
+
+def create_model_indexes(connection, table_name, target_name, columns):
+    """
+    Adds the primary key and indexes of the model to a table shaped like the CSV.
+
+    Indexes are named after target_name. Unique columns get a plain index,
+    so that duplicates in the source do not fail the load.
+
+    Args:
+        connection: Connection holding the load transaction.
+        table_name (str): Name of the table in Database.models.
+        target_name (str): Name of the table to index.
+        columns (iterable): CSV headers of the table.
+
+    Returns:
+        int: Number of indexes created, the primary key included.
+    """
+    model_columns = model_columns_by_header(table_name)
+    headers = [header for header in columns if header in model_columns]
+    keys = [header for header in headers if model_columns[header].primary_key]
+    created = 0
+    if keys:
+        key_list = ", ".join(f'"{header}"' for header in keys)
+        connection.execute(text(f'ALTER TABLE "{target_name}" ADD PRIMARY KEY ({key_list})'))
+        created += 1
+    for header in headers:
+        column = model_columns[header]
+        if (column.index or column.unique) and not column.primary_key:
+            connection.execute(text(f'CREATE INDEX "ix_{target_name}_{header}" ON "{target_name}" ("{header}")'))
+            created += 1
+    return created
+
+
+def copy_dataframe_to_table(cursor, table_name, df):
+    """
+    Writes a DataFrame into an existing table with PostgreSQL COPY.
+
+    Args:
+        cursor: psycopg2 cursor of the connection to write through.
+        table_name (str): Name of the target table.
+        df (pd.DataFrame): Rows to write; the columns must exist in the table.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in df.columns)
+    cursor.copy_expert(f'COPY "{table_name}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def copy_csv_to_table(table_name, csv_path):
+    """
+    Bulk loads a CSV file into a table with PostgreSQL COPY.
+
+    The table is dropped and recreated with the column types of its model
+    (inferred from the first SAMPLE_ROWS rows for the other columns), then the
+    file is streamed to the server with COPY ... FROM STDIN, decompressing it
+    on the way if needed, all in one transaction.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        dict: Rows and chunks written, and the time spent parsing the sample
+        and in database calls (which include the server-side parse).
+
+    Raises:
+        RuntimeError: If the engine is not backed by psycopg2.
+    """
+    if engine.dialect.driver != "psycopg2":
+        raise RuntimeError(f"COPY is not supported by the {engine.dialect.driver} driver")
+
+    start = time.perf_counter()
+    sample = pd.read_csv(csv_path, nrows=SAMPLE_ROWS, **csv_read_options(table_name, csv_path))
+    parse_seconds = time.perf_counter() - start
+    columns = ", ".join(f'"{column}"' for column in sample.columns)
+    copy_sql = f'COPY "{table_name}" ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)'
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(text(drop_table_sql(table_name)))
+        create_target_table(connection, table_name, sample, csv_path)
+        cursor = connection.connection.cursor()
+        with source_files.open_source(csv_path) as csv_file:
+            cursor.copy_expert(copy_sql, csv_file, size=source_files.READ_BLOCK_SIZE)
+        return {
+            "rows": cursor.rowcount,
+            "chunks": 1,
+            "parse_seconds": parse_seconds,
+            "db_seconds": time.perf_counter() - start,
+        }
+
+
+def swap_csv_into_table(table_name, csv_path):
+    """
+    Loads a CSV file into a staging table and swaps it in place of the table.
+
+    The staging table is created like the copy mode's table, filled with
+    COPY, given the model's primary key and indexes, and then swapped in by
+    table_swap.swap_in. Until the swap commits, readers see the previous
+    table in full.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        dict: Rows and chunks written, the indexes built, the swap attempts,
+        and the time spent parsing the sample and in database calls.
+    """
+    staging_name = table_swap.staging_name_for(table_name)
+    start = time.perf_counter()
+    sample = pd.read_csv(csv_path, nrows=SAMPLE_ROWS, **csv_read_options(table_name, csv_path))
+    parse_seconds = time.perf_counter() - start
+    columns = ", ".join(f'"{column}"' for column in sample.columns)
+    copy_sql = f'COPY "{staging_name}" ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)'
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(text(drop_table_sql(staging_name)))
+        create_target_table(connection, table_name, sample, csv_path, staging_name)
+        cursor = connection.connection.cursor()
+        with source_files.open_source(csv_path) as csv_file:
+            cursor.copy_expert(copy_sql, csv_file, size=source_files.READ_BLOCK_SIZE)
+        rows = cursor.rowcount
+        indexes = create_model_indexes(connection, table_name, staging_name, sample.columns)
+        connection.execute(text(f'ANALYZE "{staging_name}"'))
+    attempts = table_swap.swap_in(table_name, staging_name)
+    return {
+        "rows": rows,
+        "chunks": 1,
+        "indexes": indexes,
+        "swap_attempts": attempts,
+        "parse_seconds": parse_seconds,
+        "db_seconds": time.perf_counter() - start,
+    }
+
+
+def resolve_chunk_rows(sample, chunk_rows=None, chunk_bytes=None):
+    """
+    Works out how many rows go into each batch of the chunked mode.
+
+    Args:
+        sample (pd.DataFrame): Leading rows of the file, used to estimate the
+            in-memory size of a row.
+        chunk_rows (int, optional): Rows per chunk. Defaults to CHUNK_ROWS.
+        chunk_bytes (int, optional): Memory budget per chunk. Defaults to
+            CHUNK_BYTES and takes precedence over the row count when set.
+
+    Returns:
+        int: Rows per chunk.
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    chunk_bytes = chunk_bytes or CHUNK_BYTES
+    if chunk_bytes and len(sample):
+        row_bytes = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+        return max(1, int(chunk_bytes // max(row_bytes, 1)))
+    return chunk_rows
+
+
+def timed_chunks(chunks, timings):
+    """
+    Passes chunks through, adding the time spent producing them to timings["parse_seconds"].
+
+    Args:
+        chunks (iterable): Chunks as they are read and parsed.
+        timings (dict): Statistics of the load, updated in place.
+
+    Yields:
+        pd.DataFrame: The chunks, unchanged.
+    """
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(iterator, None)
+        timings["parse_seconds"] = timings.get("parse_seconds", 0.0) + time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
+
+
+def load_csv_in_chunks(table_name, csv_path, chunk_rows=None, chunk_bytes=None):
+    """
+    Loads a CSV file into a table in fixed-size batches.
+
+    Only one chunk is held in memory at a time, so peak memory does not depend
+    on the size of the file. Chunks are read from the columnar cache when it
+    is fresh, and written with COPY on PostgreSQL and with DataFrame.to_sql
+    elsewhere.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+        chunk_rows (int, optional): Rows per chunk.
+        chunk_bytes (int, optional): Memory budget per chunk.
+
+    Returns:
+        dict: Rows and chunks written, the peak RSS seen during the load and
+        the time spent parsing and in database calls.
+    """
+    read_options = csv_read_options(table_name, csv_path)
+    sample = pd.read_csv(csv_path, nrows=SAMPLE_ROWS, **read_options)
+    rows_per_chunk = resolve_chunk_rows(sample, chunk_rows, chunk_bytes)
+    use_copy = engine.dialect.driver == "psycopg2"
+    rows = chunks = 0
+    db_seconds = 0.0
+    peak_rss = current_rss_bytes()
+    timings = {}
+
+    with engine.begin() as connection:
+        connection.execute(text(drop_table_sql(table_name)))
+        create_target_table(connection, table_name, sample, csv_path)
+        del sample
+        source_chunks = columnar_cache.iter_source_chunks(csv_path, rows_per_chunk, read_options)
+        for chunk in timed_chunks(source_chunks, timings):
+            write_start = time.perf_counter()
+            if use_copy:
+                copy_dataframe_to_table(connection.connection.cursor(), table_name, chunk)
+            else:
+                chunk.to_sql(table_name, con=connection, if_exists="append", index=False)
+            db_seconds += time.perf_counter() - write_start
+            rows += len(chunk)
+            chunks += 1
+            peak_rss = max(peak_rss, current_rss_bytes())
+
+    return {"rows": rows, "chunks": chunks, "peak_rss_bytes": peak_rss, "db_seconds": db_seconds, **timings}
+
+
+def write_csv_with_pandas(table_name, csv_path):
+    """
+    Loads a CSV file into a table with DataFrame.to_sql.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        dict: Rows and chunks written, and the time spent parsing and in database calls.
+    """
+    start = time.perf_counter()
+    df = columnar_cache.read_source_frame(csv_path, csv_read_options(table_name, csv_path))
+    parse_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(text(drop_table_sql(table_name)))
+        create_target_table(connection, table_name, df, csv_path)
+        df.to_sql(table_name, con=connection, if_exists="append", index=False)
+    return {"rows": len(df), "chunks": 1, "parse_seconds": parse_seconds, "db_seconds": time.perf_counter() - start}
+
+
+def to_model_columns(table_name, df, connection):
+    """
+    Reshapes CSV rows to the columns of the matching Database.models table.
+
+    Renames the headers listed in CSV_COLUMN_MAP, resolves the customer
+    location name to its location_id (dropping rows with an unknown name),
+    parses date columns and drops columns the model does not define.
+
+    Args:
+        table_name (str): Name of the target table.
+        df (pd.DataFrame): Rows as read from the CSV.
+        connection: Connection used to look up the location ids.
+
+    Returns:
+        pd.DataFrame: Rows with the model's column names.
+    """
+    table = models.Base.metadata.tables[table_name]
+    df = df.rename(columns=CSV_COLUMN_MAP.get(table_name, {}))
+    if "location_id" in table.columns and "location_id" not in df and "location" in df:
+        location_ids = pd.read_sql_query(text("SELECT area_name, location_id FROM location"), connection)
+        df["location_id"] = df["location"].map(location_ids.set_index("area_name")["location_id"]).astype("Int64")
+        unresolved = df["location_id"].isna()
+        if unresolved.any():
+            logger.warning(f"Dropping {unresolved.sum()} {table_name} rows with an unknown location")
+            df = df[~unresolved]
+    for column in table.columns:
+        if isinstance(column.type, Date) and column.name in df:
+            df[column.name] = pd.to_datetime(df[column.name], errors="coerce").dt.date
+    return df[[column.name for column in table.columns if column.name in df]]
+
+
+def upsert_chunk(connection, table_name, df, key_columns):
+    """
+    Inserts rows into a table, updating the rows whose key already exists.
+
+    On psycopg2 the rows are copied into a temporary staging table and merged
+    with a single INSERT ... SELECT ... ON CONFLICT. Other backends use the
+    dialect's INSERT ... ON CONFLICT with bound parameters.
+
+    Args:
+        connection: Connection holding the load transaction.
+        table_name (str): Name of the target table.
+        df (pd.DataFrame): Rows with the model's column names.
+        key_columns (list): Primary key columns used as the conflict target.
+    """
+    update_columns = [column for column in df.columns if column not in key_columns]
+    if connection.dialect.driver == "psycopg2":
+        stage_name = f"_stage_{table_name}"
+        columns = ", ".join(f'"{column}"' for column in df.columns)
+        keys = ", ".join(f'"{column}"' for column in key_columns)
+        if update_columns:
+            assignments = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+            on_conflict = f"DO UPDATE SET {assignments}"
+        else:
+            on_conflict = "DO NOTHING"
+        connection.execute(text(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{stage_name}" (LIKE "{table_name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+        ))
+        copy_dataframe_to_table(connection.connection.cursor(), stage_name, df)
+        connection.execute(text(
+            f'INSERT INTO "{table_name}" ({columns}) SELECT {columns} FROM "{stage_name}" '
+            f'ON CONFLICT ({keys}) {on_conflict}'
+        ))
+        connection.execute(text(f'TRUNCATE "{stage_name}"'))
+        return
+
+    insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[connection.dialect.name]
+    table = models.Base.metadata.tables[table_name]
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    statement = insert(table).values(records)
+    if update_columns:
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: statement.excluded[column] for column in update_columns},
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=key_columns)
+    connection.execute(statement)
+
+
+def upsert_csv_into_table(table_name, csv_path, chunk_rows=None):
+    """
+    Merges a CSV file into the existing Database.models table, in chunks.
+
+    Rows are matched on the table's primary key, so the table definition,
+    its constraints and its indexes are kept.
+
+    Args:
+        table_name (str): Name of the target table.
+        csv_path (str): Path to the CSV file.
+        chunk_rows (int, optional): Rows per chunk. Defaults to CHUNK_ROWS.
+
+    Returns:
+        dict: Rows and chunks written, the peak RSS seen during the load and
+        the time spent parsing and in database calls.
+    """
+    rows = chunks = 0
+    db_seconds = 0.0
+    peak_rss = current_rss_bytes()
+    timings = {}
+    with engine.begin() as connection:
+        key_columns = inspect(connection).get_pk_constraint(table_name)["constrained_columns"]
+        if not key_columns:
+            raise RuntimeError(f"Table {table_name} has no primary key to upsert on")
+        if partitioning.is_partitioned(table_name):
+            partitioning.ensure_partitions(connection, table_name, csv_path)
+        read_options = csv_read_options(table_name, csv_path)
+        source_chunks = columnar_cache.iter_source_chunks(csv_path, chunk_rows or CHUNK_ROWS, read_options)
+        for chunk in timed_chunks(source_chunks, timings):
+            chunk = to_model_columns(table_name, chunk, connection)
+            write_start = time.perf_counter()
+            upsert_chunk(connection, table_name, chunk, key_columns)
+            db_seconds += time.perf_counter() - write_start
+            rows += len(chunk)
+            chunks += 1
+            peak_rss = max(peak_rss, current_rss_bytes())
+    return {"rows": rows, "chunks": chunks, "peak_rss_bytes": peak_rss, "db_seconds": db_seconds, **timings}
+
+
+def matches_model(inspector, table):
+    """
+    Tells whether an existing table has the columns and primary key of its model.
+
+    Args:
+        inspector: SQLAlchemy inspector of the database.
+        table (Table): Table of Database.models.
+
+    Returns:
+        bool: False for tables left over from a replace-style load, which are
+        shaped like their CSV file and have no primary key.
+    """
+    columns = {column["name"] for column in inspector.get_columns(table.name)}
+    keys = inspector.get_pk_constraint(table.name)["constrained_columns"]
+    return {column.name for column in table.columns} <= columns \
+        and keys == [column.name for column in table.primary_key]
+
+
+def model_tables_to_rebuild(table_names):
+    """
+    Finds the existing tables that must be created again from Database.models before an upsert load.
+
+    A table that is going to be loaded is rebuilt when it does not match its
+    model. A table that is created, because it is missing or rebuilt, needs
+    the tables its foreign keys reference to have their model primary key,
+    so a referenced table that does not match its model is rebuilt too, even
+    when it is not going to be loaded.
+
+    Args:
+        table_names (iterable): Tables that are going to be loaded.
+
+    Returns:
+        set: Names of the tables to drop and create again.
+    """
+    inspector = inspect(engine)
+    rebuild, checked = set(), set()
+    pending = list(table_names)
+    while pending:
+        table_name = pending.pop()
+        table = models.Base.metadata.tables.get(table_name)
+        if table_name in checked or table is None:
+            continue
+        checked.add(table_name)
+        exists = inspector.has_table(table_name)
+        if exists and matches_model(inspector, table):
+            continue
+        if exists:
+            rebuild.add(table_name)
+        pending.extend(key.column.table.name for key in table.foreign_keys)
+    return rebuild
+
+
+def add_rebuilt_parents(sources, fingerprints, all_sources):
+    """
+    Adds to an upsert load the tables model_tables_to_rebuild pulls in, so they are reloaded after being rebuilt.
+
+    Args:
+        sources (dict): Tables to load, mapped to their CSV files. Updated in place.
+        fingerprints (dict): Fingerprints of the sources. Updated in place.
+        all_sources (dict): Every table in the data folder, mapped to its CSV file.
+
+    Raises:
+        RuntimeError: If a table to rebuild has no source file to reload it from.
+    """
+    for table_name in sorted(model_tables_to_rebuild(sources) - set(sources)):
+        if table_name not in all_sources:
+            raise RuntimeError(
+                f"Table {table_name} does not match its model and is referenced by the tables to load, "
+                f"but has no source file to reload it from; load it with a replace mode first"
+            )
+        logger.warning(f"Table {table_name} does not match its model, rebuilding and reloading it as well")
+        sources[table_name] = all_sources[table_name]
+        fingerprints[table_name] = manifest.fingerprint_file(all_sources[table_name])
+
+
+def prepare_model_tables(table_names):
+    """
+    Makes sure the tables to upsert into have the shape defined in Database.models.
+
+    Tables left over from a replace-style load have no primary key, so they
+    are dropped and created again from the model, together with the tables
+    they reference that are in the same state (see model_tables_to_rebuild).
+    The drops and the creation run in one transaction, so a failure leaves
+    the existing tables as they were.
+
+    Args:
+        table_names (iterable): Tables that are going to be loaded.
+
+    Raises:
+        RuntimeError: If a table that is not going to be loaded would have to be rebuilt.
+    """
+    rebuild = model_tables_to_rebuild(table_names)
+    outside = sorted(rebuild - set(table_names))
+    if outside:
+        raise RuntimeError(f"Tables {', '.join(outside)} do not match their models and are not being loaded")
+    with engine.begin() as connection:
+        for table_name in sorted(rebuild):
+            logger.warning(f"Table {table_name} does not match its model, recreating it")
+            connection.execute(text(drop_table_sql(table_name)))
+        models.Base.metadata.create_all(bind=connection)
+
+
+def load_csv_to_table(table_name, csv_path, mode=None, chunk_rows=None, chunk_bytes=None):
     """
     Loads data from a CSV file into a specified database table.
 
     Args:
         table_name (str): Name of the target table.
         csv_path (str): Path to the CSV file.
+        mode (str, optional): "copy", "chunked", "pandas", "swap" or "upsert".
+            Defaults to LOAD_MODE. The copy mode falls back to pandas if COPY
+            fails, and the swap mode to chunked on backends other than PostgreSQL.
+        chunk_rows (int, optional): Rows per chunk of the chunked and upsert
+            modes. Defaults to CHUNK_ROWS.
+        chunk_bytes (int, optional): Memory budget per chunk of the chunked
+            mode. Defaults to CHUNK_BYTES.
 
     Logs:
-        - Success message if data is loaded successfully.
+        - Success message with the row count and rows/second if data is loaded successfully.
+        - Warning message if COPY fails and the pandas path is used instead.
         - Error message if loading or parsing fails.
     """
+    mode = mode or LOAD_MODE
+    start = time.perf_counter()
     try:
-        df = pd.read_csv(csv_path)
-        df.to_sql(table_name, con=engine, if_exists="replace", index=False)
-        logger.info(f"Successfully loaded {table_name}")
+        if mode == "swap" and engine.dialect.driver != "psycopg2":
+            logger.warning(f"Swap loads need PostgreSQL with psycopg2, loading {table_name} in chunks instead")
+            mode = "chunked"
+        if mode == "copy":
+            try:
+                stats = copy_csv_to_table(table_name, csv_path)
+            except Exception as e:
+                logger.warning(f"COPY into {table_name} failed, falling back to pandas: {e}")
+                mode = "pandas"
+                stats = write_csv_with_pandas(table_name, csv_path)
+        elif mode == "chunked":
+            stats = load_csv_in_chunks(table_name, csv_path, chunk_rows, chunk_bytes)
+        elif mode == "swap":
+            stats = swap_csv_into_table(table_name, csv_path)
+        elif mode == "upsert":
+            stats = upsert_csv_into_table(table_name, csv_path, chunk_rows)
+        else:
+            stats = write_csv_with_pandas(table_name, csv_path)
+        elapsed = time.perf_counter() - start
+        stats["peak_rss_bytes"] = max(stats.get("peak_rss_bytes", 0), current_rss_bytes())
+        stats["bytes_read"] = path.getsize(csv_path)
+        load_stats[table_name] = {"mode": mode, "seconds": elapsed, **stats}
+        rows = stats["rows"]
+        logger.info(
+            f"Successfully loaded {table_name}: {rows} rows via {mode} in {elapsed:.2f}s "
+            f"({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+        )
     except pd.errors.ParserError as e:
         logger.error(f"Failed to parse {csv_path}: {e}")
     except Exception as e:
         logger.error(f"Failed to load table {table_name}: {e}")
 
 
+def log_load_summary():
+    """
+    Logs rows, chunk count and peak memory for every table loaded in this run.
+    """
+    for table_name, stats in load_stats.items():
+        logger.info(
+            f"{table_name}: {stats['rows']} rows in {stats['chunks']} chunk(s) via {stats['mode']}, "
+            f"{stats['seconds']:.2f}s, peak RSS {stats['peak_rss_bytes'] / 2 ** 20:.1f} MiB"
+        )
+
+
 def validate_table_schema(table_name):
     """
     Validates and logs the schema of a specified table.
@@ -90,31 +868,408 @@ def validate_table_schema(table_name):
         logger.error(f"Failed to validate schema for table {table_name}: {e}")
 
 
-# Drop and recreate tables
-drop_table_with_cascade("results")
-Base.metadata.create_all(bind=engine)
-logger.info("Tables have been recreated.")
+def discover_sources(data_dir=DATA_DIR):
+    """
+    Finds the CSV files to load, plain or compressed.
+
+    Args:
+        data_dir (str): Folder holding one <table>.csv, .csv.gz or .csv.zst file per table.
+
+    Returns:
+        dict: Table name mapped to the path of its CSV file.
+    """
+    return source_files.find_sources(data_dir)
+
+
+def build_load_graph(table_names):
+    """
+    Derives the load order constraints from the foreign keys declared in Database.models.
+
+    Args:
+        table_names (iterable): Tables that are going to be loaded.
+
+    Returns:
+        dict: Table name mapped to the set of loaded tables it references.
+    """
+    table_names = set(table_names)
+    graph = {}
+    for table_name in table_names:
+        table = models.Base.metadata.tables.get(table_name)
+        parents = {fk.column.table.name for fk in table.foreign_keys} if table is not None else set()
+        graph[table_name] = (parents & table_names) - {table_name}
+    return graph
+
+
+def load_tables_concurrently(sources, max_workers=None, mode=None, chunk_rows=None, chunk_bytes=None):
+    """
+    Loads tables on a worker pool, starting each one once its parents are loaded.
+
+    Tables without dependencies between them are loaded at the same time,
+    each worker holding its own connection from the engine pool.
+
+    Args:
+        sources (dict): Table name mapped to the path of its CSV file.
+        max_workers (int, optional): Size of the worker pool. Defaults to WORKERS.
+        mode (str, optional): Load mode passed to load_csv_to_table.
+        chunk_rows (int, optional): Rows per chunk passed to load_csv_to_table.
+        chunk_bytes (int, optional): Memory budget per chunk passed to load_csv_to_table.
+    """
+    scheduler = TopologicalSorter(build_load_graph(sources))
+    scheduler.prepare()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or WORKERS) as pool:
+        while scheduler.is_active():
+            for table_name in scheduler.get_ready():
+                future = pool.submit(
+                    load_csv_to_table, table_name, sources[table_name], mode, chunk_rows, chunk_bytes
+                )
+                running[future] = table_name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                scheduler.done(running.pop(future))
+
+
+def validate_sources(sources, all_sources):
+    """
+    Runs the pre-load checks on the sources about to be loaded, parents first.
+
+    Each table's references are checked against the keys of its parents that
+    passed their own checks, so rows pointing at a quarantined row are
+    quarantined too. Parents that are not reloaded are checked as well, so
+    that their quarantined rows are not counted as valid keys.
+
+    Args:
+        sources (dict): Tables to load, mapped to their CSV files.
+        all_sources (dict): Every table in the data folder, mapped to its CSV file.
+
+    Returns:
+        dict: Tables to load, mapped to the file to load: the source, or its
+        clean copy when rows were quarantined.
+    """
+    references = {table_name: csv_references(table_name) for table_name in all_sources}
+    referenced = {}
+    for table_references in references.values():
+        for parent_name, parent_header in table_references.values():
+            referenced.setdefault(parent_name, set()).add(parent_header)
+
+    graph = build_load_graph(all_sources)
+    for table_name, table_references in references.items():
+        graph[table_name] |= {parent_name for parent_name, _ in table_references.values() if parent_name in graph}
+    load_order = list(TopologicalSorter(graph).static_order())
+    checked = set(sources)
+    for table_name in reversed(load_order):
+        if table_name in checked:
+            checked |= graph[table_name]
+
+    parent_keys, load_paths = {}, {}
+    for table_name in load_order:
+        if table_name not in checked:
+            continue
+        columns = validation_columns(table_name)
+        key_headers = [header for header in referenced.get(table_name, ()) if header in columns]
+        try:
+            result = validation.validate_source(
+                table_name, all_sources[table_name], columns, references[table_name], parent_keys, key_headers
+            )
+        except Exception as e:
+            logger.error(f"Failed to check {table_name}: {e}")
+            if table_name in sources:
+                load_paths[table_name] = sources[table_name]
+            continue
+        parent_keys.update({(table_name, header): keys for header, keys in result["keys"].items()})
+        if table_name in sources:
+            quality_stats[table_name] = {key: result[key] for key in ("rows", "quarantined", "failures")}
+            load_paths[table_name] = result["path"]
+    return load_paths
+
+
+def select_changed_sources(sources, skip_unchanged=True):
+    """
+    Fingerprints the source files and leaves out the ones that are unchanged.
+
+    A file is unchanged when its content hash and size match the manifest
+    and its table still exists.
+
+    Args:
+        sources (dict): Table name mapped to the path of its CSV file.
+        skip_unchanged (bool): Whether unchanged files are left out.
+
+    Returns:
+        tuple: The sources to load, and their fingerprints keyed by table name.
+    """
+    previous = manifest.load_manifest()
+    inspector = inspect(engine)
+    changed, fingerprints = {}, {}
+    for table_name, csv_path in sources.items():
+        fingerprint = manifest.fingerprint_file(csv_path)
+        if skip_unchanged and manifest.is_unchanged(csv_path, fingerprint, previous) \
+                and inspector.has_table(table_name):
+            logger.info(f"Skipping {table_name}: {csv_path} is unchanged")
+            continue
+        changed[table_name] = csv_path
+        fingerprints[table_name] = fingerprint
+    return changed, fingerprints
+
+
+def record_loaded_sources(sources, fingerprints):
+    """
+    Records the row deltas and manifest entries of the tables loaded in this run.
+
+    Tables that failed to load are left out so they are retried next run.
+
+    Args:
+        sources (dict): Table name mapped to the path of its CSV file.
+        fingerprints (dict): Fingerprints keyed by table name.
+    """
+    for table_name, csv_path in sources.items():
+        if table_name not in load_stats:
+            continue
+        try:
+            deltas = manifest.compute_row_deltas(table_name, csv_path)
+            if deltas is not None:
+                manifest.record_deltas(table_name, deltas)
+                logger.info(
+                    f"{table_name}: {len(deltas['inserted'])} inserted, {len(deltas['updated'])} updated, "
+                    f"{len(deltas['deleted'])} deleted rows"
+                )
+            manifest.record_manifest(csv_path, table_name, fingerprints[table_name], load_stats[table_name]["rows"])
+        except Exception as e:
+            logger.error(f"Failed to record manifest for {table_name}: {e}")
+
+
+def select_tables(all_sources, tables=None):
+    """
+    Restricts the discovered sources to the requested tables.
+
+    Args:
+        all_sources (dict): Every table in the data folder, mapped to its CSV file.
+        tables (iterable, optional): Tables to keep. Defaults to all of them.
+
+    Returns:
+        dict: The requested tables mapped to their CSV files.
+    """
+    if tables is None:
+        return all_sources
+    missing = sorted(set(tables) - set(all_sources))
+    if missing:
+        logger.warning(f"No source file for {', '.join(missing)}")
+    return {table_name: csv_path for table_name, csv_path in all_sources.items() if table_name in tables}
 
-# Check if Data folder exists
-if not path.exists("Data"):
-    logger.error("Data folder not found. Please ensure the folder exists.")
-    exit(1)
 
-# Specify the path to the folder, using "*" to match all files
-folder_path = "Data/*.csv"
+def plan_load(sources, skip_unchanged=True):
+    """
+    Works out what a run would do with the given sources, without loading anything.
 
-# Use glob to get a list of file paths in the specified folder
-files = glob.glob(folder_path)
-base_names = [path.splitext(path.basename(file))[0] for file in files]
+    Args:
+        sources (dict): Table name mapped to the path of its CSV file.
+        skip_unchanged (bool): Whether unchanged files are left out.
 
-# Load each CSV into its corresponding database table
-for table in base_names:
+    Returns:
+        list: One dict per table, in load order, with the wave it is loaded
+        in (tables of the same wave load concurrently), its file, the file
+        size, the estimated row count and whether it is loaded or skipped.
+    """
     try:
-        load_csv_to_table(table, path.join("Data", f"{table}.csv"))
+        changed, _ = select_changed_sources(sources, skip_unchanged)
     except Exception as e:
-        logger.error(f"Failed to ingest table {table}: {e}")
+        logger.warning(f"Could not compare the files with the manifest, assuming they all changed: {e}")
+        changed = sources
+    scheduler = TopologicalSorter(build_load_graph(sources))
+    scheduler.prepare()
+    plan = []
+    wave = 0
+    while scheduler.is_active():
+        wave += 1
+        ready = sorted(scheduler.get_ready())
+        for table_name in ready:
+            csv_path = sources[table_name]
+            plan.append({
+                "wave": wave,
+                "table": table_name,
+                "file": csv_path,
+                "bytes": path.getsize(csv_path),
+                "rows": source_files.estimate_rows(csv_path),
+                "action": "load" if table_name in changed else "skip",
+            })
+        scheduler.done(*ready)
+    return plan
+
+
+def print_load_plan(plan, mode, workers, chunk_rows, chunk_bytes):
+    """
+    Prints the result of plan_load with the settings of the run.
+
+    Args:
+        plan (list): Result of plan_load.
+        mode (str): Load mode.
+        workers (int): Number of tables loaded concurrently.
+        chunk_rows (int): Rows per chunk.
+        chunk_bytes (int): Memory budget per chunk, 0 when unset.
+    """
+    chunking = f"{chunk_bytes / 2 ** 20:.0f} MiB" if chunk_bytes else f"{chunk_rows} rows"
+    print(f"Load plan: mode {mode}, {workers} workers, chunks of {chunking}, "
+          f"validation {'on' if VALIDATE else 'off'}, de-duplication {'on' if DEDUPLICATE else 'off'}")
+    print(f"{'wave':>4}  {'table':<14} {'action':<6} {'size':>10} {'est. rows':>12}  file")
+    for step in plan:
+        print(f"{step['wave']:>4}  {step['table']:<14} {step['action']:<6} "
+              f"{step['bytes'] / 2 ** 20:>6.1f} MiB {step['rows']:>12,}  {step['file']}")
+    loaded = [step for step in plan if step["action"] == "load"]
+    print(f"{len(loaded)} of {len(plan)} tables to load, about {sum(step['rows'] for step in loaded):,} rows "
+          f"from {sum(step['bytes'] for step in loaded) / 2 ** 20:.1f} MiB")
+
+
+def run_etl(tables=None, mode=None, workers=None, chunk_rows=None, chunk_bytes=None, force=False, dry_run=False):
+    """
+    Recreates the schema and loads every new or changed CSV in the Data folder.
+
+    The files are checked before loading and failing rows are quarantined
+    (see validation), then duplicate customers are merged (see dedup). The duration of every stage is recorded, together with
+    the load statistics, in a run report (see run_report).
+
+    Args:
+        tables (iterable, optional): Tables to load. Defaults to every CSV in
+            the Data folder; the other tables are left untouched.
+        mode (str, optional): Load mode. Defaults to LOAD_MODE.
+        workers (int, optional): Tables loaded concurrently. Defaults to WORKERS.
+        chunk_rows (int, optional): Rows per chunk. Defaults to CHUNK_ROWS.
+        chunk_bytes (int, optional): Memory budget per chunk. Defaults to CHUNK_BYTES.
+        force (bool): Load the files even if they are unchanged since the last run.
+        dry_run (bool): Print the load plan instead of loading.
+    """
+    # Check if Data folder exists
+    if not path.exists(DATA_DIR):
+        logger.error("Data folder not found. Please ensure the folder exists.")
+        exit(1)
+
+    mode = mode or LOAD_MODE
+    skip_unchanged = INCREMENTAL and not force
+    if dry_run:
+        plan = plan_load(select_tables(discover_sources(), tables), skip_unchanged)
+        print_load_plan(plan, mode, workers or WORKERS, chunk_rows or CHUNK_ROWS, chunk_bytes or CHUNK_BYTES)
+        return
+
+    started_at = datetime.now()
+    stages = {}
+    sources = {}
+    try:
+        all_sources = discover_sources()
+        with run_report.timed_stage(stages, "fingerprint"):
+            sources, fingerprints = select_changed_sources(
+                select_tables(all_sources, tables), skip_unchanged=skip_unchanged
+            )
+        if not sources:
+            logger.info("All source files are unchanged, nothing to load.")
+            return
+
+        if mode == "upsert":
+            add_rebuilt_parents(sources, fingerprints, all_sources)
+
+        load_paths = sources
+        if VALIDATE:
+            with run_report.timed_stage(stages, "quality"):
+                load_paths = validate_sources(sources, all_sources)
+        if DEDUPLICATE:
+            with run_report.timed_stage(stages, "dedup"):
+                load_paths = dedup.deduplicate_sources(load_paths)
+
+        if mode == "swap":
+            # Live tables stay in place until their staging copy is swapped in
+            logger.info("Loading into staging tables.")
+        elif mode in REPLACE_MODES:
+            # Drop and recreate tables
+            with run_report.timed_stage(stages, "drop"):
+                if "results" in sources:
+                    drop_table_with_cascade("results")
+            with run_report.timed_stage(stages, "create_all"):
+                Base.metadata.create_all(bind=engine)
+            logger.info("Tables have been recreated.")
+
+            # Tables are replaced by the loads, so their foreign keys are dropped
+            # up front instead of by every DROP ... CASCADE running in parallel
+            with run_report.timed_stage(stages, "drop"):
+                drop_all_foreign_keys(None if tables is None else set(sources))
+        else:
+            with run_report.timed_stage(stages, "create_all"):
+                prepare_model_tables(sources)
+            logger.info("Model tables are in place.")
+
+        with run_report.timed_stage(stages, "load"):
+            window = bulk_window(sources) if BULK_WINDOW and mode == "upsert" else nullcontext()
+            with window:
+                load_tables_concurrently(load_paths, workers, mode, chunk_rows, chunk_bytes)
+        logger.info(f"Loaded all tables in {stages['load']:.2f}s")
+        if DEDUPLICATE and mode == "upsert":
+            # Upserts keep the rows of earlier loads, which may still point at merged customers
+            with run_report.timed_stage(stages, "dedup"):
+                dedup.apply_merge_map()
+        with run_report.timed_stage(stages, "manifest"):
+            record_loaded_sources(sources, fingerprints)
+
+        # Validate schema for the results table
+        with run_report.timed_stage(stages, "validate"):
+            validate_table_schema("results")
+
+        log_load_summary()
+        logger.info("Tables are populated.")
+    finally:
+        run_report.save_run_record(
+            run_report.build_run_record(started_at, mode, stages, load_stats, sources, quality_stats)
+        )
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line of the ETL.
+
+    Args:
+        argv (list, optional): Arguments to parse. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed options, defaulting to the ETL_* settings.
+    """
+    parser = argparse.ArgumentParser(description="Load the CSV files of the Data folder into the database.")
+    parser.add_argument("--tables", help="comma-separated tables to load; the others are left untouched")
+    parser.add_argument("--mode", choices=("copy", "chunked", "pandas", "swap", "upsert"), default=LOAD_MODE,
+                        help=f"load mode (default: {LOAD_MODE})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"tables loaded concurrently (default: {WORKERS})")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"rows per chunk of the chunked and upsert modes (default: {CHUNK_ROWS})")
+    parser.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES,
+                        help="memory budget per chunk of the chunked mode, overrides --chunk-rows")
+    parser.add_argument("--force", action="store_true", help="load the files even if they are unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="print the load plan and estimated rows and exit")
+    args = parser.parse_args(argv)
+    if args.tables:
+        args.tables = [table_name.strip() for table_name in args.tables.split(",") if table_name.strip()]
+        unknown = sorted(set(args.tables) - set(discover_sources()))
+        if unknown:
+            parser.error(f"no source file in {DATA_DIR} for {', '.join(unknown)}")
+    else:
+        args.tables = None
+    if args.workers < 1 or args.chunk_rows < 1 or args.chunk_bytes < 0:
+        parser.error("--workers and --chunk-rows must be positive, --chunk-bytes must not be negative")
+    return args
+
+
+def main(argv=None):
+    """
+    Runs the ETL with the options of the command line.
+
+    Args:
+        argv (list, optional): Arguments to parse. Defaults to sys.argv.
+    """
+    args = parse_args(argv)
+    run_etl(
+        tables=args.tables,
+        mode=args.mode,
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+        chunk_bytes=args.chunk_bytes,
+        force=args.force,
+        dry_run=args.dry_run,
+    )
 
-# Validate schema for the results table
-validate_table_schema("results")
 
-logger.info("Tables are populated.")
+if __name__ == "__main__":
+    main()
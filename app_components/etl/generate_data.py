@@ -0,0 +1,259 @@
+"""
+Generates synthetic source files for all eight ETL tables at any scale.
+
+The output has the same layout as the files in Data/ and keeps referential
+integrity: every subscription points at an existing customer, location,
+application, plan, price and notification. Generation is deterministic for a
+given seed, chunk size and scale. The customer, subscription and results
+files are produced in parallel chunks, each seeded from (seed, chunk index),
+written to part files and concatenated in order.
+
+Usage:
+    python generate_data.py --customers 1000000 --output Data_1m
+"""
+import argparse
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+APPLICATIONS = ["Yandex Music", "Apple Music", "Spotify", "Tidal", "Deezer", "YouTube Music"]
+PLANS = ["Basic", "Standard", "Premium", "Family", "Student"]
+NOTIFICATIONS = ["Email", "SMS", "Social Media", "In-app"]
+GENDERS = np.array(["Male", "Female"])
+STATUSES = np.array(["Active", "Expired", "Canceled"])
+STATUS_WEIGHTS = [0.39, 0.34, 0.27]
+DEVICE_TYPES = np.array(["Tablet", "Notebook", "iPad", "Smart TV", "Phone"])
+
+# Dates are drawn relative to a fixed day so the output does not depend on when it is generated
+REFERENCE_DATE = np.datetime64("2024-12-31")
+FIRST_START_DATE = np.datetime64("2021-01-01")
+
+# Size of the first and last name pools drawn from Faker
+NAME_POOL_SIZE = 2000
+
+# Pools shared with the worker processes, set by init_worker
+_pools = {}
+
+
+def build_pools(seed, locations):
+    """
+    Draws the name and city pools the generated rows pick from.
+
+    Args:
+        seed (int): Seed of the Faker instance.
+        locations (int): Number of distinct location names.
+
+    Returns:
+        dict: Arrays of first names, last names and unique area names.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    area_names = []
+    seen = set()
+    while len(area_names) < locations:
+        name = fake.city()
+        if name in seen:
+            name = f"{name} {len(area_names) + 1}"
+        seen.add(name)
+        area_names.append(name)
+    return {
+        "first_names": np.array([fake.first_name() for _ in range(NAME_POOL_SIZE)]),
+        "last_names": np.array([fake.last_name() for _ in range(NAME_POOL_SIZE)]),
+        "area_names": np.array(area_names),
+    }
+
+
+def init_worker(pools):
+    """
+    Receives the shared pools in a worker process.
+
+    Args:
+        pools (dict): Result of build_pools.
+    """
+    _pools.update(pools)
+
+
+def dimension_tables(seed, locations):
+    """
+    Builds the small lookup tables.
+
+    Args:
+        seed (int): Seed of the price draw.
+        locations (int): Number of locations.
+
+    Returns:
+        dict: Table name mapped to its DataFrame.
+    """
+    rng = np.random.default_rng([seed, 0])
+    app_ids = np.repeat(np.arange(1, len(APPLICATIONS) + 1), len(PLANS))
+    plan_ids = np.tile(np.arange(1, len(PLANS) + 1), len(APPLICATIONS))
+    base_prices = rng.uniform(5, 12, len(APPLICATIONS)).round(0) - 0.01
+    prices = base_prices[app_ids - 1] + (plan_ids - 1) * rng.choice([0.5, 1.0, 2.0], len(app_ids))
+    return {
+        "location": pd.DataFrame({
+            "location_id": np.arange(1, locations + 1),
+            "area_name": _pools["area_names"],
+        }),
+        "application": pd.DataFrame({"app_id": np.arange(1, len(APPLICATIONS) + 1), "application_name": APPLICATIONS}),
+        "plan": pd.DataFrame({"plan_id": np.arange(1, len(PLANS) + 1), "plan_type": PLANS}),
+        "notification": pd.DataFrame({
+            "notification_id": np.arange(1, len(NOTIFICATIONS) + 1),
+            "notification_type": NOTIFICATIONS,
+        }),
+        "price": pd.DataFrame({
+            "id": np.arange(1, len(app_ids) + 1),
+            "application_id": app_ids,
+            "plan_id": plan_ids,
+            "price": prices.round(2),
+        }),
+    }
+
+
+def generate_chunk(seed, chunk_index, first_customer_id, customers, subscriptions_per_customer, part_dir):
+    """
+    Generates the customer, subscription and results rows of one chunk of customers.
+
+    Args:
+        seed (int): Global seed.
+        chunk_index (int): Position of the chunk, mixed into its seed.
+        first_customer_id (int): Id of the first customer in the chunk.
+        customers (int): Number of customers in the chunk.
+        subscriptions_per_customer (int): Subscriptions generated per customer.
+        part_dir (str): Folder the part files are written to.
+
+    Returns:
+        int: Index of the chunk that was written.
+    """
+    rng = np.random.default_rng([seed, 1, chunk_index])
+    customer_ids = np.arange(first_customer_id, first_customer_id + customers)
+
+    first_names = _pools["first_names"][rng.integers(0, NAME_POOL_SIZE, customers)]
+    last_names = _pools["last_names"][rng.integers(0, NAME_POOL_SIZE, customers)]
+    birth_dates = REFERENCE_DATE - rng.integers(18 * 365, 51 * 365, customers).astype("timedelta64[D]")
+    location_ids = rng.integers(1, len(_pools["area_names"]) + 1, customers)
+    customer = pd.DataFrame({
+        "customer_id": customer_ids,
+        "first_name": first_names,
+        "last_name": last_names,
+        "gender": GENDERS[rng.integers(0, len(GENDERS), customers)],
+        "birth_date": birth_dates,
+        "age": ((REFERENCE_DATE - birth_dates).astype("timedelta64[D]").astype(int) // 365),
+        "location": _pools["area_names"][location_ids - 1],
+    })
+    customer["email"] = (
+        customer["first_name"].str.lower() + "." + customer["last_name"].str.lower()
+        + "." + customer["customer_id"].astype(str) + "@example.com"
+    )
+
+    rows = customers * subscriptions_per_customer
+    application_ids = rng.integers(1, len(APPLICATIONS) + 1, rows)
+    plan_ids = rng.integers(1, len(PLANS) + 1, rows)
+    span = (REFERENCE_DATE - FIRST_START_DATE).astype(int)
+    start_dates = FIRST_START_DATE + rng.integers(0, span, rows).astype("timedelta64[D]")
+    subscription = pd.DataFrame({
+        "id": (np.repeat(customer_ids, subscriptions_per_customer) - 1) * subscriptions_per_customer
+        + np.tile(np.arange(1, subscriptions_per_customer + 1), customers),
+        "customer_id": np.repeat(customer_ids, subscriptions_per_customer),
+        "location_id": np.repeat(location_ids, subscriptions_per_customer),
+        "application_id": application_ids,
+        "plan_type_id": plan_ids,
+        "price_id": (application_ids - 1) * len(PLANS) + plan_ids,
+        "notification_id": rng.integers(1, len(NOTIFICATIONS) + 1, rows),
+        "start_date": start_dates,
+        "status": rng.choice(STATUSES, rows, p=STATUS_WEIGHTS),
+        "end_date": start_dates + rng.integers(30, 365, rows).astype("timedelta64[D]"),
+        "duration": rng.integers(1, 13, rows),
+        "device_type": DEVICE_TYPES[rng.integers(0, len(DEVICE_TYPES), rows)],
+    })
+
+    results = pd.DataFrame({
+        "id": customer_ids,
+        "customer_id": customer_ids,
+        "churn_probability": np.nan,
+        "cluster_number": np.nan,
+    })
+
+    for table_name, df in (("customer", customer), ("subscription", subscription), ("results", results)):
+        df.to_csv(os.path.join(part_dir, f"{table_name}.{chunk_index:06d}.csv"), index=False, header=False,
+                  date_format="%Y-%m-%d")
+    return chunk_index
+
+
+def generate_dataset(output_dir, customers, subscriptions_per_customer=1, locations=125, seed=42,
+                     chunk_size=250000, workers=None):
+    """
+    Writes the eight source files of a synthetic dataset.
+
+    Args:
+        output_dir (str): Folder the CSV files are written to.
+        customers (int): Number of customers.
+        subscriptions_per_customer (int): Subscriptions per customer.
+        locations (int): Number of locations.
+        seed (int): Seed of every random draw.
+        chunk_size (int): Customers generated per parallel chunk.
+        workers (int, optional): Worker processes. Defaults to the CPU count.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    part_dir = os.path.join(output_dir, ".parts")
+    os.makedirs(part_dir, exist_ok=True)
+
+    pools = build_pools(seed, locations)
+    init_worker(pools)
+    for table_name, df in dimension_tables(seed, locations).items():
+        df.to_csv(os.path.join(output_dir, f"{table_name}.csv"), index=False)
+
+    starts = list(range(1, customers + 1, chunk_size))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(pools,)) as pool:
+        futures = [
+            pool.submit(generate_chunk, seed, index, start, min(chunk_size, customers - start + 1),
+                        subscriptions_per_customer, part_dir)
+            for index, start in enumerate(starts)
+        ]
+        for future in futures:
+            logger.info(f"Generated chunk {future.result() + 1}/{len(starts)}")
+
+    headers = {
+        "customer": "customer_id,first_name,last_name,gender,birth_date,age,location,email",
+        "subscription": "id,customer_id,location_id,application_id,plan_type_id,price_id,notification_id,"
+                        "start_date,status,end_date,duration,device_type",
+        "results": "id,customer_id,churn_probability,cluster_number",
+    }
+    for table_name, header in headers.items():
+        with open(os.path.join(output_dir, f"{table_name}.csv"), "w") as target:
+            target.write(header + "\n")
+            for index in range(len(starts)):
+                part_path = os.path.join(part_dir, f"{table_name}.{index:06d}.csv")
+                with open(part_path) as part:
+                    shutil.copyfileobj(part, target, 1 << 20)
+                os.remove(part_path)
+    os.rmdir(part_dir)
+    logger.info(f"Wrote {customers} customers and {customers * subscriptions_per_customer} subscriptions to {output_dir}")
+
+
+def main():
+    """
+    Parses the command line and generates the dataset.
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic ETL source files.")
+    parser.add_argument("--customers", type=int, default=1000000, help="number of customers")
+    parser.add_argument("--subscriptions-per-customer", type=int, default=1)
+    parser.add_argument("--locations", type=int, default=125)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=250000, help="customers per parallel chunk")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output", default="Data_generated", help="output folder")
+    args = parser.parse_args()
+    generate_dataset(args.output, args.customers, args.subscriptions_per_customer, args.locations,
+                     args.seed, args.chunk_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
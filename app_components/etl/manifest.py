@@ -0,0 +1,187 @@
+"""
+Fingerprints of the ETL source files, used to skip files that have not
+changed since the last run and to report which rows changed in the ones
+that did.
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Database.database import SessionLocal, engine
+from Database.models import IngestionDelta, IngestionManifest
+
+logger = logging.getLogger(__name__)
+
+# Folder holding the per-table row hash snapshots used for delta detection
+STATE_DIR = os.environ.get("ETL_STATE_DIR", os.path.join(os.environ.get("ETL_DATA_DIR", "Data"), ".state"))
+
+# Rows hashed per batch when building a snapshot
+SNAPSHOT_CHUNK_ROWS = 500000
+
+HASH_BLOCK_SIZE = 1 << 20
+
+# Fingerprints computed by this process, keyed by the path and stat of the file
+computed_fingerprints = {}
+
+
+def fingerprint_file(file_path):
+    """
+    Computes the content hash and size of a source file.
+
+    A file is hashed once per process while it is unchanged. The ctime is
+    part of the key, since writing a file always updates it, even when the
+    size and mtime are kept (cp -p, rsync -t, touch -r).
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        dict: SHA-256 hex digest under "content_hash" and size under "size_bytes".
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+    if key not in computed_fingerprints:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        computed_fingerprints[key] = {"content_hash": digest.hexdigest(), "size_bytes": stat.st_size}
+    return dict(computed_fingerprints[key])
+
+
+def load_manifest():
+    """
+    Reads the manifest of previously loaded files.
+
+    Returns:
+        dict: File name mapped to its IngestionManifest row.
+    """
+    with SessionLocal() as session:
+        return {entry.file_name: entry for entry in session.query(IngestionManifest).all()}
+
+
+def is_unchanged(file_path, fingerprint, manifest):
+    """
+    Tells whether a file matches the fingerprint recorded at its last load.
+
+    Args:
+        file_path (str): Path to the file.
+        fingerprint (dict): Result of fingerprint_file for the file.
+        manifest (dict): Result of load_manifest.
+
+    Returns:
+        bool: True if the content hash and size are unchanged.
+    """
+    entry = manifest.get(os.path.basename(file_path))
+    return (
+        entry is not None
+        and entry.content_hash == fingerprint["content_hash"]
+        and entry.size_bytes == fingerprint["size_bytes"]
+    )
+
+
+def record_manifest(file_path, table_name, fingerprint, row_count):
+    """
+    Stores the fingerprint and row count of a file that was just loaded.
+
+    Args:
+        file_path (str): Path to the file.
+        table_name (str): Table the file was loaded into.
+        fingerprint (dict): Result of fingerprint_file for the file.
+        row_count (int): Number of rows loaded.
+    """
+    with SessionLocal() as session:
+        session.merge(
+            IngestionManifest(
+                file_name=os.path.basename(file_path),
+                table_name=table_name,
+                content_hash=fingerprint["content_hash"],
+                size_bytes=fingerprint["size_bytes"],
+                row_count=row_count,
+                loaded_at=datetime.now(),
+            )
+        )
+        session.commit()
+
+
+def build_row_snapshot(csv_path):
+    """
+    Hashes every row of a CSV file, keyed by its first column.
+
+    The file is read as text so that the hashes do not depend on type inference.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        pd.Series: Row hashes (uint64) indexed by key, one entry per key.
+    """
+    keys, hashes = [], []
+    reader = pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=SNAPSHOT_CHUNK_ROWS)
+    for chunk in reader:
+        keys.append(chunk.iloc[:, 0].to_numpy(dtype=str))
+        hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+    if not keys:
+        return pd.Series([], dtype=np.uint64)
+    snapshot = pd.Series(np.concatenate(hashes), index=np.concatenate(keys))
+    return snapshot[~snapshot.index.duplicated(keep="last")]
+
+
+def compute_row_deltas(table_name, csv_path):
+    """
+    Compares a source file with the snapshot taken at its previous load.
+
+    The new snapshot replaces the old one on disk.
+
+    Args:
+        table_name (str): Table the file is loaded into.
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        dict: Keys under "inserted", "updated" and "deleted", or None when
+        there is no previous snapshot to compare with.
+    """
+    snapshot_path = os.path.join(STATE_DIR, f"{table_name}.npz")
+    current = build_row_snapshot(csv_path)
+
+    deltas = None
+    if os.path.exists(snapshot_path):
+        with np.load(snapshot_path) as stored:
+            previous = pd.Series(stored["hashes"], index=stored["keys"])
+        common = current.index.intersection(previous.index)
+        changed = current.loc[common].to_numpy() != previous.loc[common].to_numpy()
+        deltas = {
+            "inserted": current.index.difference(previous.index).tolist(),
+            "updated": common[changed].tolist(),
+            "deleted": previous.index.difference(current.index).tolist(),
+        }
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    np.savez(snapshot_path, keys=current.index.to_numpy(dtype=str), hashes=current.to_numpy())
+    return deltas
+
+
+def record_deltas(table_name, deltas):
+    """
+    Appends the detected row changes of a table to the etl_delta table.
+
+    Args:
+        table_name (str): Table the changes belong to.
+        deltas (dict): Result of compute_row_deltas.
+    """
+    detected_at = datetime.now()
+    frames = [
+        pd.DataFrame({"row_key": keys, "change_type": change_type})
+        for change_type, keys in deltas.items()
+        if keys
+    ]
+    if not frames:
+        return
+    changes = pd.concat(frames, ignore_index=True)
+    changes.insert(0, "table_name", table_name)
+    changes["detected_at"] = detected_at
+    changes.to_sql(IngestionDelta.__tablename__, con=engine, if_exists="append", index=False)
@@ -0,0 +1,197 @@
+"""
+Optional range partitioning of the subscription table by start_date.
+
+With ETL_SUBSCRIPTION_PARTITIONING set to "monthly" or "yearly", the table is
+created as a PostgreSQL range-partitioned parent. Before each load, one
+partition per month or year is created for every date in the source file,
+plus FUTURE_PARTITIONS more ahead of the later of the newest date and today,
+and a DEFAULT partition that catches the dates outside the created ranges.
+PostgreSQL then routes every inserted or copied row to its partition, and
+queries filtering on start_date only scan the partitions they need.
+
+The model table (upsert mode) has start_date in its primary key, as
+PostgreSQL requires of a partition key, so it never holds a row without a
+date. The tables shaped like the CSV (the other modes) have no primary key,
+and their rows without a date also go to the DEFAULT partition.
+
+Other backends ignore the setting.
+"""
+import logging
+import os
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+
+from Database.database import engine
+from Database.models import SUBSCRIPTION_PARTITIONING
+
+logger = logging.getLogger(__name__)
+
+# Partition interval of the subscription table: "monthly", "yearly", or empty
+# for a plain table; validated by Database.models before any table is created
+INTERVAL = SUBSCRIPTION_PARTITIONING
+
+# Partitions created ahead of the newest date
+FUTURE_PARTITIONS = int(os.environ.get("ETL_FUTURE_PARTITIONS", 3))
+
+# Partitioned tables mapped to their partition key
+PARTITION_KEYS = {"subscription": "start_date"}
+
+# Rows read at a time when scanning a file for its date range
+SCAN_CHUNK_ROWS = 1000000
+
+
+def is_partitioned(table_name):
+    """
+    Tells whether a table is loaded as a range-partitioned table.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        bool: True if partitioning is enabled, supported and defined for the table.
+    """
+    return bool(INTERVAL) and table_name in PARTITION_KEYS and engine.dialect.name == "postgresql"
+
+
+def partition_start(day):
+    """
+    Returns the first day of the partition holding a date.
+
+    Args:
+        day (date): Any date.
+
+    Returns:
+        date: First day of its month or year.
+    """
+    return date(day.year, 1, 1) if INTERVAL == "yearly" else date(day.year, day.month, 1)
+
+
+def next_partition_start(day):
+    """
+    Returns the first day of the partition following the one starting on a date.
+
+    Args:
+        day (date): First day of a partition.
+
+    Returns:
+        date: First day of the next month or year.
+    """
+    if INTERVAL == "yearly":
+        return date(day.year + 1, 1, 1)
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(table_name, day):
+    """
+    Names the partition starting on a date, e.g. subscription_p2023_05.
+
+    Args:
+        table_name (str): Name of the parent table.
+        day (date): First day of the partition.
+
+    Returns:
+        str: Name of the partition.
+    """
+    suffix = f"{day.year}" if INTERVAL == "yearly" else f"{day.year}_{day.month:02d}"
+    return f"{table_name}_p{suffix}"
+
+
+def partition_bounds(first_day, last_day, future=None):
+    """
+    Lists the partitions covering a date range and the ones after it.
+
+    Args:
+        first_day (date): Oldest date to cover.
+        last_day (date): Newest date to cover; partitions are also created
+            up to today, whichever is later.
+        future (int, optional): Partitions added after the newest one.
+            Defaults to FUTURE_PARTITIONS.
+
+    Returns:
+        list: (lower, upper) bounds of consecutive partitions.
+    """
+    lower = partition_start(first_day)
+    last = partition_start(max(last_day, date.today()))
+    for _ in range(FUTURE_PARTITIONS if future is None else future):
+        last = next_partition_start(last)
+    bounds = []
+    while lower <= last:
+        upper = next_partition_start(lower)
+        bounds.append((lower, upper))
+        lower = upper
+    return bounds
+
+
+def source_date_range(csv_path, column):
+    """
+    Finds the oldest and newest date of a column in a CSV file.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        column (str): Date column to scan.
+
+    Returns:
+        tuple: (oldest, newest) as dates, or None if the column has no dates.
+    """
+    first_day = last_day = None
+    reader = pd.read_csv(csv_path, usecols=[column], parse_dates=[column], date_format="ISO8601",
+                         chunksize=SCAN_CHUNK_ROWS)
+    for chunk in reader:
+        dates = pd.to_datetime(chunk[column], errors="coerce").dropna()
+        if dates.empty:
+            continue
+        first_day = min(first_day, dates.min()) if first_day is not None else dates.min()
+        last_day = max(last_day, dates.max()) if last_day is not None else dates.max()
+    if first_day is None:
+        return None
+    return first_day.date(), last_day.date()
+
+
+def create_partitioned_table(connection, table_name, create_sql):
+    """
+    Creates a range-partitioned parent table from a plain CREATE TABLE statement.
+
+    Args:
+        connection: Connection holding the load transaction.
+        table_name (str): Name of the table.
+        create_sql (str): CREATE TABLE statement without a PARTITION BY clause.
+    """
+    connection.execute(text(f'{create_sql.strip()} PARTITION BY RANGE ("{PARTITION_KEYS[table_name]}")'))
+    logger.info(f"Created {table_name} partitioned {INTERVAL} by {PARTITION_KEYS[table_name]}")
+
+
+def ensure_partitions(connection, table_name, csv_path, parent_name=None):
+    """
+    Creates the missing partitions for the dates in a source file.
+
+    Args:
+        connection: Connection holding the load transaction.
+        table_name (str): Name of the partitioned table.
+        csv_path (str): Path to the CSV file about to be loaded.
+        parent_name (str, optional): Physical table to partition, such as a
+            staging copy of the table. Defaults to table_name.
+    """
+    parent_name = parent_name or table_name
+    date_range = source_date_range(csv_path, PARTITION_KEYS[table_name])
+    bounds = partition_bounds(*date_range) if date_range else partition_bounds(date.today(), date.today())
+    existing = set(connection.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = to_regclass(:table_name)"),
+        {"table_name": f'"{parent_name}"'},
+    ).scalars())
+    created = 0
+    for lower, upper in bounds:
+        name = partition_name(parent_name, lower)
+        if name in existing:
+            continue
+        connection.execute(text(
+            f'CREATE TABLE "{name}" PARTITION OF "{parent_name}" '
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        created += 1
+    default_name = f"{parent_name}_default"
+    if default_name not in existing:
+        connection.execute(text(f'CREATE TABLE "{default_name}" PARTITION OF "{parent_name}" DEFAULT'))
+    logger.info(f"{parent_name}: created {created} of {len(bounds)} range partitions")
@@ -0,0 +1,164 @@
+"""
+Structured record of an ETL run: seconds spent per stage, and rows, bytes
+read, timings and peak memory per table. Every run is written as a JSON file
+in REPORT_DIR and as a row of the etl_runs table, so that latency can be
+charted across runs and a regression traced back to a stage or a table.
+
+Stages timed by run_etl are stored as measured. The parse and write stages
+are the sums of the per-table parse and database times, so with tables
+loaded concurrently they can add up to more than the load stage.
+"""
+import json
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from Database.database import SessionLocal, engine
+from Database.models import EtlRun
+
+logger = logging.getLogger(__name__)
+
+# Folder holding one JSON report per run
+REPORT_DIR = os.environ.get(
+    "ETL_REPORT_DIR", os.path.join(os.environ.get("ETL_DATA_DIR", "Data"), ".state", "runs")
+)
+
+
+@contextmanager
+def timed_stage(stages, name):
+    """
+    Adds the wall time of a block to the duration of a stage.
+
+    Args:
+        stages (dict): Stage name mapped to seconds, updated in place.
+        name (str): Stage the block belongs to.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def build_run_record(started_at, load_mode, stages, load_stats, sources, quality_stats=None):
+    """
+    Assembles the record of a run from its stage timings and load statistics.
+
+    Args:
+        started_at (datetime): When the run started.
+        load_mode (str): Load mode of the run.
+        stages (dict): Seconds spent per stage, from timed_stage.
+        load_stats (dict): Per-table statistics collected by load_csv_to_table.
+        sources (dict): Tables the run set out to load, mapped to their files.
+        quality_stats (dict, optional): Per-table results of the pre-load checks.
+
+    Returns:
+        dict: The run record, ready to be serialized as JSON.
+    """
+    finished_at = datetime.now()
+    tables = {
+        table_name: {
+            "mode": stats["mode"],
+            "rows": stats["rows"],
+            "chunks": stats["chunks"],
+            "bytes_read": stats.get("bytes_read", 0),
+            "seconds": stats["seconds"],
+            "parse_seconds": stats.get("parse_seconds", 0.0),
+            "write_seconds": stats.get("db_seconds", 0.0),
+            "peak_rss_bytes": stats["peak_rss_bytes"],
+        }
+        for table_name, stats in load_stats.items()
+    }
+    failed_tables = sorted(set(sources) - set(tables))
+    if not sources:
+        status = "unchanged"
+    else:
+        status = "failed" if failed_tables else "succeeded"
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": finished_at.isoformat(timespec="seconds"),
+        "load_mode": load_mode,
+        "status": status,
+        "seconds": (finished_at - started_at).total_seconds(),
+        "rows": sum(table["rows"] for table in tables.values()),
+        "bytes_read": sum(table["bytes_read"] for table in tables.values()),
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "stages": {
+            **stages,
+            "parse": sum(table["parse_seconds"] for table in tables.values()),
+            "write": sum(table["write_seconds"] for table in tables.values()),
+        },
+        "tables": tables,
+        "failed_tables": failed_tables,
+        "quarantined_rows": {
+            table_name: stats["quarantined"] for table_name, stats in (quality_stats or {}).items()
+        },
+    }
+
+
+def write_run_report(record, report_dir=None):
+    """
+    Writes a run record to its own JSON file.
+
+    Args:
+        record (dict): Result of build_run_record.
+        report_dir (str, optional): Target folder. Defaults to REPORT_DIR.
+
+    Returns:
+        str: Path of the written file.
+    """
+    report_dir = report_dir or REPORT_DIR
+    os.makedirs(report_dir, exist_ok=True)
+    stamp = record["started_at"].replace(":", "").replace("-", "")
+    report_path = os.path.join(report_dir, f"etl_run_{stamp}.json")
+    with open(report_path, "w") as report:
+        json.dump(record, report, indent=2)
+    return report_path
+
+
+def store_run_record(record):
+    """
+    Inserts a run record into the etl_runs table, creating the table if needed.
+
+    Args:
+        record (dict): Result of build_run_record.
+    """
+    EtlRun.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as session:
+        session.add(
+            EtlRun(
+                started_at=datetime.fromisoformat(record["started_at"]),
+                finished_at=datetime.fromisoformat(record["finished_at"]),
+                load_mode=record["load_mode"],
+                status=record["status"],
+                seconds=record["seconds"],
+                rows=record["rows"],
+                bytes_read=record["bytes_read"],
+                peak_rss_bytes=record["peak_rss_bytes"],
+                stages=record["stages"],
+                tables=record["tables"],
+            )
+        )
+        session.commit()
+
+
+def save_run_record(record):
+    """
+    Writes a run record to its JSON file and to the etl_runs table.
+
+    Failures are logged and do not fail the run.
+
+    Args:
+        record (dict): Result of build_run_record.
+    """
+    try:
+        logger.info(f"Run report written to {write_run_report(record)}")
+    except OSError as e:
+        logger.error(f"Failed to write the run report: {e}")
+    try:
+        store_run_record(record)
+    except Exception as e:
+        logger.error(f"Failed to store the run record: {e}")
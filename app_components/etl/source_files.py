@@ -0,0 +1,212 @@
+"""
+Discovery and reading of the ETL source files.
+
+A table is loaded from <table>.csv, or from a gzip or zstandard compressed
+<table>.csv.gz or <table>.csv.zst. Compressed files are never inflated to
+disk: pd.read_csv decompresses them on the fly (the compression is inferred
+from the extension), and open_source returns a stream that decompresses
+while COPY reads from it. The copies that validation and dedup write of a
+compressed file are compressed the same way, through open_target. Reading or
+writing .csv.zst files needs the zstandard package.
+"""
+import glob
+import gzip
+import io
+import logging
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Recognised source extensions mapped to their compression
+SOURCE_EXTENSIONS = {".csv": None, ".csv.gz": "gzip", ".csv.zst": "zstd"}
+
+# Bytes read at a time from a decompressing stream
+READ_BLOCK_SIZE = 1 << 20
+
+# Compression levels of the copies written with open_target, the defaults of the gzip and zstd tools
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Leading bytes of a plain CSV file sampled to estimate its row count
+ESTIMATE_SAMPLE_BYTES = 1 << 20
+
+
+def compression_of(file_path):
+    """
+    Returns the compression of a source file, from its extension.
+
+    Args:
+        file_path (str): Path to the source file.
+
+    Returns:
+        str: "gzip" or "zstd", or None for a plain CSV file.
+
+    Raises:
+        ValueError: If the extension is not one of SOURCE_EXTENSIONS.
+    """
+    for extension, compression in SOURCE_EXTENSIONS.items():
+        if file_path.endswith(extension):
+            return compression
+    raise ValueError(f"Unsupported source file {file_path}, expected one of {', '.join(SOURCE_EXTENSIONS)}")
+
+
+def extension_of(file_path):
+    """
+    Returns the source extension of a file, which copies of it keep.
+
+    Args:
+        file_path (str): Path to the source file.
+
+    Returns:
+        str: One of SOURCE_EXTENSIONS, e.g. ".csv.gz".
+
+    Raises:
+        ValueError: If the extension is not one of SOURCE_EXTENSIONS.
+    """
+    for extension in sorted(SOURCE_EXTENSIONS, key=len, reverse=True):
+        if file_path.endswith(extension):
+            return extension
+    raise ValueError(f"Unsupported source file {file_path}, expected one of {', '.join(SOURCE_EXTENSIONS)}")
+
+
+def table_name_for(file_path):
+    """
+    Derives the table a source file is loaded into, e.g. customer from customer.csv.gz.
+
+    Args:
+        file_path (str): Path to the source file.
+
+    Returns:
+        str: Table name.
+    """
+    name = os.path.basename(file_path)
+    for extension in sorted(SOURCE_EXTENSIONS, key=len, reverse=True):
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return os.path.splitext(name)[0]
+
+
+def find_sources(data_dir):
+    """
+    Finds the source files of a folder, one per table.
+
+    When a table has several files, such as customer.csv and
+    customer.csv.gz, the most recently modified one is used.
+
+    Args:
+        data_dir (str): Folder holding the source files.
+
+    Returns:
+        dict: Table name mapped to the path of its source file.
+    """
+    sources = {}
+    for extension in SOURCE_EXTENSIONS:
+        for file_path in sorted(glob.glob(os.path.join(data_dir, f"*{extension}"))):
+            table_name = table_name_for(file_path)
+            current = sources.get(table_name)
+            if current is not None:
+                if os.path.getmtime(file_path) <= os.path.getmtime(current):
+                    file_path, current = current, file_path
+                logger.warning(f"{table_name} has several source files, loading {file_path} and ignoring {current}")
+            sources[table_name] = file_path
+    return dict(sorted(sources.items()))
+
+
+def open_source(file_path):
+    """
+    Opens a source file as a binary stream of CSV text, decompressing while it is read.
+
+    Args:
+        file_path (str): Path to the source file.
+
+    Returns:
+        A binary file object to be used as a context manager.
+
+    Raises:
+        RuntimeError: If the file is zstandard compressed and zstandard is not installed.
+    """
+    compression = compression_of(file_path)
+    if compression == "gzip":
+        return gzip.open(file_path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"Reading {file_path} needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), read_size=READ_BLOCK_SIZE,
+                                                           closefd=True)
+    return open(file_path, "rb")
+
+
+def open_target(file_path):
+    """
+    Opens a file for writing CSV text, compressed as its extension says.
+
+    Args:
+        file_path (str): Path of the file to write, ending in one of SOURCE_EXTENSIONS.
+
+    Returns:
+        A text file object to be used as a context manager.
+
+    Raises:
+        RuntimeError: If the file is zstandard compressed and zstandard is not installed.
+    """
+    compression = compression_of(file_path)
+    if compression == "gzip":
+        return gzip.open(file_path, "wt", compresslevel=GZIP_LEVEL, newline="")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"Writing {file_path} needs the zstandard package")
+        writer = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(file_path, "wb"), closefd=True)
+        return io.TextIOWrapper(writer, newline="")
+    return open(file_path, "w", newline="")
+
+
+def count_rows(file_path):
+    """
+    Counts the data rows of a source file by streaming through its lines.
+
+    Args:
+        file_path (str): Path to the file, plain or compressed.
+
+    Returns:
+        int: Number of lines after the header.
+    """
+    lines = 0
+    last_block = b""
+    with open_source(file_path) as source:
+        for block in iter(lambda: source.read(READ_BLOCK_SIZE), b""):
+            lines += block.count(b"\n")
+            last_block = block
+    if last_block and not last_block.endswith(b"\n"):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def estimate_rows(file_path):
+    """
+    Estimates the data rows of a source file.
+
+    Plain files are estimated from their size and the average length of the
+    lines in their first ESTIMATE_SAMPLE_BYTES; compressed files, whose
+    inflated size is unknown, are counted with count_rows.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        int: Estimated number of rows after the header.
+    """
+    if compression_of(file_path) is not None:
+        return count_rows(file_path)
+    size = os.path.getsize(file_path)
+    if size <= ESTIMATE_SAMPLE_BYTES:
+        return count_rows(file_path)
+    with open(file_path, "rb") as source:
+        sample = source.read(ESTIMATE_SAMPLE_BYTES)
+    header_end = sample.find(b"\n") + 1
+    lines = sample.count(b"\n", header_end)
+    return int((size - header_end) / ((len(sample) - header_end) / max(lines, 1)))
@@ -0,0 +1,207 @@
+"""
+Swaps a fully loaded staging table in place of a live table.
+
+The swap renames the live table away, renames the staging table to the live
+name and drops the old copy, all in one transaction. Readers keep using the
+old table until that transaction commits and then see the new one, never an
+empty or partly loaded table. The indexes and partitions of the staging table
+are renamed to the live name, so the next staging table can be created under
+the same names.
+
+The renames need an exclusive lock on the live table, which waits for running
+queries to finish. The wait is capped by LOCK_TIMEOUT so that readers do not
+queue up behind the swap; on timeout the swap is retried after a pause.
+Foreign keys of other tables that referenced the old copy are added back
+against the new one where its columns still match. Views, materialized views
+and rules that depend on the live table cannot be carried over, so the swap
+refuses to run while there are any, and the old copy is dropped without
+CASCADE so that nothing else is dropped silently. Only PostgreSQL is
+supported.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import exc, text
+
+from Database.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the table each load writes into before the swap
+STAGING_SUFFIX = "__staging"
+
+# Longest wait for the lock on the live table, per attempt
+LOCK_TIMEOUT = os.environ.get("ETL_SWAP_LOCK_TIMEOUT", "5s")
+
+# Attempts before giving up, and pause before the first retry (doubled every time)
+SWAP_ATTEMPTS = int(os.environ.get("ETL_SWAP_ATTEMPTS", 5))
+RETRY_DELAY_SECONDS = 1.0
+
+# SQLSTATE of lock_not_available, raised when LOCK_TIMEOUT expires
+LOCK_NOT_AVAILABLE = "55P03"
+
+REFERENCING_FOREIGN_KEY_QUERY = text("""
+    SELECT c.conname AS name, t.relname AS table_name, pg_get_constraintdef(c.oid) AS definition,
+           t.relkind = 'p' AS partitioned
+    FROM pg_constraint c
+    JOIN pg_class t ON t.oid = c.conrelid
+    WHERE c.contype = 'f'
+      AND c.confrelid = to_regclass(:table_name)
+      AND c.conrelid <> c.confrelid
+      AND c.conparentid = 0
+""")
+
+DEPENDENT_VIEWS_QUERY = text("""
+    SELECT DISTINCT v.relname AS name
+    FROM pg_depend d
+    JOIN pg_rewrite r ON r.oid = d.objid
+    JOIN pg_class v ON v.oid = r.ev_class
+    WHERE d.classid = 'pg_rewrite'::regclass
+      AND d.refobjid = to_regclass(:table_name)
+      AND v.oid <> d.refobjid
+    ORDER BY v.relname
+""")
+
+STAGING_RELATIONS_QUERY = text("""
+    SELECT c.relname AS name, c.relkind AS kind
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema()
+      AND (starts_with(c.relname, :staging_name || '_') OR starts_with(c.relname, 'ix_' || :staging_name || '_'))
+""")
+
+
+def staging_name_for(table_name):
+    """
+    Returns the name of the staging table of a table.
+
+    Args:
+        table_name (str): Name of the live table.
+
+    Returns:
+        str: Name of the staging table.
+    """
+    return f"{table_name}{STAGING_SUFFIX}"
+
+
+def rename_staging_relations(connection, table_name, staging_name):
+    """
+    Renames the indexes and partitions that still carry the staging name.
+
+    Args:
+        connection: Connection holding the swap transaction.
+        table_name (str): Name of the live table.
+        staging_name (str): Name of the staging table.
+    """
+    for relation in connection.execute(STAGING_RELATIONS_QUERY, {"staging_name": staging_name}):
+        kind = "INDEX" if relation.kind in ("i", "I") else "TABLE"
+        new_name = relation.name.replace(staging_name, table_name)
+        connection.execute(text(f'ALTER {kind} "{relation.name}" RENAME TO "{new_name}"'))
+
+
+def restore_foreign_keys(foreign_keys):
+    """
+    Adds back the foreign keys of other tables that referenced a swapped table.
+
+    Each key is added as NOT VALID and then validated, in its own
+    transactions, except on partitioned tables which do not support NOT
+    VALID. A key that no longer fits the new table is logged and left out.
+
+    Args:
+        foreign_keys (list): Captured rows with name, table_name, definition and partitioned.
+    """
+    for fk in foreign_keys:
+        add_sql = f'ALTER TABLE "{fk["table_name"]}" ADD CONSTRAINT "{fk["name"]}" {fk["definition"]}'
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(add_sql if fk["partitioned"] else f"{add_sql} NOT VALID"))
+            if not fk["partitioned"]:
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE "{fk["table_name"]}" VALIDATE CONSTRAINT "{fk["name"]}"'))
+        except Exception as e:
+            logger.warning(f"Could not restore foreign key {fk['name']} on {fk['table_name']}: {e}")
+
+
+def swap_once(table_name, staging_name):
+    """
+    Swaps the staging table in place of the live table in one transaction.
+
+    Args:
+        table_name (str): Name of the live table.
+        staging_name (str): Name of the loaded staging table.
+
+    Returns:
+        list: Foreign keys of other tables that referenced the old copy and
+        were dropped with it, as captured rows.
+
+    Raises:
+        RuntimeError: If views depend on the live table.
+    """
+    old_name = f"{table_name}__old"
+    with engine.begin() as connection:
+        connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        views = connection.execute(DEPENDENT_VIEWS_QUERY, {"table_name": f'"{table_name}"'}).scalars().all()
+        if views:
+            raise RuntimeError(
+                f"Views {', '.join(views)} depend on {table_name} and would be dropped by the swap; "
+                f"drop them or load {table_name} with another mode"
+            )
+        foreign_keys = [
+            row._asdict()
+            for row in connection.execute(REFERENCING_FOREIGN_KEY_QUERY, {"table_name": f'"{table_name}"'})
+        ]
+        for fk in foreign_keys:
+            connection.execute(text(f'ALTER TABLE "{fk["table_name"]}" DROP CONSTRAINT "{fk["name"]}"'))
+        connection.execute(text(f'DROP TABLE IF EXISTS "{old_name}"'))
+        connection.execute(text(f'ALTER TABLE IF EXISTS "{table_name}" RENAME TO "{old_name}"'))
+        connection.execute(text(f'ALTER TABLE "{staging_name}" RENAME TO "{table_name}"'))
+        connection.execute(text(f'DROP TABLE IF EXISTS "{old_name}"'))
+        rename_staging_relations(connection, table_name, staging_name)
+    return foreign_keys
+
+
+def swap_in(table_name, staging_name):
+    """
+    Swaps a staging table in place of the live table, retrying on lock timeouts.
+
+    The staging table is dropped if the swap does not go through.
+
+    Args:
+        table_name (str): Name of the live table.
+        staging_name (str): Name of the loaded staging table.
+
+    Returns:
+        int: Number of attempts the swap took.
+
+    Raises:
+        sqlalchemy.exc.OperationalError: If the lock could not be taken in
+            SWAP_ATTEMPTS attempts.
+    """
+    delay = RETRY_DELAY_SECONDS
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            foreign_keys = swap_once(table_name, staging_name)
+            break
+        except Exception as e:
+            timed_out = isinstance(e, exc.OperationalError) and getattr(e.orig, "pgcode", None) == LOCK_NOT_AVAILABLE
+            if not timed_out or attempt == SWAP_ATTEMPTS:
+                drop_staging(staging_name)
+                raise
+            logger.warning(f"Swap of {table_name} timed out waiting for its lock, retrying in {delay:.0f}s")
+            time.sleep(delay)
+            delay *= 2
+    restore_foreign_keys(foreign_keys)
+    logger.info(f"Swapped {staging_name} in as {table_name}")
+    return attempt
+
+
+def drop_staging(staging_name):
+    """
+    Drops a staging table left by a failed load or swap.
+
+    Args:
+        staging_name (str): Name of the staging table.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE IF EXISTS "{staging_name}" CASCADE'))
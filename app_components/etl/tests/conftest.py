@@ -0,0 +1,149 @@
+"""
+Shared setup of the ETL tests.
+
+The ETL modules read their settings from the environment when they are
+imported, so the environment is set here first: the tests load into a
+throwaway SQLite database and a temporary data folder. Set TEST_DATABASE_URL
+to run them against another database instead, e.g. a scratch PostgreSQL
+database; every table in it is dropped between tests.
+
+Run from the repository root or the etl folder:
+    python -m pytest app_components/etl/tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ETL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix="etl-tests-")
+
+for variable in [name for name in os.environ if name.startswith("ETL_")]:
+    del os.environ[variable]
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(SCRATCH_DIR, 'etl.db')}"
+)
+os.environ["ETL_DATA_DIR"] = os.path.join(SCRATCH_DIR, "Data")
+os.environ["ETL_WORKERS"] = "1"
+sys.path.insert(0, ETL_DIR)
+
+import etl  # noqa: E402
+import manifest  # noqa: E402
+from sqlalchemy import inspect, text  # noqa: E402
+
+# Small data set covering every model table, clean and without duplicate
+# customers; the tests add the failing or duplicate rows they need
+SAMPLE_SOURCES = {
+    "location": [
+        "location_id,area_name",
+        "1,Akron",
+        "2,Boston",
+    ],
+    "application": [
+        "app_id,application_name",
+        "1,Yandex Music",
+        "2,Apple Music",
+    ],
+    "plan": [
+        "plan_id,plan_type",
+        "1,Basic",
+        "2,Premium",
+    ],
+    "notification": [
+        "notification_id,notification_type",
+        "1,Email",
+        "2,SMS",
+    ],
+    "price": [
+        "id,application_id,plan_id,price",
+        "1,1,1,6.49",
+        "2,1,2,9.99",
+        "3,2,1,5.99",
+    ],
+    "customer": [
+        "customer_id,first_name,last_name,gender,birth_date,age,location,email",
+        "1,John,Smith,Male,1990-01-15,33,Akron,john.smith@example.com",
+        "2,Jane,Doe,Female,1985-07-08,38,Boston,jane.doe@example.com",
+        "3,Ann,Lee,Female,2000-03-01,23,Akron,ann.lee@example.com",
+    ],
+    "subscription": [
+        "id,customer_id,location_id,application_id,plan_type_id,price_id,notification_id,"
+        "start_date,status,end_date,duration,device_type",
+        "1,1,1,1,1,1,1,2023-05-27,Active,2024-01-15,9,Tablet",
+        "2,2,2,1,2,2,2,2023-02-13,Inactive,2023-08-25,6,Phone",
+        "3,3,1,2,1,3,1,2023-09-01,Active,2024-03-01,6,Desktop",
+    ],
+    "results": [
+        "id,customer_id,churn_probability,cluster_number",
+        "1,1,,",
+        "2,2,,",
+        "3,3,,",
+    ],
+}
+
+
+def write_source(table_name, lines, folder=None):
+    """
+    Writes a CSV source file.
+
+    Args:
+        table_name (str): Table the file is loaded into, used as its name.
+        lines (list): Header and rows of the file.
+        folder (str, optional): Folder of the file. Defaults to the ETL data folder.
+
+    Returns:
+        str: Path to the file.
+    """
+    csv_path = os.path.join(folder or etl.DATA_DIR, f"{table_name}.csv")
+    with open(csv_path, "w", newline="") as csv_file:
+        csv_file.write("\n".join(lines) + "\n")
+    return csv_path
+
+
+def table_rows(table_name):
+    """
+    Counts the rows of a table.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        int: Number of rows.
+    """
+    with etl.engine.connect() as connection:
+        return connection.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """
+    Starts every test from an empty data folder and database, with the model tables created.
+    """
+    shutil.rmtree(etl.DATA_DIR, ignore_errors=True)
+    os.makedirs(etl.DATA_DIR)
+    with etl.engine.begin() as connection:
+        for table_name in inspect(connection).get_table_names():
+            connection.execute(text(etl.drop_table_sql(table_name)))
+    etl.models.Base.metadata.create_all(bind=etl.engine)
+    etl.load_stats.clear()
+    etl.quality_stats.clear()
+    manifest.computed_fingerprints.clear()
+    yield
+
+
+@pytest.fixture
+def sample_sources():
+    """
+    Writes SAMPLE_SOURCES to the data folder.
+
+    Returns:
+        dict: Table name mapped to the path of its CSV file.
+    """
+    return {table_name: write_source(table_name, lines) for table_name, lines in SAMPLE_SOURCES.items()}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    etl.engine.dispose()
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import dedup
+from conftest import SAMPLE_SOURCES, write_source
+
+DUPLICATE_CUSTOMERS = [
+    "4, john ,SMITH,Male,1990-01-15,33,Akron,John.Smith@Example.com ",
+    "5,Jane,Doe,Female,1985-07-08,38,Akron,jane.doe@example.com",
+    "6,Sam,Roe,Male,1995-05-05,28,Boston,",
+    "7,Sam,Roe,Male,1995-05-05,28,Boston,",
+]
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def reader(request, monkeypatch):
+    """
+    Runs a test with each way of finding the duplicates.
+    """
+    if request.param == "pandas":
+        monkeypatch.setattr(dedup, "pa", None)
+    elif dedup.pa is None:
+        pytest.skip("pyarrow is not installed")
+    return request.param
+
+
+def test_duplicates_merge_into_the_lowest_id(sample_sources, reader):
+    csv_path = write_source("customer", SAMPLE_SOURCES["customer"] + DUPLICATE_CUSTOMERS)
+
+    merged = dedup.find_duplicates(csv_path).sort_values("duplicate_id")
+
+    assert merged["duplicate_id"].tolist() == [4, 5]
+    assert merged["customer_id"].tolist() == [1, 2]
+    assert merged["identity_key"].str.len().tolist() == [16, 16]
+
+
+def test_merged_customers_are_repointed_or_dropped(sample_sources, reader):
+    write_source("customer", SAMPLE_SOURCES["customer"] + DUPLICATE_CUSTOMERS[:2])
+    write_source("subscription", SAMPLE_SOURCES["subscription"] + [
+        "4,4,1,1,1,1,1,2023-06-01,Active,2024-01-01,7,Phone",
+        "5,5,1,1,1,1,1,2023-06-01,Active,2024-01-01,7,Phone",
+    ])
+    write_source("results", SAMPLE_SOURCES["results"] + ["4,4,,", "5,5,,"])
+    sources = {table_name: sample_sources[table_name] for table_name in ("customer", "subscription", "results")}
+
+    load_paths = dedup.deduplicate_sources(sources)
+
+    assert all(path.startswith(dedup.DEDUP_DIR) for path in load_paths.values())
+    assert pd.read_csv(load_paths["customer"])["customer_id"].tolist() == [1, 2, 3]
+    assert pd.read_csv(load_paths["subscription"])["customer_id"].tolist() == [1, 2, 3, 1, 2]
+    assert pd.read_csv(load_paths["results"])["customer_id"].tolist() == [1, 2, 3]
+    assert dedup.read_merge_map().sort_values("duplicate_id").values.tolist() == [[4, 1], [5, 2]]
+
+
+def test_recorded_merges_apply_to_later_loads(sample_sources):
+    write_source("customer", SAMPLE_SOURCES["customer"] + DUPLICATE_CUSTOMERS[:1])
+    dedup.deduplicate_sources({"customer": sample_sources["customer"]})
+    write_source("subscription", SAMPLE_SOURCES["subscription"] + [
+        "4,4,1,1,1,1,1,2023-06-01,Active,2024-01-01,7,Phone",
+    ])
+
+    load_paths = dedup.deduplicate_sources({"subscription": sample_sources["subscription"]})
+
+    assert pd.read_csv(load_paths["subscription"])["customer_id"].tolist() == [1, 2, 3, 1]
+
+
+def test_files_without_duplicates_are_loaded_as_they_are(sample_sources):
+    sources = {table_name: sample_sources[table_name] for table_name in ("customer", "subscription")}
+
+    assert dedup.deduplicate_sources(sources) == sources
+    assert dedup.read_merge_map().empty
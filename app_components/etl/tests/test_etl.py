@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import text
+
+import etl
+from conftest import SAMPLE_SOURCES, table_rows, write_source
+
+
+@pytest.mark.parametrize("mode", ["copy", "chunked", "pandas", "swap", "upsert"])
+def test_every_load_mode_loads_every_row(sample_sources, mode):
+    etl.run_etl(mode=mode, force=True)
+
+    for table_name, lines in SAMPLE_SOURCES.items():
+        assert table_rows(table_name) == len(lines) - 1, table_name
+        assert etl.load_stats[table_name]["rows"] == len(lines) - 1, table_name
+
+
+def test_upsert_keeps_the_model_tables(sample_sources):
+    etl.run_etl(mode="pandas", force=True)
+    etl.run_etl(mode="upsert", force=True)
+
+    with etl.engine.connect() as connection:
+        locations = connection.execute(text(
+            "SELECT c.customer_id, l.area_name FROM customer c "
+            "JOIN location l ON l.location_id = c.location_id ORDER BY c.customer_id"
+        )).all()
+    assert [tuple(row) for row in locations] == [(1, "Akron"), (2, "Boston"), (3, "Akron")]
+
+
+def test_unchanged_sources_are_skipped(sample_sources):
+    etl.run_etl(mode="upsert")
+    assert set(etl.load_stats) == set(SAMPLE_SOURCES)
+
+    etl.load_stats.clear()
+    etl.run_etl(mode="upsert")
+    assert etl.load_stats == {}
+
+    write_source("customer", SAMPLE_SOURCES["customer"] + [
+        "4,Omar,Haddad,Male,1979-11-30,44,Boston,omar.haddad@example.com",
+    ])
+    etl.run_etl(mode="upsert")
+    assert set(etl.load_stats) == {"customer"}
+    assert table_rows("customer") == 4
+
+
+def test_forced_load_ignores_the_manifest(sample_sources):
+    etl.run_etl(mode="upsert")
+    etl.load_stats.clear()
+
+    etl.run_etl(mode="upsert", force=True)
+
+    assert set(etl.load_stats) == set(SAMPLE_SOURCES)
+
+
+def test_dropped_table_is_loaded_again(sample_sources):
+    etl.run_etl(mode="pandas")
+    etl.load_stats.clear()
+    with etl.engine.begin() as connection:
+        connection.execute(text(etl.drop_table_sql("plan")))
+
+    etl.run_etl(mode="pandas", tables=["plan"])
+
+    assert set(etl.load_stats) == {"plan"}
+    assert table_rows("plan") == 2
+
+
+def test_row_deltas_are_recorded(sample_sources):
+    etl.run_etl(mode="upsert")
+
+    customers = SAMPLE_SOURCES["customer"]
+    write_source("customer", [
+        customers[0],
+        customers[1].replace(",33,", ",34,"),
+        customers[2],
+        customers[3],
+        "4,Omar,Haddad,Male,1979-11-30,44,Boston,omar.haddad@example.com",
+    ])
+    etl.run_etl(mode="upsert")
+
+    with etl.engine.connect() as connection:
+        changes = connection.execute(text(
+            "SELECT change_type, row_key FROM etl_delta WHERE table_name = 'customer' ORDER BY change_type"
+        )).all()
+    assert [tuple(change) for change in changes] == [("inserted", "4"), ("updated", "1")]
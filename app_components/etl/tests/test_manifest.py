@@ -0,0 +1,38 @@
+import os
+
+import manifest
+from conftest import SAMPLE_SOURCES, write_source
+
+
+def test_fingerprint_follows_the_content(sample_sources):
+    csv_path = sample_sources["plan"]
+    fingerprint = manifest.fingerprint_file(csv_path)
+    stat = os.stat(csv_path)
+
+    write_source("plan", ["plan_id,plan_type", "1,Basic", "2,Premier"])
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    changed = manifest.fingerprint_file(csv_path)
+    assert changed["size_bytes"] == fingerprint["size_bytes"]
+    assert changed["content_hash"] != fingerprint["content_hash"]
+
+
+def test_recorded_file_is_unchanged_until_rewritten(sample_sources):
+    csv_path = sample_sources["plan"]
+    manifest.record_manifest(csv_path, "plan", manifest.fingerprint_file(csv_path), 2)
+
+    assert manifest.is_unchanged(csv_path, manifest.fingerprint_file(csv_path), manifest.load_manifest())
+
+    write_source("plan", SAMPLE_SOURCES["plan"] + ["3,Family"])
+    assert not manifest.is_unchanged(csv_path, manifest.fingerprint_file(csv_path), manifest.load_manifest())
+
+
+def test_row_deltas_compare_with_the_previous_snapshot(sample_sources):
+    csv_path = sample_sources["plan"]
+    assert manifest.compute_row_deltas("plan", csv_path) is None
+
+    write_source("plan", ["plan_id,plan_type", "2,Premium Plus", "3,Family"])
+    deltas = manifest.compute_row_deltas("plan", csv_path)
+
+    assert deltas == {"inserted": ["3"], "updated": ["2"], "deleted": ["1"]}
+    assert manifest.compute_row_deltas("plan", csv_path) == {"inserted": [], "updated": [], "deleted": []}
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+import partitioning
+
+
+@pytest.fixture
+def monthly(monkeypatch):
+    monkeypatch.setattr(partitioning, "INTERVAL", "monthly")
+
+
+@pytest.fixture
+def yearly(monkeypatch):
+    monkeypatch.setattr(partitioning, "INTERVAL", "yearly")
+
+
+def test_monthly_bounds_cover_the_range_and_the_future_partitions(monthly):
+    bounds = partitioning.partition_bounds(date(2099, 11, 15), date(2100, 1, 3), future=2)
+
+    assert bounds == [
+        (date(2099, 11, 1), date(2099, 12, 1)),
+        (date(2099, 12, 1), date(2100, 1, 1)),
+        (date(2100, 1, 1), date(2100, 2, 1)),
+        (date(2100, 2, 1), date(2100, 3, 1)),
+        (date(2100, 3, 1), date(2100, 4, 1)),
+    ]
+
+
+def test_yearly_bounds_cover_the_range_and_the_future_partitions(yearly):
+    bounds = partitioning.partition_bounds(date(2099, 5, 1), date(2100, 2, 1), future=1)
+
+    assert bounds == [
+        (date(2099, 1, 1), date(2100, 1, 1)),
+        (date(2100, 1, 1), date(2101, 1, 1)),
+        (date(2101, 1, 1), date(2102, 1, 1)),
+    ]
+
+
+def test_bounds_extend_to_today(monthly):
+    bounds = partitioning.partition_bounds(date(2020, 1, 10), date(2020, 2, 10), future=0)
+
+    assert bounds[0] == (date(2020, 1, 1), date(2020, 2, 1))
+    assert bounds[-1][0] <= date.today() < bounds[-1][1]
+    assert all(upper == lower for (_, upper), (lower, _) in zip(bounds, bounds[1:]))
+
+
+def test_future_partitions_default_to_the_setting(monthly, monkeypatch):
+    monkeypatch.setattr(partitioning, "FUTURE_PARTITIONS", 4)
+
+    bounds = partitioning.partition_bounds(date(2099, 1, 1), date(2099, 1, 1))
+
+    assert len(bounds) == 5
+
+
+def test_partition_names(monthly):
+    assert partitioning.partition_name("subscription", date(2023, 5, 1)) == "subscription_p2023_05"
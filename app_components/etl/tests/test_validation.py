@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+
+import etl
+import validation
+from conftest import SAMPLE_SOURCES, write_source
+
+FAILING_CUSTOMERS = [
+    "4,Omar,Haddad,Male,1979-11-30,150,Boston,omar.haddad@example.com",
+    "5,Lina,Park,Female,not a date,30,Akron,lina.park@example.com",
+    "6,Bruce,Wayne,Male,1972-02-19,52,Gotham,bruce.wayne@example.com",
+    "2,Jane,Doe,Female,1985-07-08,38,Boston,jane.doe@example.com",
+]
+
+
+def test_failing_rows_are_quarantined(sample_sources):
+    write_source("customer", SAMPLE_SOURCES["customer"] + FAILING_CUSTOMERS)
+
+    load_paths = etl.validate_sources({"customer": sample_sources["customer"]}, sample_sources)
+
+    stats = etl.quality_stats["customer"]
+    assert stats["rows"] == 7
+    assert stats["quarantined"] == 4
+    assert stats["failures"] == {"range_age": 1, "type_birth_date": 1, "missing_location": 1, "duplicate_key": 1}
+
+    clean = pd.read_csv(load_paths["customer"])
+    assert load_paths["customer"].startswith(validation.CLEAN_DIR)
+    assert clean["customer_id"].tolist() == [1, 2, 3]
+    quarantined = pd.read_csv(os.path.join(validation.QUARANTINE_DIR, "customer.csv"))
+    assert quarantined["customer_id"].tolist() == [4, 5, 6, 2]
+    assert quarantined["failed_checks"].tolist() == [
+        "range_age", "type_birth_date", "missing_location", "duplicate_key",
+    ]
+
+
+def test_rows_referencing_quarantined_rows_are_quarantined(sample_sources):
+    write_source("customer", SAMPLE_SOURCES["customer"] + FAILING_CUSTOMERS[:1])
+    write_source("subscription", SAMPLE_SOURCES["subscription"] + [
+        "4,4,2,1,1,1,1,2023-06-01,Active,2024-01-01,7,Phone",
+    ])
+
+    load_paths = etl.validate_sources({"subscription": sample_sources["subscription"]}, sample_sources)
+
+    assert "customer" not in etl.quality_stats
+    assert etl.quality_stats["subscription"]["failures"] == {"missing_customer": 1}
+    assert pd.read_csv(load_paths["subscription"])["id"].tolist() == [1, 2, 3]
+
+
+def test_clean_file_is_loaded_as_it_is(sample_sources):
+    load_paths = etl.validate_sources({"customer": sample_sources["customer"]}, sample_sources)
+
+    assert load_paths == {"customer": sample_sources["customer"]}
+    assert etl.quality_stats["customer"] == {"rows": 3, "quarantined": 0, "failures": {}}
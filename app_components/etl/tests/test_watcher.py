@@ -0,0 +1,153 @@
+import json
+import os
+import time
+
+import pytest
+
+import etl
+import manifest
+import watcher
+from conftest import SAMPLE_SOURCES, table_rows, write_source
+
+
+@pytest.fixture
+def watch_dir(monkeypatch):
+    """
+    Creates WATCH_DIR, with files picked up as soon as they are written.
+    """
+    os.makedirs(watcher.WATCH_DIR)
+    monkeypatch.setattr(watcher, "SETTLE_SECONDS", 0)
+    return watcher.WATCH_DIR
+
+
+def drop_file(name, lines):
+    """
+    Writes a file to WATCH_DIR, dated a minute ago.
+
+    Args:
+        name (str): Name of the file, e.g. customer__0001.
+        lines (list): Header and rows of the file.
+
+    Returns:
+        str: Path to the file.
+    """
+    file_path = write_source(name, lines, watcher.WATCH_DIR)
+    past = time.time_ns() - 60 * 10 ** 9
+    os.utime(file_path, ns=(past, past))
+    return file_path
+
+
+def loaded_entry(file_path):
+    return {"mtime_ns": os.stat(file_path).st_mtime_ns, **manifest.fingerprint_file(file_path)}
+
+
+def test_state_round_trip(watch_dir):
+    file_path = drop_file("customer__0001", SAMPLE_SOURCES["customer"])
+    state = {
+        "loaded": {"customer__0001.csv": loaded_entry(file_path)},
+        "failed": {"plan__0001.csv": {"mtime_ns": 1, "size_bytes": 2, "attempts": 1, "retry_at": 3.5}},
+    }
+
+    watcher.save_state(state)
+
+    assert watcher.load_state() == state
+    assert not os.path.exists(f"{watcher.STATE_PATH}.tmp")
+
+
+def test_missing_or_older_state_is_empty(watch_dir):
+    assert watcher.load_state() == {"loaded": {}, "failed": {}}
+
+    os.makedirs(os.path.dirname(watcher.STATE_PATH))
+    with open(watcher.STATE_PATH, "w") as state_file:
+        json.dump({"files": {"customer__0001.csv": 1}}, state_file)
+
+    assert watcher.load_state() == {"loaded": {}, "failed": {}}
+
+
+def test_record_batch_forgets_the_files_that_left(watch_dir):
+    kept = drop_file("customer__0001", SAMPLE_SOURCES["customer"])
+    retried = drop_file("customer__0002", SAMPLE_SOURCES["customer"])
+    state = {
+        "loaded": {"customer__0000.csv": {"mtime_ns": 1, "size_bytes": 2, "content_hash": "gone"}},
+        "failed": {"customer__0002.csv": {"mtime_ns": 1, "size_bytes": 2, "attempts": 1, "retry_at": 0}},
+    }
+
+    state = watcher.record_batch(state, {
+        "customer__0001.csv": loaded_entry(kept),
+        "customer__0002.csv": loaded_entry(retried),
+    }, [])
+
+    assert set(state["loaded"]) == {"customer__0001.csv", "customer__0002.csv"}
+    assert state["failed"] == {}
+
+
+def test_failed_file_backs_off_then_is_rejected(watch_dir, monkeypatch):
+    monkeypatch.setattr(watcher, "RETRY_SECONDS", 10)
+    monkeypatch.setattr(watcher, "MAX_ATTEMPTS", 3)
+    drop_file("plan__0001", ["wrong,header", "1,2"])
+    failed = {}
+
+    watcher.record_failures(failed, ["plan__0001.csv"])
+    watcher.record_failures(failed, ["plan__0001.csv"])
+
+    assert failed["plan__0001.csv"]["attempts"] == 2
+    assert failed["plan__0001.csv"]["retry_at"] == pytest.approx(time.time() + 20, abs=5)
+
+    watcher.record_failures(failed, ["plan__0001.csv"])
+
+    assert failed == {}
+    assert os.listdir(watch_dir) == [os.path.basename(watcher.REJECTED_DIR)]
+    assert os.listdir(watcher.REJECTED_DIR) == ["plan__0001.csv"]
+
+
+def test_replaced_file_starts_counting_again(watch_dir):
+    drop_file("plan__0001", ["wrong,header", "1,2"])
+    failed = {}
+    watcher.record_failures(failed, ["plan__0001.csv"])
+
+    drop_file("plan__0001", ["still,wrong,header", "1,2,3"])
+    watcher.record_failures(failed, ["plan__0001.csv"])
+
+    assert failed["plan__0001.csv"]["attempts"] == 1
+
+
+def test_scan_skips_loaded_and_backed_off_files(watch_dir):
+    loaded = drop_file("customer__0001", SAMPLE_SOURCES["customer"])
+    failing = drop_file("customer__0002", ["wrong,header", "1,2"])
+    new = drop_file("customer__0003", SAMPLE_SOURCES["customer"])
+    drop_file("unknown__0001", SAMPLE_SOURCES["customer"])
+    state = {"loaded": {"customer__0001.csv": loaded_entry(loaded)}, "failed": {}}
+    watcher.record_failures(state["failed"], ["customer__0002.csv"])
+
+    assert [file_path for _, file_path in watcher.scan_new_files(state, set())] == [new]
+    assert watcher.scan_new_files(state, {new}) == []
+
+    state["failed"]["customer__0002.csv"]["retry_at"] = time.time() - 1
+    assert [file_path for _, file_path in watcher.scan_new_files(state, {new})] == [failing]
+
+
+def test_touched_file_is_not_loaded_again(watch_dir):
+    file_path = drop_file("customer__0001", SAMPLE_SOURCES["customer"])
+    state = {"loaded": {"customer__0001.csv": loaded_entry(file_path)}, "failed": {}}
+    os.utime(file_path)
+
+    assert watcher.scan_new_files(state, set()) == []
+    assert state["loaded"]["customer__0001.csv"]["mtime_ns"] == os.stat(file_path).st_mtime_ns
+    assert watcher.load_state() == state
+
+
+def test_load_batch_upserts_and_reports_failures(sample_sources, watch_dir):
+    etl.run_etl(mode="upsert")
+    added = drop_file("customer__0001", [
+        SAMPLE_SOURCES["customer"][0],
+        "4,Omar,Haddad,Male,1979-11-30,44,Boston,omar.haddad@example.com",
+    ])
+    broken = drop_file("plan__0001", ["wrong,header", "1,2"])
+
+    result = watcher.load_batch([(0, added), (0, broken)])
+
+    assert result["rows"] == 1
+    assert set(result["loaded"]) == {"customer__0001.csv"}
+    assert result["failed"] == ["plan__0001.csv"]
+    assert table_rows("customer") == 4
+    assert "customer__0001.csv" in manifest.load_manifest()
@@ -0,0 +1,229 @@
+"""
+Vectorized data-quality checks run on the source files before they are loaded.
+
+Every row is checked against the model column its header maps to:
+    - null: a value is missing in a column that is not nullable;
+    - type: a value does not parse as the column's integer, number or date;
+    - range: a number is outside the column's info["min"] / info["max"];
+    - duplicate_key: the primary key was already seen earlier in the file;
+    - missing_<parent>: a reference has no row in the parent file.
+
+Only the checked columns are read, in chunks, letting the CSV parser type
+numbers natively; each check is a whole-column operation, and references are
+looked up in hash-based indexes of the parent keys. Files without failures
+are loaded as they are. Otherwise a second pass over the raw text writes the
+failing rows to QUARANTINE_DIR/<table>.csv, with a failed_checks column, and
+the others to CLEAN_DIR/<table>.csv, compressed like the source (e.g.
+<table>.csv.gz), which is loaded instead of the source.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, Integer, Numeric
+
+import source_files
+
+logger = logging.getLogger(__name__)
+
+_STATE_DIR = os.path.join(os.environ.get("ETL_DATA_DIR", "Data"), ".state")
+
+# Folder receiving the rows that failed a check, one <table>.csv per table
+QUARANTINE_DIR = os.environ.get("ETL_QUARANTINE_DIR", os.path.join(_STATE_DIR, "quarantine"))
+
+# Folder receiving the rows that passed, for tables with quarantined rows
+CLEAN_DIR = os.path.join(_STATE_DIR, "clean")
+
+# Rows checked at a time
+CHUNK_ROWS = 1000000
+
+
+def needs_check(column, is_referenced):
+    """
+    Tells whether a column has anything to check.
+
+    Args:
+        column (Column): Model column.
+        is_referenced (bool): Whether the column references another table or is referenced.
+
+    Returns:
+        bool: True unless it is a nullable text column without range or references.
+    """
+    return (
+        is_referenced
+        or column.primary_key
+        or not column.nullable
+        or isinstance(column.type, (Date, Integer, Numeric))
+        or "min" in column.info
+        or "max" in column.info
+    )
+
+
+def convert_values(values, column):
+    """
+    Converts parsed values to the type of a model column.
+
+    Columns the parser already typed as numbers are only checked for
+    fractions; text is converted and is missing where it does not parse.
+
+    Args:
+        values (pd.Series): Values as parsed from the CSV.
+        column (Column): Model column the values belong to.
+
+    Returns:
+        pd.Series: Converted values.
+    """
+    if isinstance(column.type, Date):
+        return pd.to_datetime(values, format="ISO8601", errors="coerce")
+    if isinstance(column.type, (Integer, Numeric)):
+        numbers = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values, errors="coerce")
+        if isinstance(column.type, Integer) and pd.api.types.is_float_dtype(numbers):
+            numbers = numbers.where(numbers % 1 == 0)
+        return numbers
+    return values
+
+
+def check_chunk(chunk, model_columns, references, parent_keys):
+    """
+    Runs the per-row checks on one chunk.
+
+    Args:
+        chunk (pd.DataFrame): Parsed rows of the checked columns.
+        model_columns (dict): Header mapped to its model column.
+        references (dict): Header mapped to the (parent table, parent header) it references.
+        parent_keys (dict): (parent table, parent header) mapped to a pd.Index of valid keys.
+
+    Returns:
+        tuple: Check label mapped to its boolean failure mask, and header
+        mapped to the converted values.
+    """
+    failures, converted = {}, {}
+    for header in chunk.columns:
+        column = model_columns[header]
+        parsed = chunk[header]
+        values = convert_values(parsed, column)
+        converted[header] = values
+        missing = parsed.isna().to_numpy()
+        if not column.nullable:
+            failures[f"null_{header}"] = missing
+        if values is not parsed:
+            failures[f"type_{header}"] = values.isna().to_numpy() & ~missing
+        out_of_range = np.zeros(len(chunk), dtype=bool)
+        if "min" in column.info:
+            out_of_range |= (values < column.info["min"]).to_numpy()
+        if "max" in column.info:
+            out_of_range |= (values > column.info["max"]).to_numpy()
+        if "min" in column.info or "max" in column.info:
+            failures[f"range_{header}"] = out_of_range
+        reference = references.get(header)
+        if reference is not None and reference in parent_keys:
+            found = values.isin(parent_keys[reference]).to_numpy()
+            failures[f"missing_{reference[0]}"] = ~found & values.notna().to_numpy()
+    return failures, converted
+
+
+def write_split(table_name, csv_path, failed, reasons):
+    """
+    Writes the failing rows of a file to quarantine and the others to a clean copy.
+
+    The raw text of every row is kept as it is in the source, and the clean
+    copy is compressed like the source.
+
+    Args:
+        table_name (str): Table the file is loaded into.
+        csv_path (str): Path to the CSV file.
+        failed (np.ndarray): One boolean per row, True for rows to quarantine.
+        reasons (pd.Series): failed_checks text of the failing rows, indexed by row position.
+
+    Returns:
+        tuple: Paths of the clean copy and of the quarantine file.
+    """
+    clean_path = os.path.join(CLEAN_DIR, f"{table_name}{source_files.extension_of(csv_path)}")
+    quarantine_path = os.path.join(QUARANTINE_DIR, f"{table_name}.csv")
+    os.makedirs(CLEAN_DIR, exist_ok=True)
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    offset = 0
+    with source_files.open_target(clean_path) as clean, open(quarantine_path, "w", newline="") as quarantine:
+        reader = pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS)
+        for chunk in reader:
+            chunk_failed = failed[offset:offset + len(chunk)]
+            chunk[~chunk_failed].to_csv(clean, index=False, header=offset == 0)
+            rejected = chunk[chunk_failed].copy()
+            rejected["failed_checks"] = reasons.loc[np.flatnonzero(chunk_failed) + offset].to_numpy()
+            rejected.to_csv(quarantine, index=False, header=offset == 0)
+            offset += len(chunk)
+    return clean_path, quarantine_path
+
+
+def validate_source(table_name, csv_path, model_columns, references, parent_keys, key_headers=()):
+    """
+    Checks a source file, quarantining the rows that fail.
+
+    Args:
+        table_name (str): Table the file is loaded into.
+        csv_path (str): Path to the CSV file.
+        model_columns (dict): Header mapped to its model column.
+        references (dict): Header mapped to the (parent table, parent header) it references.
+        parent_keys (dict): (parent table, parent header) mapped to a pd.Index of valid keys.
+        key_headers (iterable): Headers whose passing values other tables reference.
+
+    Returns:
+        dict: Path of the file to load under "path", row counts under "rows"
+        and "quarantined", failures per check under "failures", and the
+        distinct passing values of key_headers under "keys".
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    key_headers = [key for key in key_headers if key in header]
+    checked = [
+        column_name for column_name in header
+        if column_name in model_columns
+        and needs_check(model_columns[column_name], column_name in references or column_name in key_headers)
+    ]
+    primary_key = [column_name for column_name in checked if model_columns[column_name].primary_key]
+    kept = set(primary_key) | set(key_headers)
+
+    rows = 0
+    failed_positions = {}
+    kept_values = {column_name: [] for column_name in kept}
+    reader = pd.read_csv(csv_path, usecols=checked, keep_default_na=False, na_values=[""], chunksize=CHUNK_ROWS)
+    for chunk in reader:
+        failures, converted = check_chunk(chunk, model_columns, references, parent_keys)
+        for label, mask in failures.items():
+            if mask.any():
+                failed_positions.setdefault(label, []).append(np.flatnonzero(mask) + rows)
+        for column_name in kept:
+            kept_values[column_name].append(converted[column_name])
+        rows += len(chunk)
+
+    kept_frame = pd.DataFrame({
+        column_name: pd.concat(parts, ignore_index=True) if parts else pd.Series(dtype=object)
+        for column_name, parts in kept_values.items()
+    })
+    if primary_key and rows:
+        duplicates = kept_frame[primary_key].duplicated(keep="first").to_numpy()
+        if duplicates.any():
+            failed_positions["duplicate_key"] = [np.flatnonzero(duplicates)]
+
+    failed = np.zeros(rows, dtype=bool)
+    failure_counts = {}
+    labelled = []
+    for label, positions in failed_positions.items():
+        positions = np.concatenate(positions)
+        failed[positions] = True
+        failure_counts[label] = len(positions)
+        labelled.append(pd.Series(label, index=positions))
+    quarantined = int(failed.sum())
+
+    load_path = csv_path
+    quarantine_path = os.path.join(QUARANTINE_DIR, f"{table_name}.csv")
+    if os.path.exists(quarantine_path):
+        os.remove(quarantine_path)
+    if quarantined:
+        reasons = pd.concat(labelled).groupby(level=0).agg(";".join)
+        load_path, quarantine_path = write_split(table_name, csv_path, failed, reasons)
+        logger.warning(f"{table_name}: quarantined {quarantined} of {rows} rows in {quarantine_path} ({failure_counts})")
+
+    passing = kept_frame[~failed] if rows else kept_frame
+    keys = {key: pd.Index(passing[key].dropna().unique()) for key in key_headers}
+    return {"path": load_path, "rows": rows, "quarantined": quarantined, "failures": failure_counts, "keys": keys}
@@ -0,0 +1,368 @@
+"""
+Long-running ingestion of the files dropped into a watch folder.
+
+The watcher polls WATCH_DIR for source files named <table>.csv or
+<table>__<batch>.csv (optionally .gz or .zst compressed, see source_files)
+and loads them in micro-batches: pending files are loaded once BATCH_SECONDS
+have passed since the oldest one arrived, or as soon as they add up to
+BATCH_ROWS rows. A file is only picked up once it has not been modified for
+SETTLE_SECONDS, so that files still being written are left alone.
+
+Each batch is merged into the model tables with the upsert mode of
+load_csv_to_table, parents before children. After a batch, the name, size,
+modification time and content hash of every file loaded are recorded in
+STATE_PATH. A file is new unless the record holds its name with the same
+content, whatever its modification time, so files moved in with an older
+modification time (mv, rsync -t) are still picked up. A restarted watcher
+skips the recorded files whose size and modification time are unchanged
+without reading them again. A batch interrupted midway is loaded again on
+restart, which the upsert makes harmless.
+
+A file that fails to load is recorded in STATE_PATH with its number of
+attempts, and is not read again before RETRY_SECONDS have passed, a delay
+doubled after every further failure. Replacing the file retries it at once.
+After MAX_ATTEMPTS failures the file is moved to REJECTED_DIR.
+
+Unlike run_etl, the watcher does not validate the files (validate_sources),
+does not merge duplicate customers (dedup) and writes no run report: the
+files dropped in WATCH_DIR are expected to be clean already. Load a file that
+needs these steps with etl.py instead.
+
+Run it from the etl folder, like etl.py:
+    python watcher.py
+"""
+import json
+import logging
+import os
+import signal
+import time
+from graphlib import TopologicalSorter
+
+import etl
+import manifest
+import source_files
+
+logger = logging.getLogger(__name__)
+
+# Folder polled for new files
+WATCH_DIR = os.environ.get("ETL_WATCH_DIR", os.path.join(etl.DATA_DIR, "incoming"))
+
+# JSON file recording the loaded files
+STATE_PATH = os.environ.get("ETL_WATCH_STATE", os.path.join(etl.DATA_DIR, ".state", "watch.json"))
+
+# Seconds between two scans of WATCH_DIR
+POLL_SECONDS = float(os.environ.get("ETL_WATCH_POLL_SECONDS", 2))
+
+# A batch is loaded when its oldest file has waited this long, or when it reaches this many rows
+BATCH_SECONDS = float(os.environ.get("ETL_BATCH_SECONDS", 30))
+BATCH_ROWS = int(os.environ.get("ETL_BATCH_ROWS", 1000000))
+
+# Seconds a file must stay unmodified before it is picked up
+SETTLE_SECONDS = float(os.environ.get("ETL_WATCH_SETTLE_SECONDS", 2))
+
+# Seconds before a file that failed to load is retried, doubled after every further failure
+RETRY_SECONDS = float(os.environ.get("ETL_WATCH_RETRY_SECONDS", 60))
+
+# Failed attempts after which a file is given up on and moved to REJECTED_DIR
+MAX_ATTEMPTS = int(os.environ.get("ETL_WATCH_MAX_ATTEMPTS", 5))
+
+# Folder receiving the files given up on
+REJECTED_DIR = os.environ.get("ETL_WATCH_REJECTED_DIR", os.path.join(WATCH_DIR, "rejected"))
+
+# Separates the table name from the batch name in a file name
+BATCH_SEPARATOR = "__"
+
+# Files already reported as not matching a table
+ignored_files = set()
+
+
+def table_name_for(file_path):
+    """
+    Derives the table a dropped file is loaded into, e.g. subscription from subscription__0042.csv.gz.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Table name.
+    """
+    return source_files.table_name_for(file_path).split(BATCH_SEPARATOR)[0]
+
+
+def load_state():
+    """
+    Reads the record of the files loaded, or failed to load, by previous runs.
+
+    Returns:
+        dict: Under "loaded", file name mapped to its "mtime_ns", "size_bytes"
+        and "content_hash" when it was loaded. Under "failed", file name
+        mapped to its "mtime_ns" and "size_bytes" when it last failed, its
+        number of "attempts" and the epoch time it is retried at ("retry_at").
+    """
+    if not os.path.exists(STATE_PATH):
+        return {"loaded": {}, "failed": {}}
+    with open(STATE_PATH) as state_file:
+        state = json.load(state_file)
+    if not isinstance(state.get("loaded"), dict):
+        logger.warning(f"Ignoring {STATE_PATH}, written by an older watcher; files already loaded are upserted again")
+        return {"loaded": {}, "failed": {}}
+    return {"loaded": state["loaded"], "failed": state.get("failed", {})}
+
+
+def save_state(state):
+    """
+    Writes the record of the loaded and failed files, replacing the previous one atomically.
+
+    Args:
+        state (dict): Result of load_state, updated with the latest batches.
+    """
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    temporary_path = f"{STATE_PATH}.tmp"
+    with open(temporary_path, "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(temporary_path, STATE_PATH)
+
+
+def record_failures(failed, names):
+    """
+    Counts a failed attempt for each file, and moves the files out of attempts to REJECTED_DIR.
+
+    A file replaced since its last failure starts counting from zero again.
+
+    Args:
+        failed (dict): Record of the failed files, see load_state. Updated in place.
+        names (list): Names of the files of WATCH_DIR that failed to load.
+    """
+    for name in names:
+        file_path = os.path.join(WATCH_DIR, name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            failed.pop(name, None)
+            continue
+        entry = failed.get(name)
+        attempts = 1
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size_bytes"] == stat.st_size:
+            attempts = entry["attempts"] + 1
+        if attempts >= MAX_ATTEMPTS:
+            failed.pop(name, None)
+            try:
+                os.makedirs(REJECTED_DIR, exist_ok=True)
+                os.replace(file_path, os.path.join(REJECTED_DIR, name))
+            except OSError as e:
+                logger.error(f"Failed to move {name} to {REJECTED_DIR}: {e}")
+                continue
+            logger.error(f"Gave up on {name} after {attempts} failed attempts, moved it to {REJECTED_DIR}")
+            continue
+        delay = RETRY_SECONDS * 2 ** (attempts - 1)
+        failed[name] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size_bytes": stat.st_size,
+            "attempts": attempts,
+            "retry_at": time.time() + delay,
+        }
+        logger.error(f"Failed to load {name} (attempt {attempts} of {MAX_ATTEMPTS}), retrying in {delay:.0f}s")
+
+
+def record_batch(state, batch_loaded, batch_failed):
+    """
+    Adds the outcome of a batch to the record, and forgets the files that left WATCH_DIR.
+
+    Args:
+        state (dict): Current record, see load_state.
+        batch_loaded (dict): Entries of the files of the batch that loaded.
+        batch_failed (list): Names of the files of the batch that failed.
+
+    Returns:
+        dict: The new record.
+    """
+    loaded = {**state["loaded"], **batch_loaded}
+    failed = {name: entry for name, entry in state["failed"].items() if name not in batch_loaded}
+    record_failures(failed, batch_failed)
+
+    def present(record):
+        return {name: entry for name, entry in record.items() if os.path.exists(os.path.join(WATCH_DIR, name))}
+
+    return {"loaded": present(loaded), "failed": present(failed)}
+
+
+def scan_watch_dir():
+    """
+    Lists the source files of WATCH_DIR that belong to a model table.
+
+    Returns:
+        dict: Table name mapped to the paths of its files.
+    """
+    files = {}
+    if not os.path.isdir(WATCH_DIR):
+        return files
+    for name in sorted(os.listdir(WATCH_DIR)):
+        file_path = os.path.join(WATCH_DIR, name)
+        if not os.path.isfile(file_path) or not any(name.endswith(ext) for ext in source_files.SOURCE_EXTENSIONS):
+            continue
+        table_name = table_name_for(file_path)
+        if table_name not in etl.models.Base.metadata.tables:
+            if name not in ignored_files:
+                logger.warning(f"Ignoring {name}: there is no {table_name} table")
+                ignored_files.add(name)
+            continue
+        files.setdefault(table_name, []).append(file_path)
+    return files
+
+
+def scan_new_files(state, known):
+    """
+    Lists the settled files of WATCH_DIR that were not loaded yet.
+
+    A file whose size and modification time match its entry in the record
+    is taken as loaded without being read. A file that changed on disk is
+    fingerprinted, and is only new if its content changed; otherwise its
+    entry is given the new modification time and the record is saved. A
+    file that failed to load is left alone until its retry time, unless it
+    was replaced since.
+
+    Args:
+        state (dict): Record of the loaded and failed files, see load_state.
+        known (set): Paths already pending in the current batch.
+
+    Returns:
+        list: (mtime_ns, path) of the new files, oldest first.
+    """
+    settled_before = time.time_ns() - int(SETTLE_SECONDS * 1e9)
+    now = time.time()
+    loaded, failed = state["loaded"], state["failed"]
+    new_files = []
+    touched = False
+    for file_paths in scan_watch_dir().values():
+        for file_path in file_paths:
+            if file_path in known:
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # Deleted or renamed since the folder was listed
+                continue
+            if stat.st_mtime_ns > settled_before:
+                continue
+            failure = failed.get(os.path.basename(file_path))
+            if failure is not None and now < failure["retry_at"] \
+                    and failure["mtime_ns"] == stat.st_mtime_ns and failure["size_bytes"] == stat.st_size:
+                continue
+            entry = loaded.get(os.path.basename(file_path))
+            if entry is not None:
+                if entry["mtime_ns"] == stat.st_mtime_ns and entry["size_bytes"] == stat.st_size:
+                    continue
+                try:
+                    fingerprint = manifest.fingerprint_file(file_path)
+                except OSError:
+                    continue
+                if fingerprint["content_hash"] == entry["content_hash"] \
+                        and fingerprint["size_bytes"] == entry["size_bytes"]:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    touched = True
+                    continue
+            new_files.append((stat.st_mtime_ns, file_path))
+    if touched:
+        save_state(state)
+    return sorted(new_files)
+
+
+def load_batch(batch):
+    """
+    Upserts a batch of files into their tables, parents first.
+
+    Args:
+        batch (list): (mtime_ns, path) of the files to load, oldest first.
+
+    Returns:
+        dict: Rows loaded under "rows", the record entries of the files that
+        loaded under "loaded" (see load_state) and the names of the files
+        that failed under "failed".
+    """
+    by_table = {}
+    for _, file_path in batch:
+        by_table.setdefault(table_name_for(file_path), []).append(file_path)
+    try:
+        etl.prepare_model_tables(by_table)
+    except Exception as e:
+        logger.error(f"Failed to prepare the tables of the batch: {e}")
+        return {"rows": 0, "loaded": {}, "failed": [os.path.basename(file_path) for _, file_path in batch]}
+
+    rows = 0
+    loaded, failed = {}, []
+    for table_name in TopologicalSorter(etl.build_load_graph(by_table)).static_order():
+        for file_path in by_table.get(table_name, []):
+            name = os.path.basename(file_path)
+            try:
+                mtime_ns = os.stat(file_path).st_mtime_ns
+                fingerprint = manifest.fingerprint_file(file_path)
+            except OSError as e:
+                logger.error(f"Failed to read {file_path}: {e}")
+                failed.append(name)
+                continue
+            etl.load_stats.pop(table_name, None)
+            etl.load_csv_to_table(table_name, file_path, mode="upsert")
+            stats = etl.load_stats.get(table_name)
+            if stats is None:
+                failed.append(name)
+                continue
+            rows += stats["rows"]
+            loaded[name] = {"mtime_ns": mtime_ns, **fingerprint}
+            try:
+                manifest.record_manifest(file_path, table_name, fingerprint, stats["rows"])
+            except Exception as e:
+                logger.error(f"Failed to record manifest for {file_path}: {e}")
+    return {"rows": rows, "loaded": loaded, "failed": failed}
+
+
+def watch():
+    """
+    Polls WATCH_DIR and loads the new files in micro-batches until stopped.
+
+    SIGINT and SIGTERM stop the watcher after the current batch; files still
+    pending are picked up again on the next start.
+    """
+    stopping = []
+
+    def stop(signum, frame):
+        logger.info("Stopping the watcher")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    state = load_state()
+    pending, pending_rows, first_arrival = [], 0, None
+    logger.info(f"Watching {WATCH_DIR} (batches of {BATCH_SECONDS:.0f}s or {BATCH_ROWS} rows)")
+    while not stopping:
+        for mtime_ns, file_path in scan_new_files(state, {file_path for _, file_path in pending}):
+            try:
+                file_rows = source_files.count_rows(file_path)
+            except Exception as e:
+                logger.error(f"Failed to read {file_path}: {e}")
+                record_failures(state["failed"], [os.path.basename(file_path)])
+                save_state(state)
+                continue
+            pending.append((mtime_ns, file_path))
+            pending_rows += file_rows
+            first_arrival = first_arrival or time.monotonic()
+            logger.info(f"Queued {os.path.basename(file_path)} ({file_rows} rows)")
+
+        if pending and (pending_rows >= BATCH_ROWS or time.monotonic() - first_arrival >= BATCH_SECONDS):
+            start = time.perf_counter()
+            result = load_batch(pending)
+            elapsed = time.perf_counter() - start
+            state = record_batch(state, result["loaded"], result["failed"])
+            save_state(state)
+            logger.info(
+                f"Loaded {len(result['loaded'])} of the {len(pending)} file(s) of a batch, {result['rows']} rows in {elapsed:.2f}s "
+                f"({result['rows'] / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+            pending, pending_rows, first_arrival = [], 0, None
+            continue
+
+        time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    watch()